@@ -23,8 +23,10 @@ ln -s $(pwd)/utils/scripts/sweep_parameters.py ${CONDA_PREFIX}/bin/sweep-paramet
 ln -s $(pwd)/utils/analysis/make_movies.py ${CONDA_PREFIX}/bin/make-movies
 ln -s $(pwd)/utils/analysis/make_movie.py ${CONDA_PREFIX}/bin/make-movie
 ln -s $(pwd)/utils/scripts/sweep_movies.py ${CONDA_PREFIX}/bin/sweep-movies
+ln -s $(pwd)/utils/scripts/benchmark.py ${CONDA_PREFIX}/bin/benchmark-simulation
 
 chmod +x  ${CONDA_PREFIX}/bin/run-simulation
 chmod +x  ${CONDA_PREFIX}/bin/sweep-parameters
 chmod +x  ${CONDA_PREFIX}/bin/make-movies
-chmod +x  ${CONDA_PREFIX}/bin/make-movie
\ No newline at end of file
+chmod +x  ${CONDA_PREFIX}/bin/make-movie
+chmod +x  ${CONDA_PREFIX}/bin/benchmark-simulation
\ No newline at end of file
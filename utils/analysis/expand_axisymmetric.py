@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+from utils.file_operations import load_input_parameters, write_input_params_from_dict
+from utils.simulation_helper import set_mesh_geometry
+import os
+import shutil
+import argparse
+import h5py
+
+
+def expand_simulation_directory(directory, target_directory):
+    """Expand the data of an axisymmetric simulation to the 2D mesh of the full circle
+
+    The concentration fields and chemical potentials of a simulation with axisymmetric = 1 are stored along the radius
+    of the circle. They are interpolated onto the 2D circular mesh that the same input parameters give with
+    axisymmetric = 0, and written to target_directory together with the other output files, so that the analysis
+    scripts can be used unchanged on the expanded directory.
+
+    Args:
+        directory (string): Directory of the axisymmetric simulation
+
+        target_directory (string): Directory to write the expanded simulation data to
+    """
+    input_params = load_input_parameters(filename=os.path.join(directory, 'input_params.txt')).to_dict()
+    assert input_params.get('axisymmetric', 0) == 1, directory + " does not contain an axisymmetric simulation"
+    radial_geometry = set_mesh_geometry(input_params)
+    circular_mesh = radial_geometry.get_full_mesh()
+
+    os.makedirs(target_directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        if filename not in ('input_params.txt', 'spatial_variables.hdf5') and \
+                os.path.isfile(os.path.join(directory, filename)):
+            shutil.copy2(os.path.join(directory, filename), os.path.join(target_directory, filename))
+    input_params['axisymmetric'] = 0
+    write_input_params_from_dict(input_params, os.path.join(target_directory, 'input_params.txt'))
+
+    with h5py.File(os.path.join(directory, 'spatial_variables.hdf5'), 'r') as source, \
+            h5py.File(os.path.join(target_directory, 'spatial_variables.hdf5'), 'w') as target:
+        target.attrs.update(source.attrs)
+        for name, dataset in source.items():
+            # Concentration fields and chemical potentials hold the values in all cells of the mesh at every frame
+            if name.split('_')[0] in ('c', 'mu') and dataset.ndim == 2:
+                expanded = target.create_dataset(name, (dataset.shape[0], circular_mesh.numberOfCells))
+                for frame in range(dataset.shape[0]):
+                    expanded[frame, :] = radial_geometry.expand_to_full_mesh(dataset[frame, :])
+            else:
+                source.copy(dataset, target, name=name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Expand an axisymmetric simulation to the 2D mesh of the full circle')
+    parser.add_argument('--i', help="Directory of the axisymmetric simulation", required=True)
+    parser.add_argument('--o', help="Directory to write the expanded simulation data to", required=True)
+    args = parser.parse_args()
+
+    expand_simulation_directory(args.i, args.o)
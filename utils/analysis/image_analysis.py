@@ -7,6 +7,8 @@ import numpy as np
 from matplotlib import pyplot as plt
 import utils.file_operations as file_operations
 import utils.simulation_helper as simulation_helper
+from utils.analysis.raster import get_mesh_raster
+from utils.mesh_transfer import read_frames
 import sys
 sys.path.append('../')
 
@@ -46,7 +48,8 @@ def plot_concentration(path, figure_parameters, time_point=-1,
 
     input_params = file_operations.input_parse(os.path.join(path, input_parameters_file))
     sim_geometry = simulation_helper.set_mesh_geometry(input_params)
-    mesh = sim_geometry.mesh
+    mesh = sim_geometry.get_full_mesh()
+    raster = get_mesh_raster(mesh)
 
     if os.path.exists(os.path.join(path, spatial_variables_file)):
 
@@ -76,6 +79,11 @@ def plot_concentration(path, figure_parameters, time_point=-1,
             else:
                 t = time_point
 
+            # Concentrations of this time point in the cells of the mesh of the full domain
+            frame = [sim_geometry.expand_to_full_mesh(read_frames(concentration_dynamics, 'c_{index}'.format(index=i),
+                                                                  t, sim_geometry.mesh))
+                     for i in range(int(figure_parameters['num_components']))]
+
             # Get upper and lower limits of the concentration values from the concentration profile data
             plotting_range = []
             for i in range(int((figure_parameters['num_components']))):
@@ -83,8 +91,8 @@ def plot_concentration(path, figure_parameters, time_point=-1,
                 if 'c{index}_range'.format(index=i) in figure_parameters.keys():
                     plotting_range.append(figure_parameters['c{index}_range'.format(index=i)])
                 else:
-                    min_value = np.min(concentration_profile[i][t])
-                    max_value = np.max(concentration_profile[i][t])
+                    min_value = np.min(frame[i])
+                    max_value = np.max(frame[i])
                     plotting_range.append([min_value, max_value])
 
             # Generate and save plots
@@ -95,7 +103,7 @@ def plot_concentration(path, figure_parameters, time_point=-1,
             # concentration profile plots, the axs object needs to be indexed
             if len(list(figure_parameters['component_indices'])) > 1:
                 for i in list(figure_parameters['component_indices']):
-                    cs = axs[i].tricontourf(mesh.x, mesh.y, concentration_profile[i][t],
+                    cs = raster.tricontourf(axs[i], frame[i],
                                             levels=np.linspace(plotting_range[i][0], plotting_range[i][1] + 0.01, 256),
                                             cmap=figure_parameters['color_map'][i])
 
@@ -110,7 +118,7 @@ def plot_concentration(path, figure_parameters, time_point=-1,
                         axs[i].set_title(figure_parameters['titles'][i], fontsize=40)
             else:
                 for i in list(figure_parameters['component_indices']):
-                    cs = axs.tricontourf(mesh.x, mesh.y, concentration_profile[i][t],
+                    cs = raster.tricontourf(axs, frame[i],
                                          levels=np.linspace(plotting_range[i][0], plotting_range[i][1] + 0.01, 256),
                                          cmap=figure_parameters['color_map'][i])
 
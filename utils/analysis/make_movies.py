@@ -3,6 +3,9 @@
 """
 import utils.file_operations as file_operations
 import utils.simulation_helper as simulation_helper
+from utils.analysis.raster import get_mesh_raster
+from utils.mesh_transfer import read_frames
+from utils.file_operations import read_frame_extrema
 import argparse
 import re
 import h5py
@@ -29,7 +32,7 @@ import subprocess
 # plt.rcParams["text.usetex"] = True
 
 
-def write_movies_two_component_2d(path, hdf5_file, movie_parameters, mesh, fps=60):
+def write_movies_two_component_2d(path, hdf5_file, movie_parameters, mesh, fps=60, geometry=None):
     """Function that writes out movies of concentration profiles for 2 component simulations in 2D
 
     Args:
@@ -37,8 +40,13 @@ def write_movies_two_component_2d(path, hdf5_file, movie_parameters, mesh, fps=6
         hdf5_file (string): Name of the hdf5 file that contains concentration profiles of the 2 components in 2D
         mesh (fipy.mesh): A fipy mesh object that contains mesh.x and mesh.y coordinates
         movie_parameters (dict): A dictionary that contains information on how to make the plots. This is read from
-                                 the file movie_parameters.txt
+                                 the file movie_parameters.txt. If it contains the key raster_pixels, frames are drawn
+                                 as images on a pixel grid of that size instead of filled contours.
         fps (int): Frame per second to stitch together to make the movie. Default value is 5.
+        geometry (Geometry): Geometry of the simulation if it only solves a symmetric part of the domain. The fields are
+                             then expanded to mesh, which must be the mesh of the full domain.
+                             Frames of simulations with remeshing are transferred to the mesh of the geometry, or to
+                             mesh if the geometry is not given.
     """
 
     # make directory to store the movies
@@ -55,47 +63,47 @@ def write_movies_two_component_2d(path, hdf5_file, movie_parameters, mesh, fps=6
         for i in range(int(movie_parameters['num_components'])):
             concentration_profile.append(concentration_dynamics['c_{index}'.format(index=i)])
 
-        # Get upper and lower limits of the concentration values from the concentration profile data
+        # Get upper and lower limits of the concentration values and the number of frames with simulation data
+        frame_min, frame_max, valid_frames = read_frame_extrema(concentration_dynamics,
+                                                                int(movie_parameters['num_components']))
         plotting_range = []
         for i in range(int(movie_parameters['num_components'])):
             # check if plotting range is explicitly specified in movie_parameters
             if 'c{index}_range'.format(index=i) in movie_parameters.keys():
                 plotting_range.append(movie_parameters['c{index}_range'.format(index=i)])
             else:
-                min_value = np.min(concentration_profile[i][0])
-                max_value = np.max(concentration_profile[i][0])
-                for t in range(1, concentration_profile[0].shape[0]):
-                    if min_value > np.min(concentration_profile[i][t]) and np.min(concentration_profile[i][t]) !=0:
-                        min_value = np.min(concentration_profile[i][t])
-                    if max_value < np.max(concentration_profile[i][t]):
-                        max_value = np.max(concentration_profile[i][t])
+                # Frames with a minimum of exactly 0 are skipped, except the first frame
+                min_value = np.min(frame_min[i][:1])
+                later_minima = frame_min[i][1:][frame_min[i][1:] != 0]
+                if len(later_minima):
+                    min_value = min(min_value, np.min(later_minima))
+                max_value = np.max(frame_max[i])
                 plotting_range.append([min_value, max_value])
 
-        for t in range(concentration_profile[0].shape[0]):
-            # Plot and save plots at each time point before stitching them together into a movie
+        # The triangulation of the mesh is computed once and reused for every frame
+        raster = get_mesh_raster(mesh, pixels=int(movie_parameters.get('raster_pixels', 256)))
 
-            # Check if we have reached the end of the movie
-            flag = False
-            zero_component_counter = 0
-            for i in range(int(movie_parameters['num_components'])):
-                if np.all(concentration_profile[i][t] == 0):
-                    zero_component_counter = zero_component_counter + 1
-            if zero_component_counter == int(movie_parameters['num_components']):
-                flag = True
-            if flag:
-                break
+        for t in range(valid_frames):
+            # Plot and save plots at each time point before stitching them together into a movie
 
             # Generate and save plots
             fig, ax = plt.subplots(1, int(movie_parameters['num_components']), figsize=movie_parameters['figure_size'])
             for i in range(int(movie_parameters['num_components'])):
+                name = 'c_{index}'.format(index=i)
+                if geometry is not None:
+                    values = geometry.expand_to_full_mesh(read_frames(concentration_dynamics, name, t, geometry.mesh))
+                else:
+                    values = read_frames(concentration_dynamics, name, t, mesh)
                 try:
-                    cs = ax[i].tricontourf(mesh.x, mesh.y, concentration_profile[i][t],
-                                        levels = np.linspace(int(np.floor(plotting_range[i][0]*100))*0.01,
-                                                                int(np.ceil(plotting_range[i][1]*100))*0.01,
-                                                                256),
-                                        #    vmin=plotting_range[i][0],
-                                        #    vmax=plotting_range[i][1],
-                                        cmap=movie_parameters['color_map'][i])
+                    levels = np.linspace(int(np.floor(plotting_range[i][0]*100))*0.01,
+                                         int(np.ceil(plotting_range[i][1]*100))*0.01,
+                                         256)
+                    if 'raster_pixels' in movie_parameters.keys():
+                        cs = raster.imshow(ax[i], values, vmin=levels[0], vmax=levels[-1],
+                                           cmap=movie_parameters['color_map'][i])
+                    else:
+                        cs = raster.tricontourf(ax[i], values, levels=levels,
+                                                cmap=movie_parameters['color_map'][i])
                     # ax[i].tick_params(axis='both', which='major', labelsize=20)
                     ax[i].xaxis.set_tick_params(labelbottom=False, bottom=False)
                     ax[i].yaxis.set_tick_params(labelleft=False, left=False)
@@ -215,7 +223,7 @@ if __name__ == "__main__":
             if movie_maker is None:
                 print("Could not find an appropriate function to make movies ...")
             else:
-                movie_maker(root, fi, movie_params, sim_geometry.mesh)
+                movie_maker(root, fi, movie_params, sim_geometry.get_full_mesh(), geometry=sim_geometry)
 
     if not found_at_least_one:
         print('Could not find any hdf5 files in the supplied directory!')
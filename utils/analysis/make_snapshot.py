@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 from utils.file_operations import input_parse
 from utils.simulation_helper import set_mesh_geometry
+from utils.mesh_transfer import read_frames
 from utils.analysis.make_movies import write_movies_two_component_2d
 import os
 import argparse
@@ -36,6 +37,7 @@ class simDir:
         if geo:
             # Load Gmsh geometry
             self.geometry = set_mesh_geometry(self.params)
+            self.mesh = self.geometry.get_full_mesh()
         if hdf5:
             # Load concentration profile
             with h5py.File(self.hdf5_file, mode="r") as concentration_dynamics:
@@ -43,7 +45,9 @@ class simDir:
                 self.concentration_profile = []
                 for i in range(int(self.movie_params['num_components'])):
                     self.concentration_profile.append(
-                        concentration_dynamics['c_{index}'.format(index=i)][:]
+                        self.geometry.expand_to_full_mesh(read_frames(concentration_dynamics,
+                                                                      'c_{index}'.format(index=i), slice(None),
+                                                                      self.geometry.mesh))
                         )
     def makeSubdirectory(self,subdirectory):
         # Make a directory within the simulation directory
@@ -72,14 +76,15 @@ class simDir:
         write_movies_two_component_2d(self.directory,
                                       self.hdf5_file,
                                       self.movie_params,
-                                      self.geometry.mesh)
+                                      self.mesh,
+                                      geometry=self.geometry)
     def makeProteinFigure(self):
         subdir_path = self.makeSubdirectory("figures")
 
         # Generate and save plots
         fig, ax = plt.subplots(1, int(self.movie_params['num_components']), figsize=self.movie_params['figure_size'])
         for i in range(int(self.movie_params['num_components'])):
-            cs = ax[i].tricontourf(self.geometry.mesh.x, self.geometry.mesh.y, self.concentration_profile[i][t],
+            cs = ax[i].tricontourf(self.mesh.x, self.mesh.y, self.concentration_profile[i][t],
                                 levels=np.linspace(int(self.plotting_range[i][0]*100)*0.01,
                                                     int(self.plotting_range[i][1]*100)*0.01,
                                                     256),
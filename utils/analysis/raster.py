@@ -0,0 +1,150 @@
+"""Module that caches the triangulation of a mesh and the interpolation of cell values onto a regular pixel grid, so
+that plots and image analysis of many frames on the same mesh do not repeat the triangulation.
+"""
+
+import weakref
+import numpy as np
+import scipy.sparse as sparse
+from matplotlib import tri
+
+
+# Cache of MeshRaster objects for every mesh that has been plotted. The entries are dropped when the mesh is garbage
+# collected.
+_RASTER_CACHE = weakref.WeakKeyDictionary()
+
+
+def barycentric_interpolation_matrix(x, y, triangles, triangle_index, xq, yq):
+    """Build a sparse matrix that linearly interpolates values at the points (x, y) onto query points (xq, yq)
+
+    Args:
+        x (numpy.ndarray): x coordinates of the data points
+
+        y (numpy.ndarray): y coordinates of the data points
+
+        triangles (numpy.ndarray): An mx3 array of indices into x and y that describes the triangulation of the data
+        points
+
+        triangle_index (numpy.ndarray): Index of the triangle that contains each query point. Points outside the
+        triangulation have an index of -1
+
+        xq (numpy.ndarray): x coordinates of the query points
+
+        yq (numpy.ndarray): y coordinates of the query points
+
+    Returns:
+        interpolation_matrix (scipy.sparse.csr_matrix): A (number of query points) x (number of data points) matrix.
+        Rows of query points outside the triangulation are empty.
+    """
+    inside = np.flatnonzero(triangle_index >= 0)
+    vertices = triangles[triangle_index[inside]]
+    x1, x2, x3 = x[vertices[:, 0]], x[vertices[:, 1]], x[vertices[:, 2]]
+    y1, y2, y3 = y[vertices[:, 0]], y[vertices[:, 1]], y[vertices[:, 2]]
+    determinant = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
+    weight_1 = ((y2 - y3) * (xq[inside] - x3) + (x3 - x2) * (yq[inside] - y3)) / determinant
+    weight_2 = ((y3 - y1) * (xq[inside] - x3) + (x1 - x3) * (yq[inside] - y3)) / determinant
+    weight_3 = 1.0 - weight_1 - weight_2
+
+    rows = np.repeat(inside, 3)
+    columns = vertices.ravel()
+    weights = np.column_stack([weight_1, weight_2, weight_3]).ravel()
+    return sparse.csr_matrix((weights, (rows, columns)), shape=(len(xq), len(x)))
+
+
+class MeshRaster(object):
+    """Triangulation of the cell centers of a 2D mesh together with a linear interpolation onto a regular pixel grid.
+
+    The triangulation can be passed directly to :meth:`matplotlib.axes.Axes.tricontourf` and the pixel grid is used to
+    render a frame with :meth:`matplotlib.axes.Axes.imshow` after a single sparse matrix-vector product.
+    """
+
+    def __init__(self, x, y, pixels=256):
+        """Initialize an object of :class:`MeshRaster`.
+
+        Args:
+            x (numpy.ndarray): x coordinates of the cell centers
+
+            y (numpy.ndarray): y coordinates of the cell centers
+
+            pixels (int): Number of pixels along the longer side of the bounding box of the mesh
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.triangulation = tri.Triangulation(x, y)
+
+        # Regular pixel grid with square pixels that covers the bounding box of the cell centers
+        self.extent = [x.min(), x.max(), y.min(), y.max()]
+        pixel_size = max(self.extent[1] - self.extent[0], self.extent[3] - self.extent[2]) / (pixels - 1)
+        self.nx = int(round((self.extent[1] - self.extent[0]) / pixel_size)) + 1
+        self.ny = int(round((self.extent[3] - self.extent[2]) / pixel_size)) + 1
+        xq, yq = np.meshgrid(np.linspace(self.extent[0], self.extent[1], self.nx),
+                             np.linspace(self.extent[2], self.extent[3], self.ny))
+        xq = xq.ravel()
+        yq = yq.ravel()
+
+        triangle_index = self.triangulation.get_trifinder()(xq, yq)
+        self.interpolation_matrix = barycentric_interpolation_matrix(x, y, self.triangulation.triangles,
+                                                                     triangle_index, xq, yq)
+        # Pixels outside the mesh are left blank in the images
+        self.outside = triangle_index < 0
+
+    def rasterize(self, values):
+        """Interpolate cell values onto the pixel grid
+
+        Args:
+            values (numpy.ndarray): Values at the cell centers. A 2D array of shape (frames, cells) rasterizes every
+            frame at once.
+
+        Returns:
+            image (numpy.ndarray): An array of shape (ny, nx), or (frames, ny, nx), with NaN outside the mesh
+        """
+        values = np.asarray(values, dtype=float)
+        image = self.interpolation_matrix @ values.T
+        image[self.outside] = np.nan
+        return image.T.reshape(values.shape[:-1] + (self.ny, self.nx))
+
+    def imshow(self, ax, values, **kwargs):
+        """Plot cell values as an image on the pixel grid
+
+        Args:
+            ax (matplotlib.axes.Axes): Axes to plot on
+
+            values (numpy.ndarray): Values at the cell centers
+
+            **kwargs: Keyword arguments passed on to :meth:`matplotlib.axes.Axes.imshow`
+
+        Returns:
+            image (matplotlib.image.AxesImage): The plotted image
+        """
+        return ax.imshow(self.rasterize(values), origin='lower', extent=self.extent, **kwargs)
+
+    def tricontourf(self, ax, values, **kwargs):
+        """Plot filled contours of cell values using the cached triangulation
+
+        Args:
+            ax (matplotlib.axes.Axes): Axes to plot on
+
+            values (numpy.ndarray): Values at the cell centers
+
+            **kwargs: Keyword arguments passed on to :meth:`matplotlib.axes.Axes.tricontourf`
+
+        Returns:
+            contour_set (matplotlib.tri.TriContourSet): The plotted contours
+        """
+        return ax.tricontourf(self.triangulation, values, **kwargs)
+
+
+def get_mesh_raster(mesh, pixels=256):
+    """Return the cached :class:`MeshRaster` of a mesh, building it on the first call
+
+    Args:
+        mesh (fipy.meshes.mesh): A 2D fipy mesh that contains mesh.x and mesh.y coordinates
+
+        pixels (int): Number of pixels along the longer side of the bounding box of the mesh
+
+    Returns:
+        raster (MeshRaster): Triangulation and pixel interpolation of the mesh
+    """
+    rasters = _RASTER_CACHE.setdefault(mesh, {})
+    if pixels not in rasters:
+        rasters[pixels] = MeshRaster(mesh.x.value, mesh.y.value, pixels=pixels)
+    return rasters[pixels]
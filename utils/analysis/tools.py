@@ -1,7 +1,9 @@
 #!/usr/bin/env python
-from utils.file_operations import input_parse
+from utils.file_operations import input_parse, read_frame_extrema
 from utils.simulation_helper import set_mesh_geometry
 from utils.analysis.make_movies import write_movies_two_component_2d
+from utils.analysis.raster import get_mesh_raster
+from utils.mesh_transfer import read_frames
 import os
 import argparse
 import h5py
@@ -57,20 +59,30 @@ class simDir:
             plot_limits: bool=True, condensate: bool=True,
             start=0, end=-1):
         if geo:
-            # Load Gmsh geometry
+            # Load Gmsh geometry. Simulations that only solve a symmetric part of the domain are analyzed on the mesh
+            # of the full domain.
             self.geometry = set_mesh_geometry(self.params)
-            self.xy = self.geometry.mesh.cellCenters.value.T
+            self.mesh = self.geometry.get_full_mesh()
+            self.xy = self.mesh.cellCenters.value.T
+            self.raster = get_mesh_raster(self.mesh)
         if hdf5:
             # Load concentration profile
             with h5py.File(self.hdf5_file, mode="r") as concentration_dynamics:
+                # Per-frame range of the concentrations and the number of frames with simulation data
+                frame_min, frame_max, valid_frames = read_frame_extrema(concentration_dynamics,
+                                                                        int(self.movie_params['num_components']))
+                frames = range(concentration_dynamics['c_0'].shape[0])[start:end]
+                first, last = frames.start, min(frames.stop, valid_frames)
+                self.frame_min = frame_min[:, first:last]
+                self.frame_max = frame_max[:, first:last]
                 # Read concentration profile data from files
                 self.concentration_profile = []
                 for i in range(int(self.movie_params['num_components'])):
-                    conc_arr = concentration_dynamics[f'c_{i}'][start:end]
-                    conc_arr = conc_arr[~np.all(conc_arr == 0, axis=1)]
+                    conc_arr = self.geometry.expand_to_full_mesh(read_frames(concentration_dynamics, f'c_{i}',
+                                                                             slice(first, last), self.geometry.mesh))
                     self.concentration_profile.append(conc_arr)
                 if "t" in concentration_dynamics.keys():
-                    self.time = np.ravel(concentration_dynamics["t"][start:end])
+                    self.time = np.ravel(concentration_dynamics["t"][first:last])
                 
             self.n_frames = len(self.concentration_profile[0])
         if plot_limits:
@@ -90,6 +102,8 @@ class simDir:
             # Check if plotting range is explicitly specified in movie_parameters
             if 'c{index}_range'.format(index=i) in self.movie_params.keys():
                 self.plotting_range.append(self.movie_params['c{index}_range'.format(index=i)])
+            elif hasattr(self, "frame_min"):
+                self.plotting_range.append([self.frame_min[i].min(), self.frame_max[i].max()])
             else:
                 min_value = conc[i].min()
                 max_value = conc[i].max()
@@ -99,8 +113,9 @@ class simDir:
         write_movies_two_component_2d(self.directory,
                                       self.hdf5_file.name,
                                       self.movie_params,
-                                      self.geometry.mesh,
-                                      fps = fps)
+                                      self.mesh,
+                                      fps = fps,
+                                      geometry = self.geometry)
     def makeFigure(self,
                    i:int,
                    n_rows:int=4,
@@ -114,13 +129,12 @@ class simDir:
         for t, frame in enumerate(frames):
             # Generate and save plots
             # axes = axes.flatten()
-            cs = axes[t].tricontourf(self.geometry.mesh.x,
-                                     self.geometry.mesh.y,
-                                     self.concentration_profile[i][frame],
-                                     levels=np.linspace(int(self.plotting_range[i][0]*100)*0.01,
-                                                        int(self.plotting_range[i][1]*100)*0.01,
-                                                        256),
-                                cmap=self.movie_params['color_map'][i])
+            cs = self.raster.tricontourf(axes[t],
+                                         self.concentration_profile[i][frame],
+                                         levels=np.linspace(int(self.plotting_range[i][0]*100)*0.01,
+                                                            int(self.plotting_range[i][1]*100)*0.01,
+                                                            256),
+                                         cmap=self.movie_params['color_map'][i])
             border = plt.Circle((0,0), self.params["radius"],
                                 color='tab:gray', fill=False, linewidth=2)
             axes[t].add_patch(border)
@@ -150,8 +164,7 @@ class simDir:
                    cmap=None):
         cmap = cmap or self.movie_params['color_map'][i]
         fig,ax = plt.subplots()
-        cs = ax.tricontourf(self.geometry.mesh.x,
-                            self.geometry.mesh.y,
+        cs = self.raster.tricontourf(ax,
                             self.concentration_profile[i][t],
                             levels = np.linspace(int(np.floor(self.plotting_range[i][0]*100))*0.01,
                                                     int(np.ceil(self.plotting_range[i][1]*100))*0.01,
@@ -175,6 +188,12 @@ class simDir:
         # cbar.ax.tick_params(labelsize=30)
         return fig,ax
 
+    def rasterize(self,
+                  i:int,
+                  frames=slice(None)):
+        # Interpolate the concentration profile onto a regular pixel grid for image analysis
+        return self.raster.rasterize(self.concentration_profile[i][frames])
+
     def condensate(self,
                    i:int=0,
                    resample_num_points:int=1000):
@@ -182,9 +201,9 @@ class simDir:
         self.condensate_conc = self.concentration_profile[i].copy()
         self.mask = self.condensate_conc>self.threshold
         self.condensate_conc[~self.mask]=0
-        self.com = ((self.condensate_conc*self.geometry.mesh.cellVolumes)\
+        self.com = ((self.condensate_conc*self.mesh.cellVolumes)\
             @ self.xy)\
-            /np.tile((self.condensate_conc*self.geometry.mesh.cellVolumes)\
+            /np.tile((self.condensate_conc*self.mesh.cellVolumes)\
             .sum(axis=1),(2,1)).T
 
         edge_lst = []
@@ -273,7 +292,7 @@ class simDir:
         fig.savefig(self.directory / "figures" / "condensate.png")
 
     def rna(self):
-        volumes = self.geometry.mesh.cellVolumes
+        volumes = self.mesh.cellVolumes
         volume_vector = np.reshape(volumes,(len(volumes),1))
         self.rna_amount = np.ravel(self.concentration_profile[1]@volume_vector)
     
@@ -288,7 +307,7 @@ class simDir:
         dct["rna_amount"] = self.rna_amount
         dct["c_light"] = np.nanmean(np.where(~self.mask,self.concentration_profile[0],np.nan),axis=1)
         dct["c_dense"] = np.nanmean(np.where(self.mask,self.concentration_profile[0],np.nan),axis=1)
-        dct["volume"] = (self.mask*self.geometry.mesh.cellVolumes).sum(axis=1)
+        dct["volume"] = (self.mask*self.mesh.cellVolumes).sum(axis=1)
         velocity = np.diff(self.com[:,0])/np.diff(time)
         dct["velocity"] = velocity
         dct["aspect"] = self.aspect_ratio
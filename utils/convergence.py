@@ -0,0 +1,161 @@
+"""Module that detects when a simulation has settled into a steady state or a limit cycle.
+"""
+
+import collections
+import numpy as np
+from . import parallel
+
+
+class ConvergenceMonitor(object):
+    """Watch the rate of change of the concentrations, the total amount of RNA and the centroid of the condensate to
+    detect when a simulation has reached a steady state or a periodic orbit.
+
+    The observables are recorded at every accepted time step over a sliding window of simulation time. The simulation
+    is at a steady state when, over the whole window, the maximum rate of change of the concentrations, the relative
+    rate of change of the amount of RNA and the speed of the centroid all stay below the tolerance. The simulation is
+    on a limit cycle when the amount of RNA oscillates around the middle of its range over the window with periods and
+    amplitudes that agree to within a relative tolerance over a number of consecutive cycles. The window should be
+    longer than the period of the oscillations.
+    """
+
+    def __init__(self, mesh, tolerance=1e-6, window=500.0, cycles=5, cycle_tolerance=0.01):
+        """Initialize an object of :class:`ConvergenceMonitor`.
+
+        Args:
+            mesh (fipy.Mesh): Mesh of the simulation, used to integrate the concentrations over the domain
+
+            tolerance (float): Largest rate of change of the observables at a steady state
+
+            window (float): Interval of simulation time over which the observables are compared
+
+            cycles (int): Number of consecutive cycles whose periods and amplitudes must agree for a limit cycle
+
+            cycle_tolerance (float): Largest relative spread of the periods and amplitudes of the cycles
+        """
+        self.tolerance = tolerance
+        self.window = window
+        self.cycles = int(cycles)
+        self.cycle_tolerance = cycle_tolerance
+        # The observables are calculated from the values in all cells of the mesh, so that every process of a parallel
+        # run reaches the same decision
+        self._cell_volumes = parallel.global_cell_volumes(mesh)
+        self._cell_centers = mesh.cellCenters.globalValue
+        self.reset()
+
+    def set_mesh(self, mesh):
+        """Use a new mesh of the simulation, after remeshing. The observables do not depend on the mesh."""
+        self._cell_volumes = parallel.global_cell_volumes(mesh)
+        self._cell_centers = mesh.cellCenters.globalValue
+
+    def reset(self):
+        """Forget the history of the observables, for example after the parameters of the model change"""
+        self.state = None
+        self.detection = None
+        self._history = collections.deque()
+        self._crossings = collections.deque(maxlen=self.cycles + 1)
+        self._amplitudes = collections.deque(maxlen=self.cycles)
+        self._armed = False
+        self._cycle_min = np.inf
+        self._cycle_max = -np.inf
+
+    def _centroid(self, concentration):
+        """Centroid of the cells where the concentration is above the middle of its range"""
+        threshold = 0.5 * (np.min(concentration) + np.max(concentration))
+        weights = self._cell_volumes * np.where(concentration > threshold, concentration - threshold, 0.0)
+        if np.sum(weights) == 0.0:
+            # The concentration is uniform, so there is no condensate
+            weights = self._cell_volumes
+        return self._cell_centers @ weights / np.sum(weights)
+
+    def update(self, t, dt, max_change, c_vector):
+        """Record the observables after an accepted time step and check for a steady state or a limit cycle
+
+        Args:
+            t (float): Simulation time at the end of the time step
+
+            dt (float): Size of the time step
+
+            max_change (float): Maximum change in the concentration fields at any position over the time step
+
+            c_vector (list): Concentration variables. The first is the protein and the second is the RNA.
+
+        Returns:
+            state (string): 'steady_state' or 'limit_cycle' if the simulation has converged, and None otherwise
+        """
+        rate = max_change / dt
+        rna_amount = float(np.sum(c_vector[1].globalValue * self._cell_volumes))
+        centroid = self._centroid(c_vector[0].globalValue)
+
+        previous = self._history[-1] if self._history else None
+        self._history.append((t, rate, rna_amount, centroid))
+        # Keep the last sample that is at least a window old, so that the history spans the whole window
+        while len(self._history) > 1 and self._history[1][0] <= t - self.window:
+            self._history.popleft()
+        span = t - self._history[0][0]
+        if span < self.window:
+            return self.state
+
+        times, rates, rna_amounts, centroids = zip(*self._history)
+        rna_min = min(rna_amounts)
+        rna_max = max(rna_amounts)
+        centroids = np.array(centroids)
+        rna_rate = (rna_max - rna_min) / span / max(abs(rna_amount), np.finfo(float).tiny)
+        centroid_speed = np.linalg.norm(np.max(centroids, axis=0) - np.min(centroids, axis=0)) / span
+        if max(rates) <= self.tolerance and rna_rate <= self.tolerance and centroid_speed <= self.tolerance:
+            self._detect('steady_state', t, rate=max(rates), rna_amount=rna_amount, rna_rate=rna_rate,
+                         centroid=centroid, centroid_speed=centroid_speed)
+            return self.state
+
+        # Count the upward crossings of the amount of RNA through the middle of its range over the window. The
+        # hysteresis ignores small fluctuations around the middle.
+        middle = 0.5 * (rna_min + rna_max)
+        hysteresis = 0.1 * (rna_max - rna_min)
+        self._cycle_min = min(self._cycle_min, rna_amount)
+        self._cycle_max = max(self._cycle_max, rna_amount)
+        if rna_amount < middle - hysteresis:
+            self._armed = True
+        elif self._armed and rna_amount >= middle and previous is not None:
+            self._armed = False
+            t_previous, rna_previous = previous[0], previous[2]
+            crossing = t_previous + (middle - rna_previous) / (rna_amount - rna_previous) * (t - t_previous)
+            # The amplitude of a cycle is only known once the cycle has been completed
+            if self._crossings:
+                self._amplitudes.append(self._cycle_max - self._cycle_min)
+            self._crossings.append(crossing)
+            self._cycle_min = rna_amount
+            self._cycle_max = rna_amount
+
+            if len(self._amplitudes) == self.cycles:
+                periods = np.diff(self._crossings)
+                amplitudes = np.array(self._amplitudes)
+                period_spread = (np.max(periods) - np.min(periods)) / np.mean(periods)
+                amplitude_spread = (np.max(amplitudes) - np.min(amplitudes)) / np.mean(amplitudes)
+                if period_spread <= self.cycle_tolerance and amplitude_spread <= self.cycle_tolerance:
+                    self._detect('limit_cycle', t, period=float(np.mean(periods)), period_spread=period_spread,
+                                 amplitude=float(np.mean(amplitudes)), amplitude_spread=amplitude_spread,
+                                 rna_amount=rna_amount, centroid=centroid)
+        return self.state
+
+    def _detect(self, state, t, **values):
+        """Record the time and the values of the observables when the simulation first converges"""
+        if self.state is None:
+            self.state = state
+            self.detection = {'state': state, 't': float(t)}
+            self.detection.update({key: (np.asarray(value).tolist() if isinstance(value, np.ndarray) else float(value))
+                                   for key, value in values.items()})
+
+    def summary(self):
+        """Return the detection criteria, the detected state and the final values of the observables
+
+        Returns:
+            summary (dict): Dictionary that can be written out as JSON
+        """
+        final_state = None
+        if self._history:
+            t, rate, rna_amount, centroid = self._history[-1]
+            final_state = {'t': float(t), 'rate': float(rate), 'rna_amount': rna_amount,
+                           'centroid': np.asarray(centroid).tolist()}
+        return {'criteria': {'tolerance': self.tolerance, 'window': self.window, 'cycles': self.cycles,
+                             'cycle_tolerance': self.cycle_tolerance},
+                'detection': self.detection,
+                'final_state': final_state}
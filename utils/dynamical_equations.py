@@ -1,30 +1,402 @@
 """Module that assembles the model equations for spatiotemporal dynamics of concentration fields.
 """
 
+import collections
+import hashlib
 import fipy as fp
+from fipy.solvers.scipy.linearLUSolver import LinearLUSolver
 import numpy as np
+from scipy.sparse.linalg import splu
+from . import parallel
 from . import reaction_rates as rates
+from . import mesh_transfer
+from .profiler import NullProfiler
 import h5py
 
+# Names of the stages of the Strang splitting in step_once, used to report which equation did not converge
+SPLITTING_STAGES = ('c_0 first half step', 'c_1', 'c_0 second half step')
+# Equations of the BDF2 time step, which are swept in turn until both converge
+BDF2_STAGES = ('c_0 BDF2', 'c_1 BDF2')
+
 class DelayTracker:
-    def __init__(self, steps, tau, concentration, target_file):
+    def __init__(self, steps, tau, concentration, target_file, mesh=None):
         self.tau = tau
         self.times = np.ones(int(steps+1))*np.inf
         self.target_file = target_file
         self.concentration = concentration
         self.index = 0
+        # The frames in the file hold all cells of the mesh. On a partitioned mesh, each process keeps the cells of
+        # its partition
+        self.mesh = mesh
  
     def get_delay(self, time, step):
         self.times[step] = time
         if time-self.tau > 0:
             self.index = self.find_closest(time-self.tau)
-            with h5py.File(self.target_file, 'r') as f:
-                self.concentration = f["c_{index}".format(index=0)][self.index]
+            if parallel.number_of_processes() > 1:
+                frame = None
+                if parallel.is_root():
+                    with h5py.File(self.target_file, 'r') as f:
+                        frame = f["c_{index}".format(index=0)][self.index]
+                self.concentration = parallel.global_to_local(self.mesh, parallel.broadcast(frame))
+            else:
+                # Frames written on an earlier mesh of a simulation with remeshing are transferred to the current mesh
+                with h5py.File(self.target_file, 'r') as f:
+                    self.concentration = mesh_transfer.read_frames(f, "c_{index}".format(index=0), self.index,
+                                                                   self.mesh)
         return self.concentration
 
     def find_closest(self,time):
         return np.argmin((self.times-time)**2)
 
+class StepTransaction:
+    """Snapshot of the concentration fields at the start of a time step, so that a rejected step can be undone.
+
+    :meth:`step_once` updates the old values of the concentrations between the stages of the operator splitting, so
+    after a rejected step the concentrations are partially advanced. Restoring the snapshot lets the step be retried
+    with a smaller time step from the state it started from. The buffers are allocated once and reused for every step.
+    """
+
+    def __init__(self, c_vector):
+        """Initialize an object of :class:`StepTransaction`.
+
+        Args:
+            c_vector (list): List of concentration variables that are instances of the class
+            :class:`fipy.CellVariable` with old values
+        """
+        self._values = [np.empty_like(c.value) for c in c_vector]
+        self._old_values = [np.empty_like(c.old.value) for c in c_vector]
+
+    def begin(self, c_vector):
+        """Copy the current and old values of the concentrations into the snapshot buffers"""
+        for c, value, old_value in zip(c_vector, self._values, self._old_values):
+            value[...] = c.value
+            old_value[...] = c.old.value
+
+    def rollback(self, c_vector):
+        """Restore the current and old values of the concentrations from the snapshot buffers"""
+        for c, value, old_value in zip(c_vector, self._values, self._old_values):
+            c.setValue(value)
+            c.old.setValue(old_value)
+
+class CachedLUSolver(LinearLUSolver):
+    """LU solver that keeps the factorizations of the most recently used matrices.
+
+    The reaction-diffusion equation of species 2 is linear, so its matrix only changes when the time step or the
+    parameters of the equation change. Each factorization is stored under a hash of the matrix and reused while it
+    is among the cache_size most recently used ones, so that solving the equation only takes triangular solves. The
+    solve is otherwise the same as :class:`fipy.solvers.scipy.linearLUSolver.LinearLUSolver`.
+    """
+
+    def __init__(self, cache_size=8, **kwargs):
+        """Initialize an object of :class:`CachedLUSolver`.
+
+        Args:
+            cache_size (int): Maximum number of factorizations to keep
+
+            **kwargs: Arguments of :class:`fipy.solvers.scipy.linearLUSolver.LinearLUSolver`
+        """
+        super(CachedLUSolver, self).__init__(**kwargs)
+        self.cache_size = cache_size
+        self._factorizations = collections.OrderedDict()
+        # Number of solves that reused a factorization and that had to factorize the matrix
+        self.hits = 0
+        self.misses = 0
+
+    def _solve_(self, L, x, b):
+        """Solve the system of equations posed for SciPy with a cached factorization of L"""
+        maxdiag = max(np.absolute(L.diagonal()))
+        L = L * (1 / maxdiag)
+        b = b * (1 / maxdiag)
+        tolerance_scale, _ = self._adaptTolerance(L, x, b)
+
+        key = hashlib.sha1(L.data.tobytes() + L.indices.tobytes() + L.indptr.tobytes()).digest()
+        LU = self._factorizations.get(key)
+        if LU is None:
+            self.misses += 1
+            LU = splu(L.asformat("csc"), diag_pivot_thresh=maxdiag, relax=1, panel_size=10, permc_spec=3)
+            self._factorizations[key] = LU
+            if len(self._factorizations) > self.cache_size:
+                self._factorizations.popitem(last=False)
+        else:
+            self.hits += 1
+            self._factorizations.move_to_end(key)
+
+        for iteration in range(min(self.iterations, 10)):
+            residualVector, residual = self._residualVectorAndNorm(L, x, b)
+            if residual <= self.tolerance * tolerance_scale:
+                break
+            x[:] = x - LU.solve(residualVector)
+
+        self._setConvergence(suite="scipy", code=0, iterations=iteration + 1, residual=residual)
+        self.convergence.warn()
+        return x
+
+def create_solver(solver_type, tolerance, iterations):
+    """Create the fipy solver for the equation of species 1
+
+    If solver_type == 1: The default solver of fipy, which is an LU factorization with scipy.
+
+    If solver_type == 2: GMRES preconditioned with an incomplete LU factorization.
+
+    If solver_type == 3: GMRES preconditioned with smoothed aggregation algebraic multigrid. This requires the
+    optional package pyamg.
+
+    Args:
+        solver_type (integer): An integer value describing which solver to use
+
+        tolerance (float): Relative tolerance of the solver
+
+        iterations (int): Maximum number of iterations of the solver
+
+    Returns:
+        solver (fipy.solvers.solver.Solver): The fipy solver
+    """
+    # The other solvers use scipy, which cannot solve equations on a partitioned mesh
+    if solver_type != 1 and parallel.number_of_processes() > 1:
+        if parallel.is_root():
+            print("Warning: solver_type " + str(solver_type) + " is not available in parallel runs. Using the " +
+                  "default solver.")
+        solver_type = 1
+    if solver_type == 1:
+        return fp.DefaultSolver(tolerance=tolerance, iterations=iterations)
+    elif solver_type == 2:
+        from fipy.solvers.scipy import LinearGMRESSolver
+        from fipy.solvers.scipy.preconditioners import ILUPreconditioner
+        return LinearGMRESSolver(tolerance=tolerance, iterations=iterations, precon=ILUPreconditioner())
+    elif solver_type == 3:
+        try:
+            from fipy.solvers.pyAMG.preconditioners import SmoothedAggregationPreconditioner
+        except ImportError:
+            raise ImportError("solver_type = 3 requires pyamg, which can be installed with pip install pyamg")
+        from fipy.solvers.scipy import LinearGMRESSolver
+        return LinearGMRESSolver(tolerance=tolerance, iterations=iterations,
+                                 precon=SmoothedAggregationPreconditioner())
+    else:
+        raise ValueError("Unknown solver_type " + str(solver_type) + ". It must be 1, 2 or 3.")
+
+
+class AndersonAccelerator(object):
+    """Anderson acceleration of the fixed-point iteration formed by the sweeps of an equation
+
+    A sweep maps the current iterate :math:`x_k` to :math:`g(x_k)`, the solution of the equation with its coefficients
+    evaluated at :math:`x_k`. Instead of taking :math:`g(x_k)` as the next iterate, Anderson acceleration combines the
+    outputs of the last depth + 1 sweeps with the weights that minimize the norm of the combined fixed-point residual
+    :math:`g(x) - x` in the least-squares sense. This converges in fewer sweeps than plain sweeping when the sweeps
+    contract slowly, for example near sharp interfaces.
+    """
+
+    def __init__(self, mesh, depth=3, regularization=1e-10):
+        """Initialize an object of :class:`AndersonAccelerator`.
+
+        Args:
+            mesh (fipy.Mesh): Mesh of the concentration variables, used to reduce the inner products over all processes
+
+            depth (int): Number of previous sweeps that are combined with the last one
+
+            regularization (float): Relative Tikhonov regularization of the least-squares problem for the weights
+        """
+        self.depth = int(depth)
+        self.regularization = regularization
+        self._mesh = mesh
+        self._owned = parallel.owned_cells(mesh)
+        self.reset()
+
+    def reset(self):
+        """Forget the previous iterates, at the start of each stage of the splitting"""
+        self._x = collections.deque(maxlen=self.depth + 1)
+        self._g = collections.deque(maxlen=self.depth + 1)
+
+    def mix(self, x, g):
+        """Return the next iterate given the last iterate and the result of sweeping the equation from it
+
+        Args:
+            x (numpy.ndarray): Values of the concentration before the sweep
+
+            g (numpy.ndarray): Values of the concentration after the sweep
+
+        Returns:
+            x (numpy.ndarray): Values of the concentration to sweep from next
+        """
+        self._x.append(np.array(x, copy=True))
+        self._g.append(np.array(g, copy=True))
+        if len(self._x) < 2:
+            return g
+        f = [g_i - x_i for x_i, g_i in zip(self._x, self._g)]
+        delta_f = np.array([f[i + 1] - f[i] for i in range(len(f) - 1)])
+        delta_g = np.array([self._g[i + 1] - self._g[i] for i in range(len(f) - 1)])
+        # Normal equations of the least-squares problem. The inner products are summed over the cells owned by each
+        # process so that all processes use the same weights.
+        gram = parallel.global_array_sum(self._mesh, delta_f[:, self._owned] @ delta_f[:, self._owned].T)
+        rhs = parallel.global_array_sum(self._mesh, delta_f[:, self._owned] @ f[-1][self._owned])
+        gram = gram + self.regularization * max(np.trace(gram), np.finfo(float).tiny) * np.eye(len(rhs))
+        try:
+            weights = np.linalg.solve(gram, rhs)
+        except np.linalg.LinAlgError:
+            return g
+        mixed = g - weights @ delta_g
+        if not np.all(np.isfinite(mixed)):
+            return g
+        return mixed
+
+
+class BDF2Integrator(object):
+    """Variable step size, second order backward differentiation formula (BDF2) for the model equations
+
+    With the ratio :math:`\\omega = dt_n / dt_{n-1}` of successive time steps, each equation
+    :math:`\\partial_t c = f(c)` is solved as
+
+    .. math::
+        \\frac{1 + 2\\omega}{1 + \\omega} \\frac{c_{n+1} - c_n}{dt_n} = f(c_{n+1})
+        + \\frac{\\omega}{1 + \\omega} \\frac{c_n - c_{n-1}}{dt_{n-1}}
+
+    The old values of the concentrations hold :math:`c_n`. This class keeps the concentrations at the start of the
+    previous two time steps, :math:`c_{n-1}` for the formula and :math:`c_{n-2}` to estimate the local truncation error.
+    The first time step, and time steps that grow by a factor of :math:`1 + \\sqrt{2}` or more, for which variable
+    step BDF2 is not zero-stable, are taken with backward Euler.
+    """
+
+    max_step_ratio = 1.0 + np.sqrt(2.0)
+
+    def __init__(self, c_vector):
+        """Initialize an object of :class:`BDF2Integrator`.
+
+        Args:
+            c_vector (list): Concentration variables that the equations are solved for
+        """
+        # Coefficients of the transient term and of the rate of change over the previous time step. They are fipy
+        # Variables, so the assembled equations use their new values at every time step.
+        self.a = fp.Variable(value=1.0)
+        self.b = fp.Variable(value=0.0)
+        self.velocity = [fp.CellVariable(mesh=c.mesh, value=0.0) for c in c_vector]
+        self.second_order = False
+        self._mesh = c_vector[0].mesh
+        self._states = collections.deque(maxlen=3)
+
+    def begin_step(self, c_vector, t, dt):
+        """Set the coefficients for an attempt at a time step of dt from time t. The concentrations at the start of
+        the time step are recorded at the first attempt.
+
+        Args:
+            c_vector (list): Concentration variables whose old values hold the concentrations at time t
+
+            t (float): Time at the start of the time step
+
+            dt (float): Size of the time step
+        """
+        if not self._states or self._states[-1][0] != t:
+            self._states.append((t, [np.array(c.old.value, copy=True) for c in c_vector]))
+        self.second_order = False
+        if len(self._states) >= 2:
+            t_previous, previous_values = self._states[-2]
+            dt_previous = t - t_previous
+            omega = dt / dt_previous
+            if omega < self.max_step_ratio:
+                self.second_order = True
+                self.a.setValue((1.0 + 2.0 * omega) / (1.0 + omega))
+                self.b.setValue(omega / (1.0 + omega))
+                for velocity, c, previous in zip(self.velocity, c_vector, previous_values):
+                    velocity.setValue((c.old.value - previous) / dt_previous)
+                return
+        self.a.setValue(1.0)
+        self.b.setValue(0.0)
+
+    def estimate_error(self, c_vector, t, dt):
+        """Estimate the local truncation error of a second order time step of dt from time t
+
+        The error of variable step BDF2 is :math:`dt_n^3 (1 + \\omega)^2 / (6 \\omega (1 + 2 \\omega)) c'''`, where
+        the third time derivative is estimated from the divided differences of the concentrations at the end of the
+        time step and at the start of the last three time steps.
+
+        Args:
+            c_vector (list): Concentration variables at the end of the time step
+
+            t (float): Time at the start of the time step
+
+            dt (float): Size of the time step
+
+        Returns:
+            error (float): Largest estimated error of any concentration, or None if the time step was not second order
+            or there are not enough previous time steps
+        """
+        if not self.second_order or len(self._states) < 3:
+            return None
+        times = [state[0] for state in self._states] + [t + dt]
+        omega = dt / (times[2] - times[1])
+        constant = dt ** 3 * (1.0 + omega) ** 2 / (omega * (1.0 + 2.0 * omega))
+        error = 0.0
+        for i, c in enumerate(c_vector):
+            differences = [state[1][i] for state in self._states] + [c.value]
+            for order in range(1, 4):
+                differences = [(differences[k + 1] - differences[k]) / (times[k + order] - times[k])
+                               for k in range(len(differences) - 1)]
+            error = max(error, parallel.global_max(fp.CellVariable(mesh=self._mesh,
+                                                                   value=constant * abs(differences[0]))))
+        return float(error)
+
+
+def sweep_stage(equation, var, dt, solver, max_residual, max_sweeps, accelerator=None, linear=False):
+    """Sweep an equation over a time step until its residual falls below max_residual
+
+    Args:
+        equation (fipy.terms.term.Term): Equation of one stage of the splitting
+
+        var (fipy.CellVariable): Concentration that the equation is solved for
+
+        dt (float): Size of the time step of the stage
+
+        solver (fipy.solvers.solver.Solver): Solver of the linearized equation
+
+        max_residual (float): Maximum value of the residual acceptable when sweeping the equation
+
+        max_sweeps (int): Maximum number of sweeps
+
+        accelerator (AndersonAccelerator): If not None, the sweeps are accelerated with Anderson mixing. The stage is
+        then abandoned as soon as the rate of convergence shows that the residual will not fall below max_residual
+        within max_sweeps sweeps, so that a time step that is too large is rejected early.
+
+        linear (bool): If True, the equation is linear and is solved once. The residual is that of the linear solver.
+
+    Returns:
+        residual (float): Residual of the last sweep
+
+        sweeps (int): Number of sweeps
+
+        linear_iterations (int): Total number of iterations of the linear solver
+
+        rate (float): Average ratio of the residuals of successive sweeps, or 0 if the stage took a single sweep
+    """
+    residual = 1e6
+    first_residual = None
+    sweeps = 0
+    linear_iterations = 0
+    if accelerator is not None:
+        accelerator.reset()
+    for i in range(1 if linear else max_sweeps):
+        previous = np.array(var.value, copy=True) if accelerator is not None else None
+        residual = equation.sweep(dt=dt, var=var, solver=solver)
+        sweeps += 1
+        linear_iterations += solver.convergence.iterations
+        if linear:
+            residual = solver.convergence.residual
+        if first_residual is None:
+            first_residual = np.max(residual)
+        if np.max(residual) < max_residual:
+            break
+        # Further sweeps cannot recover from a solution that has blown up
+        if not np.all(np.isfinite(residual)):
+            break
+        if accelerator is not None:
+            if sweeps >= 3:
+                rate = (np.max(residual) / first_residual) ** (1.0 / (sweeps - 1))
+                if rate >= 1.0 or sweeps + np.log(max_residual / np.max(residual)) / np.log(rate) > max_sweeps:
+                    break
+            var.setValue(accelerator.mix(previous, var.value))
+    rate = 0.0
+    if sweeps > 1 and first_residual > 0.0:
+        rate = float((np.max(residual) / first_residual) ** (1.0 / (sweeps - 1)))
+    return residual, sweeps, linear_iterations, rate
+
 class TwoComponentModel(object):
     """Two component system, with Model B for species 1 and Model AB or reaction-diffusion with reactions for species 2
 
@@ -49,7 +421,14 @@ class TwoComponentModel(object):
     with a rate constant :math:`k_2`
     """
 
-    def __init__(self, mobility_1, mobility_2, mobility_3, modelAB_dynamics_type, degradation_constant, free_energy, ratio):
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them. The degradation constant is held by the degradation
+    # term
+    variable_parameters = {'mobility_1': '_M1', 'mobility_2': '_M2', 'degradation_constant': None}
+
+    def __init__(self, mobility_1, mobility_2, mobility_3, modelAB_dynamics_type, degradation_constant, free_energy, ratio,
+                 factorization_cache_size=8, solver_type=1, time_scheme=1, stabilization_constant=None,
+                 anderson_depth=0, time_integrator=1):
         """Initialize an object of :class:`TwoComponentModelBModelAB`.
 
         Args:
@@ -63,15 +442,39 @@ class TwoComponentModel(object):
 
             free_energy: An instance of one of the free energy classes present in :mod:`utils.free_energy`
 
+            factorization_cache_size (int): Number of LU factorizations of the reaction-diffusion equation of species 2
+            to keep when modelAB_dynamics_type = 2. If 0, the equation is solved with the default solver.
+
+            solver_type (integer): Solver for the equation of species 1, as described in :func:`create_solver`
+
+            time_scheme (integer): If = 1, the equation of species 1 is swept with the Jacobian of the free energy
+            updated at every sweep. If = 2, linearly stabilized scheme, in which the bulk chemical potential is taken
+            from the start of the time step and the stabilization term :math:`S (c_1 - c^{old}_1)` is implicit. The
+            equation is then linear and is solved once per time step, and the free energy decreases for any time
+            step if :math:`S` is at least half the largest second derivative of the bulk free energy.
+
+            stabilization_constant (float): The constant :math:`S` of the stabilized scheme. If None, it is half the
+            largest second derivative of the bulk free energy for the concentrations when the model equations are set
+            up or the parameters of the free energy change, which does not bound the second derivative at the
+            concentrations that the simulation reaches later
+
+            anderson_depth (integer): If > 0, the sweeps of each stage of the splitting are accelerated with Anderson
+            mixing over this many previous sweeps, as described in :class:`AndersonAccelerator`
+
+            time_integrator (integer): If = 1, Strang splitting of backward Euler steps of the equations of species 1 and
+            2. If = 2, the equations are discretized with the second order :class:`BDF2Integrator` and swept in turn
+            until both converge, without splitting. This requires time_scheme = 1.
+
             c_vector (numpy.ndarray): A 2x1 vector of species concentrations that looks like :math:`[c_1, c_2]`.
 
             The concentration variables :math:`c_1` and :math:`c_2` must be instances of the class
             :class:`fipy.CellVariable`
         """
 
-        # Parameters of the dynamical equations
-        self._M1 = mobility_1
-        self._M2 = mobility_2
+        # Parameters of the dynamical equations. The mobilities are fipy Variables so that they can be changed
+        # during a simulation with update_parameters
+        self._M1 = fp.Variable(value=mobility_1)
+        self._M2 = fp.Variable(value=mobility_2)
         # Localization locus dynamics
         self._M3 = mobility_3
         self._modelAB_dynamics_type = modelAB_dynamics_type
@@ -81,9 +484,69 @@ class TwoComponentModel(object):
         self._degradation_term = rates.FirstOrderReaction(k=degradation_constant)
         # Define model equations
         self._equations = None
-        # The fipy solver used to solve the model equations
+        # The fipy solver used to solve the model equations, and the solver used for the equation of species 2
         self._solver = None
+        self._linear_solver = None
+        self._factorization_cache_size = int(factorization_cache_size)
+        self._solver_type = int(solver_type)
+        self._time_scheme = int(time_scheme)
+        self._stabilization_constant = fp.Variable(value=stabilization_constant if stabilization_constant is not None
+                                                   else 0.0)
+        self._estimate_stabilization_constant = stabilization_constant is None
+        self._anderson_depth = int(anderson_depth)
+        self._accelerator = None
+        self._time_integrator = int(time_integrator)
+        if self._time_integrator == 2 and self._time_scheme == 2:
+            raise ValueError("time_integrator = 2 requires time_scheme = 1, since the stabilized scheme is first order")
+        self._bdf2 = None
+        self._bdf2_equations = None
         self._ratio = int(ratio)
+        # Number of sweeps taken in the last call to step_once, and the total number of iterations of the linear
+        # solvers in these sweeps
+        self.sweeps = 0
+        self.linear_iterations = 0
+        # Largest average ratio of the residuals of successive sweeps over the stages of the last call to step_once
+        self.convergence_rate = 0.0
+        # Stage of the operator splitting that did not converge in the last call to step_once
+        self.failed_equation = None
+        # Times the phases of step_once when profiling is enabled
+        self.profiler = NullProfiler()
+
+    def update_parameters(self, **kwargs):
+        """Change model parameters in place. The model equations that have already been assembled use the new values
+        without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            if name == 'degradation_constant':
+                self._degradation_term.update_parameters(k=value)
+            else:
+                getattr(self, self.variable_parameters[name]).setValue(value)
+
+    def update_stabilization_constant(self, c_vector):
+        """Estimate the constant :math:`S` of the stabilized scheme as half the largest second derivative of the bulk
+        free energy for the current concentrations
+
+        This is called when the model equations are set up, and again when parameters of the free energy change in
+        place. The constant is not changed if it was given or if time_scheme = 1.
+
+        Args:
+            c_vector (numpy.ndarray): A vector of species concentrations that looks like :math:`[c_1, c_2, ...]`
+        """
+        if self._time_scheme == 2 and self._estimate_stabilization_constant:
+            jacobian = self._free_energy.calculate_jacobian(c_vector)
+            self._stabilization_constant.setValue(0.5 * max(0.0, float(np.max(jacobian[0][0].value))))
+
+    def update_production_parameters(self, **kwargs):
+        """Change parameters of the production term in place
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters` of the production term, named as in
+            :mod:`utils.reaction_rates`
+        """
+        self._production_term.update_parameters(**kwargs)
 
     def set_production_term(self, reaction_type, **kwargs):
         """ Sets the nature of the production term of species :math:`c_2` from :math:`c_1`
@@ -146,12 +609,23 @@ class TwoComponentModel(object):
 
         jacobian = self._free_energy.calculate_jacobian(c_vector)
 
-        eqn_1 = (fp.TransientTerm(coeff=1.0, var=c_vector[0])
-                 == fp.DiffusionTerm(coeff=self._M1 * jacobian[0][0], var=c_vector[0])
-                 + fp.DiffusionTerm(coeff=self._M1 * jacobian[0][1], var=c_vector[1])
-                 - fp.DiffusionTerm(coeff=(self._M1, self._free_energy.kappa), var=c_vector[0])
-                 - self._M1 * (self._free_energy.get_gaussian_function(c_vector[0].mesh, well_center)).faceGrad.divergence
-                 )
+        if self._time_scheme == 2:
+            # Linearly stabilized scheme. The bulk chemical potential and the explicit part of the stabilization term
+            # are evaluated with the old values, so that the matrix of the equation only depends on dt
+            self.update_stabilization_constant(c_vector)
+            mu_1_bulk = self._free_energy.calculate_mu_1_bulk([c_vector[0].old, c_vector[1]], well_center)
+            eqn_1 = (fp.TransientTerm(coeff=1.0, var=c_vector[0])
+                     == fp.DiffusionTerm(coeff=self._M1 * self._stabilization_constant, var=c_vector[0])
+                     - fp.DiffusionTerm(coeff=(self._M1, self._free_energy.kappa), var=c_vector[0])
+                     + self._M1 * (mu_1_bulk - self._stabilization_constant * c_vector[0].old).faceGrad.divergence
+                     )
+        else:
+            eqn_1 = (fp.TransientTerm(coeff=1.0, var=c_vector[0])
+                     == fp.DiffusionTerm(coeff=self._M1 * jacobian[0][0], var=c_vector[0])
+                     + fp.DiffusionTerm(coeff=self._M1 * jacobian[0][1], var=c_vector[1])
+                     - fp.DiffusionTerm(coeff=(self._M1, self._free_energy.kappa), var=c_vector[0])
+                     - self._M1 * (self._free_energy.get_gaussian_function(c_vector[0].mesh, well_center)).faceGrad.divergence
+                     )
 
         # Model AB dynamics or reaction-diffusion dynamics for species 2 with production and degradation reactions
         if self._modelAB_dynamics_type == 1:
@@ -172,15 +646,42 @@ class TwoComponentModel(object):
 
         ##### NOTE: This is legacy code, not used in the current simulations i.e., the locus equations have been removed from step_once #####
         # Localization locus dynamics
-        self._eqn_locus_x = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.x-well_center[0]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
-                           - self._M3 * self._free_energy._k_tilde *(well_center[0] - self._free_energy._r_p[0] - self._free_energy._rest_length[0])]
-        self._eqn_locus_y = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.y-well_center[1]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
-                           - self._M3 * self._free_energy._k_tilde *(well_center[1] - self._free_energy._r_p[1] - self._free_energy._rest_length[1])]
+        if c_vector[0].mesh.dim > 1:
+            self._eqn_locus_x = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.x-well_center[0]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
+                               - self._M3 * self._free_energy._k_tilde *(well_center[0] - self._free_energy._r_p[0] - self._free_energy._rest_length[0])]
+            self._eqn_locus_y = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.y-well_center[1]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
+                               - self._M3 * self._free_energy._k_tilde *(well_center[1] - self._free_energy._r_p[1] - self._free_energy._rest_length[1])]
+        else:
+            # The force on the locus vanishes by symmetry on the radial mesh of an axisymmetric simulation
+            self._eqn_locus_x = [fp.Variable(value=0.0), fp.Variable(value=0.0)]
+            self._eqn_locus_y = [fp.Variable(value=0.0), fp.Variable(value=0.0)]
         self._equations = [eqn_1, eqn_2, self._eqn_locus_x[0]+self._eqn_locus_x[1], self._eqn_locus_y[0]+self._eqn_locus_y[1]]
         ##### ------------------------------------------------------------------------------------------------------------------------- #####
 
+        # Equations of the BDF2 integrator, with the terms of the previous time step added to the model equations
+        if self._time_integrator == 2:
+            self._bdf2 = BDF2Integrator(c_vector[:2])
+            self._bdf2_equations = [
+                eqn_1 + (fp.TransientTerm(coeff=self._bdf2.a - 1.0, var=c_vector[0])
+                         == self._bdf2.b * self._bdf2.velocity[0]),
+                eqn_2 + (fp.TransientTerm(coeff=self._bdf2.a - 1.0, var=c_vector[1])
+                         == self._bdf2.b * self._bdf2.velocity[1])]
+
         # Define the relative tolerance of the fipy solver
-        self._solver = fp.DefaultSolver(tolerance=1e-10, iterations=2000)
+        self._solver = create_solver(self._solver_type, tolerance=1e-10, iterations=2000)
+        # The matrix of the stabilized equation for species 1 also only changes with dt and the parameters
+        if (self._time_scheme == 2 and self._solver_type == 1 and self._factorization_cache_size > 0
+                and parallel.number_of_processes() == 1):
+            self._solver = CachedLUSolver(cache_size=self._factorization_cache_size, tolerance=1e-10, iterations=2000)
+        if self._anderson_depth > 0:
+            self._accelerator = AndersonAccelerator(c_vector[0].mesh, depth=self._anderson_depth)
+        # Reuse the factorizations of the linear reaction-diffusion equation for species 2
+        if (self._modelAB_dynamics_type == 2 and self._factorization_cache_size > 0
+                and parallel.number_of_processes() == 1):
+            self._linear_solver = CachedLUSolver(cache_size=self._factorization_cache_size, tolerance=1e-10,
+                                                 iterations=2000)
+        else:
+            self._linear_solver = self._solver
 
     def step_once(self, c_vector, well_center, dt, t, step, max_residual, max_sweeps):
         """Function that solves the model equations over a time step of dt to get the concentration profiles.
@@ -211,32 +712,62 @@ class TwoComponentModel(object):
         residual_2 = 1e6
         residual_3 = 1e6
         has_converged = False
+        self.sweeps = 0
+        self.linear_iterations = 0
+        self.convergence_rate = 0.0
+        self.failed_equation = None
+
+        if self._time_integrator == 2:
+            return self._step_once_bdf2(c_vector, dt, t, max_residual, max_sweeps)
+
+        # The stabilized equation for species 1 is linear, so a single solve gives its solution over the time step
+        c_0_linear = self._time_scheme == 2
 
         # Strang Splitting
-        for i in range(max_sweeps):
-            residual_1 = self._equations[0].sweep(dt=0.5*dt, var=c_vector[0], solver=self._solver)
-            if np.max(residual_1) < max_residual:
-                break
-        max_change_c_1 = np.max(np.abs((c_vector[0] - c_vector[0].old).value))
+        residual_1, sweeps, linear_iterations, rate = sweep_stage(self._equations[0], c_vector[0], 0.5*dt, self._solver,
+                                                                  max_residual, max_sweeps, self._accelerator,
+                                                                  linear=c_0_linear)
+        self.sweeps += sweeps
+        self.linear_iterations += linear_iterations
+        self.convergence_rate = max(self.convergence_rate, rate)
+        # Further sweeps cannot recover from a solution that has blown up
+        if not np.all(np.isfinite(residual_1)):
+            self.failed_equation = SPLITTING_STAGES[0]
+            return False, np.array([residual_1, residual_2, residual_3]), np.inf
+        max_change_c_1 = parallel.global_max(abs(c_vector[0] - c_vector[0].old))
         c_vector[0].updateOld()
 
-        for i in range(max_sweeps):
-            residual_2 = self._equations[1].sweep(dt=dt, var=c_vector[1], solver=self._solver)
-            if np.max(residual_2) < max_residual:
-                break
-        max_change_c_2 = np.max(np.abs((c_vector[1] - c_vector[1].old).value))
+        residual_2, sweeps, linear_iterations, rate = sweep_stage(self._equations[1], c_vector[1], dt,
+                                                                  self._linear_solver, max_residual, max_sweeps,
+                                                                  self._accelerator)
+        self.sweeps += sweeps
+        self.linear_iterations += linear_iterations
+        self.convergence_rate = max(self.convergence_rate, rate)
+        # Further sweeps cannot recover from a solution that has blown up
+        if not np.all(np.isfinite(residual_2)):
+            self.failed_equation = SPLITTING_STAGES[1]
+            return False, np.array([residual_1, residual_2, residual_3]), np.inf
+        max_change_c_2 = parallel.global_max(abs(c_vector[1] - c_vector[1].old))
         c_vector[1].updateOld()
 
-        for i in range(max_sweeps):
-            residual_3 = self._equations[0].sweep(dt=0.5*dt, var=c_vector[0], solver=self._solver)
-            if np.max(residual_3) < max_residual:
-                break
-        max_change_c_1 = np.max([max_change_c_1, np.max(np.abs((c_vector[0] - c_vector[0].old).value))])
+        residual_3, sweeps, linear_iterations, rate = sweep_stage(self._equations[0], c_vector[0], 0.5*dt, self._solver,
+                                                                  max_residual, max_sweeps, self._accelerator,
+                                                                  linear=c_0_linear)
+        self.sweeps += sweeps
+        self.linear_iterations += linear_iterations
+        self.convergence_rate = max(self.convergence_rate, rate)
+        # Further sweeps cannot recover from a solution that has blown up
+        if not np.all(np.isfinite(residual_3)):
+            self.failed_equation = SPLITTING_STAGES[2]
+            return False, np.array([residual_1, residual_2, residual_3]), np.inf
+        max_change_c_1 = np.max([max_change_c_1, parallel.global_max(abs(c_vector[0] - c_vector[0].old))])
         c_vector[0].updateOld()
 
         residuals = np.array([residual_1, residual_2, residual_3])
         if np.max(residuals) < max_residual:
             has_converged = True
+        else:
+            self.failed_equation = SPLITTING_STAGES[int(np.argmax(residuals >= max_residual))]
         max_change = np.max([max_change_c_1, max_change_c_2])
 
         return has_converged, residuals, max_change
@@ -283,8 +814,8 @@ class TwoComponentModel(object):
 
         residuals = np.array([residual_1, residual_2, residual_3, residual_4])
 
-        max_change_c_1 = np.max(np.abs((c_vector[0] - c_vector[0].old).value))
-        max_change_c_2 = np.max(np.abs((c_vector[1] - c_vector[1].old).value))
+        max_change_c_1 = parallel.global_max(abs(c_vector[0] - c_vector[0].old))
+        max_change_c_2 = parallel.global_max(abs(c_vector[1] - c_vector[1].old))
         max_change = np.max([max_change_c_1, max_change_c_2])
 
         return residuals, max_change
@@ -326,12 +857,52 @@ class TwoComponentModel(object):
 
         residuals = np.array([residual_1, residual_2, residual_3])
 
-        max_change_c_1 = np.max(np.abs((c_vector[0] - c_vector[0].old).value))
-        max_change_c_2 = np.max(np.abs((c_vector[1] - c_vector[1].old).value))
+        max_change_c_1 = parallel.global_max(abs(c_vector[0] - c_vector[0].old))
+        max_change_c_2 = parallel.global_max(abs(c_vector[1] - c_vector[1].old))
         max_change = np.max([max_change_c_1, max_change_c_2])
 
         return residuals, max_change
 
+    def _step_once_bdf2(self, c_vector, dt, t, max_residual, max_sweeps):
+        """Solve the model equations over a time step of dt with the BDF2 integrator. Each sweep solves the equation of
+        species 1 and then that of species 2, so the sweeps converge to the solution of the equations without the
+        error of the operator splitting. The arguments and return values are those of :meth:`step_once`, with the
+        residuals of the two equations.
+        """
+        residual_1 = 1e6
+        residual_2 = 1e6
+        self._bdf2.begin_step(c_vector[:2], t, dt)
+        for i in range(max_sweeps):
+            residual_1 = self._bdf2_equations[0].sweep(dt=dt, var=c_vector[0], solver=self._solver)
+            self.linear_iterations += self._solver.convergence.iterations
+            residual_2 = self._bdf2_equations[1].sweep(dt=dt, var=c_vector[1], solver=self._linear_solver)
+            self.linear_iterations += self._linear_solver.convergence.iterations
+            self.sweeps += 2
+            residuals = np.array([residual_1, residual_2])
+            if np.max(residuals) < max_residual:
+                max_change = np.max([parallel.global_max(abs(c - c.old)) for c in c_vector[:2]])
+                return True, residuals, max_change
+            # Further sweeps cannot recover from a solution that has blown up
+            if not np.all(np.isfinite(residuals)):
+                self.failed_equation = BDF2_STAGES[int(np.argmin(np.isfinite(residuals)))]
+                return False, residuals, np.inf
+        residuals = np.array([residual_1, residual_2])
+        self.failed_equation = BDF2_STAGES[int(np.argmax(residuals >= max_residual))]
+        max_change = np.max([parallel.global_max(abs(c - c.old)) for c in c_vector[:2]])
+        return False, residuals, max_change
+
+    def estimate_time_error(self, c_vector, dt, t):
+        """Estimate the local truncation error of the last time step, as described in
+        :meth:`BDF2Integrator.estimate_error`
+
+        Returns:
+            error (float): Largest estimated error of any concentration, or None if it cannot be estimated, for
+            example for the first-order time integrator
+        """
+        if self._bdf2 is None:
+            return None
+        return self._bdf2.estimate_error(c_vector[:2], t, dt)
+
     def update_old(self, c_vector):
         for i in range(len(c_vector)):
             c_vector[i].updateOld()
@@ -339,11 +910,19 @@ class TwoComponentModel(object):
 
 class ThreeComponentModel(object):
 
-    def __init__(self, mobility_1, mobility_2, mobility_3, modelAB_dynamics_type, degradation_constant, free_energy, tau, target_file, ratio):
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them. The degradation constant is held by the degradation
+    # term
+    variable_parameters = {'mobility_1': '_M1', 'mobility_2': '_M2', 'degradation_constant': None, 'tau': '_tau'}
+
+    def __init__(self, mobility_1, mobility_2, mobility_3, modelAB_dynamics_type, degradation_constant, free_energy, tau, target_file, ratio,
+                 factorization_cache_size=8, solver_type=1, time_scheme=1, stabilization_constant=None,
+                 anderson_depth=0, time_integrator=1):
 
-        # Parameters of the dynamical equations
-        self._M1 = mobility_1
-        self._M2 = mobility_2
+        # Parameters of the dynamical equations. The mobilities are fipy Variables so that they can be changed
+        # during a simulation with update_parameters
+        self._M1 = fp.Variable(value=mobility_1)
+        self._M2 = fp.Variable(value=mobility_2)
         # Localization locus dynamics
         self._M3 = mobility_3
         self._modelAB_dynamics_type = modelAB_dynamics_type
@@ -353,11 +932,74 @@ class ThreeComponentModel(object):
         self._degradation_term = rates.FirstOrderReaction(k=degradation_constant)
         # Define model equations
         self._equations = None
-        # The fipy solver used to solve the model equations
+        # The fipy solver used to solve the model equations, and the solver used for the equation of species 2
         self._solver = None
+        self._linear_solver = None
+        self._factorization_cache_size = int(factorization_cache_size)
+        self._solver_type = int(solver_type)
+        self._time_scheme = int(time_scheme)
+        self._stabilization_constant = fp.Variable(value=stabilization_constant if stabilization_constant is not None
+                                                   else 0.0)
+        self._estimate_stabilization_constant = stabilization_constant is None
+        self._anderson_depth = int(anderson_depth)
+        self._accelerator = None
+        self._time_integrator = int(time_integrator)
+        if self._time_integrator == 2 and self._time_scheme == 2:
+            raise ValueError("time_integrator = 2 requires time_scheme = 1, since the stabilized scheme is first order")
+        self._bdf2 = None
+        self._bdf2_equations = None
         self._tau = tau
         self._target_file = target_file
         self._ratio = int(ratio)
+        # Number of sweeps taken in the last call to step_once, and the total number of iterations of the linear
+        # solvers in these sweeps
+        self.sweeps = 0
+        self.linear_iterations = 0
+        # Largest average ratio of the residuals of successive sweeps over the stages of the last call to step_once
+        self.convergence_rate = 0.0
+        # Stage of the operator splitting that did not converge in the last call to step_once
+        self.failed_equation = None
+        # Times the phases of step_once when profiling is enabled
+        self.profiler = NullProfiler()
+
+    def update_parameters(self, **kwargs):
+        """Change model parameters in place. The model equations that have already been assembled use the new values
+        without being rebuilt, and the history of the delayed concentration is kept.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            if name == 'degradation_constant':
+                self._degradation_term.update_parameters(k=value)
+            elif name == 'tau':
+                self._tau = value
+                self.delay_tracker.tau = value
+            else:
+                getattr(self, self.variable_parameters[name]).setValue(value)
+
+    def update_stabilization_constant(self, c_vector):
+        """Estimate the constant :math:`S` of the stabilized scheme as half the largest second derivative of the bulk
+        free energy for the current concentrations
+
+        This is called when the model equations are set up, and again when parameters of the free energy change in
+        place. The constant is not changed if it was given or if time_scheme = 1.
+
+        Args:
+            c_vector (numpy.ndarray): A vector of species concentrations that looks like :math:`[c_1, c_2, ...]`
+        """
+        if self._time_scheme == 2 and self._estimate_stabilization_constant:
+            jacobian = self._free_energy.calculate_jacobian(c_vector)
+            self._stabilization_constant.setValue(0.5 * max(0.0, float(np.max(jacobian[0][0].value))))
+
+    def update_production_parameters(self, **kwargs):
+        """Change parameters of the production term in place
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters` of the production term, named as in
+            :mod:`utils.reaction_rates`
+        """
+        self._production_term.update_parameters(**kwargs)
 
     def set_production_term(self, reaction_type, **kwargs):
         """ Sets the nature of the production term of species :math:`c_2` from :math:`c_1`
@@ -438,12 +1080,23 @@ class ThreeComponentModel(object):
 
         jacobian = self._free_energy.calculate_jacobian(c_vector)
 
-        eqn_1 = (fp.TransientTerm(coeff=1.0, var=c_vector[0])
-                 == fp.DiffusionTerm(coeff=self._M1 * jacobian[0][0], var=c_vector[0])
-                 + fp.DiffusionTerm(coeff=self._M1 * jacobian[0][1], var=c_vector[1])
-                 - fp.DiffusionTerm(coeff=(self._M1, self._free_energy.kappa), var=c_vector[0])
-                 - self._M1 * (self._free_energy.get_gaussian_function(c_vector[0].mesh, well_center)).faceGrad.divergence
-                 )
+        if self._time_scheme == 2:
+            # Linearly stabilized scheme. The bulk chemical potential and the explicit part of the stabilization term
+            # are evaluated with the old values, so that the matrix of the equation only depends on dt
+            self.update_stabilization_constant(c_vector)
+            mu_1_bulk = self._free_energy.calculate_mu_1_bulk([c_vector[0].old, c_vector[1]], well_center)
+            eqn_1 = (fp.TransientTerm(coeff=1.0, var=c_vector[0])
+                     == fp.DiffusionTerm(coeff=self._M1 * self._stabilization_constant, var=c_vector[0])
+                     - fp.DiffusionTerm(coeff=(self._M1, self._free_energy.kappa), var=c_vector[0])
+                     + self._M1 * (mu_1_bulk - self._stabilization_constant * c_vector[0].old).faceGrad.divergence
+                     )
+        else:
+            eqn_1 = (fp.TransientTerm(coeff=1.0, var=c_vector[0])
+                     == fp.DiffusionTerm(coeff=self._M1 * jacobian[0][0], var=c_vector[0])
+                     + fp.DiffusionTerm(coeff=self._M1 * jacobian[0][1], var=c_vector[1])
+                     - fp.DiffusionTerm(coeff=(self._M1, self._free_energy.kappa), var=c_vector[0])
+                     - self._M1 * (self._free_energy.get_gaussian_function(c_vector[0].mesh, well_center)).faceGrad.divergence
+                     )
 
         # Model AB dynamics or reaction-diffusion dynamics for species 2 with production and degradation reactions
         if self._modelAB_dynamics_type == 1:
@@ -464,19 +1117,46 @@ class ThreeComponentModel(object):
 
         ##### NOTE: This is legacy code, not used in the current simulations i.e., the locus equations have been removed from step_once #####
         # Localization locus dynamics
-        self._eqn_locus_x = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.x-well_center[0]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
-                           - self._M3 * self._free_energy._k_tilde *(well_center[0] - self._free_energy._r_p[0] - self._free_energy._rest_length[0])]
-        self._eqn_locus_y = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.y-well_center[1]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
-                           - self._M3 * self._free_energy._k_tilde *(well_center[1] - self._free_energy._r_p[1] - self._free_energy._rest_length[1])]
+        if c_vector[0].mesh.dim > 1:
+            self._eqn_locus_x = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.x-well_center[0]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
+                               - self._M3 * self._free_energy._k_tilde *(well_center[0] - self._free_energy._r_p[0] - self._free_energy._rest_length[0])]
+            self._eqn_locus_y = [self._M3*(self._free_energy._well_depth  * c_vector[0] * (c_vector[0].mesh.y-well_center[1]) / (self._free_energy._sigma**2) * np.exp(-((c_vector[0].mesh.x-well_center[0])**2 + (c_vector[0].mesh.y-well_center[1])**2) / (2*self._free_energy._sigma**2)) * c_vector[0].mesh.cellVolumes).sum(),
+                               - self._M3 * self._free_energy._k_tilde *(well_center[1] - self._free_energy._r_p[1] - self._free_energy._rest_length[1])]
+        else:
+            # The force on the locus vanishes by symmetry on the radial mesh of an axisymmetric simulation
+            self._eqn_locus_x = [fp.Variable(value=0.0), fp.Variable(value=0.0)]
+            self._eqn_locus_y = [fp.Variable(value=0.0), fp.Variable(value=0.0)]
         ##### ------------------------------------------------------------------------------------------------------------------------- #####
 
         self._equations = [eqn_1, eqn_2, self._eqn_locus_x[0]+self._eqn_locus_x[1], self._eqn_locus_y[0]+self._eqn_locus_y[1]]
 
+        # Equations of the BDF2 integrator, with the terms of the previous time step added to the model equations
+        if self._time_integrator == 2:
+            self._bdf2 = BDF2Integrator(c_vector[:2])
+            self._bdf2_equations = [
+                eqn_1 + (fp.TransientTerm(coeff=self._bdf2.a - 1.0, var=c_vector[0])
+                         == self._bdf2.b * self._bdf2.velocity[0]),
+                eqn_2 + (fp.TransientTerm(coeff=self._bdf2.a - 1.0, var=c_vector[1])
+                         == self._bdf2.b * self._bdf2.velocity[1])]
+
         # Define the relative tolerance of the fipy solver
-        self._solver = fp.DefaultSolver(tolerance=1e-10, iterations=2000)
+        self._solver = create_solver(self._solver_type, tolerance=1e-10, iterations=2000)
+        # The matrix of the stabilized equation for species 1 also only changes with dt and the parameters
+        if (self._time_scheme == 2 and self._solver_type == 1 and self._factorization_cache_size > 0
+                and parallel.number_of_processes() == 1):
+            self._solver = CachedLUSolver(cache_size=self._factorization_cache_size, tolerance=1e-10, iterations=2000)
+        if self._anderson_depth > 0:
+            self._accelerator = AndersonAccelerator(c_vector[0].mesh, depth=self._anderson_depth)
+        # Reuse the factorizations of the linear reaction-diffusion equation for species 2
+        if (self._modelAB_dynamics_type == 2 and self._factorization_cache_size > 0
+                and parallel.number_of_processes() == 1):
+            self._linear_solver = CachedLUSolver(cache_size=self._factorization_cache_size, tolerance=1e-10,
+                                                 iterations=2000)
+        else:
+            self._linear_solver = self._solver
 
     def set_delay_tracker(self,c_vector,total_steps):
-        self.delay_tracker = DelayTracker(total_steps,self._tau,c_vector[2].value,self._target_file)
+        self.delay_tracker = DelayTracker(total_steps,self._tau,c_vector[2].value,self._target_file,mesh=c_vector[2].mesh)
 
     def step_once(self, c_vector, well_center, dt, t, step, max_residual, max_sweeps):
         """Function that solves the model equations over a time step of dt to get the concentration profiles.
@@ -507,38 +1187,109 @@ class ThreeComponentModel(object):
         residual_2 = 1e6
         residual_3 = 1e6
         has_converged = False
+        self.sweeps = 0
+        self.linear_iterations = 0
+        self.convergence_rate = 0.0
+        self.failed_equation = None
         
-        c_vector[2].value = self.delay_tracker.get_delay(t,step)
+        with self.profiler.phase('get_delay'):
+            c_vector[2].value = self.delay_tracker.get_delay(t,step)
+
+        if self._time_integrator == 2:
+            return self._step_once_bdf2(c_vector, dt, t, max_residual, max_sweeps)
+
+        # The stabilized equation for species 1 is linear, so a single solve gives its solution over the time step
+        c_0_linear = self._time_scheme == 2
 
         # Strang Splitting
-        for i in range(max_sweeps):
-            residual_1 = self._equations[0].sweep(dt=0.5*dt, var=c_vector[0], solver=self._solver)
-            if np.max(residual_1) < max_residual:
-                break
-        max_change_c_1 = np.max(np.abs((c_vector[0] - c_vector[0].old).value))
+        residual_1, sweeps, linear_iterations, rate = sweep_stage(self._equations[0], c_vector[0], 0.5*dt, self._solver,
+                                                                  max_residual, max_sweeps, self._accelerator,
+                                                                  linear=c_0_linear)
+        self.sweeps += sweeps
+        self.linear_iterations += linear_iterations
+        self.convergence_rate = max(self.convergence_rate, rate)
+        # Further sweeps cannot recover from a solution that has blown up
+        if not np.all(np.isfinite(residual_1)):
+            self.failed_equation = SPLITTING_STAGES[0]
+            return False, np.array([residual_1, residual_2, residual_3]), np.inf
+        max_change_c_1 = parallel.global_max(abs(c_vector[0] - c_vector[0].old))
         c_vector[0].updateOld()
 
-        for i in range(max_sweeps):
-            residual_2 = self._equations[1].sweep(dt=dt, var=c_vector[1], solver=self._solver)
-            if np.max(residual_2) < max_residual:
-                break
-        max_change_c_2 = np.max(np.abs((c_vector[1] - c_vector[1].old).value))
+        residual_2, sweeps, linear_iterations, rate = sweep_stage(self._equations[1], c_vector[1], dt,
+                                                                  self._linear_solver, max_residual, max_sweeps,
+                                                                  self._accelerator)
+        self.sweeps += sweeps
+        self.linear_iterations += linear_iterations
+        self.convergence_rate = max(self.convergence_rate, rate)
+        # Further sweeps cannot recover from a solution that has blown up
+        if not np.all(np.isfinite(residual_2)):
+            self.failed_equation = SPLITTING_STAGES[1]
+            return False, np.array([residual_1, residual_2, residual_3]), np.inf
+        max_change_c_2 = parallel.global_max(abs(c_vector[1] - c_vector[1].old))
         c_vector[1].updateOld()
 
-        for i in range(max_sweeps):
-            residual_3 = self._equations[0].sweep(dt=0.5*dt, var=c_vector[0], solver=self._solver)
-            if np.max(residual_3) < max_residual:
-                break
-        max_change_c_1 = np.max([max_change_c_1, np.max(np.abs((c_vector[0] - c_vector[0].old).value))])
+        residual_3, sweeps, linear_iterations, rate = sweep_stage(self._equations[0], c_vector[0], 0.5*dt, self._solver,
+                                                                  max_residual, max_sweeps, self._accelerator,
+                                                                  linear=c_0_linear)
+        self.sweeps += sweeps
+        self.linear_iterations += linear_iterations
+        self.convergence_rate = max(self.convergence_rate, rate)
+        # Further sweeps cannot recover from a solution that has blown up
+        if not np.all(np.isfinite(residual_3)):
+            self.failed_equation = SPLITTING_STAGES[2]
+            return False, np.array([residual_1, residual_2, residual_3]), np.inf
+        max_change_c_1 = np.max([max_change_c_1, parallel.global_max(abs(c_vector[0] - c_vector[0].old))])
         c_vector[0].updateOld()
         
         
         residuals = np.array([residual_1, residual_2, residual_3])
         if np.max(residuals) < max_residual:
             has_converged = True
+        else:
+            self.failed_equation = SPLITTING_STAGES[int(np.argmax(residuals >= max_residual))]
         max_change = np.max([max_change_c_1, max_change_c_2])
 
         return has_converged, residuals, max_change
+    def _step_once_bdf2(self, c_vector, dt, t, max_residual, max_sweeps):
+        """Solve the model equations over a time step of dt with the BDF2 integrator. Each sweep solves the equation of
+        species 1 and then that of species 2, so the sweeps converge to the solution of the equations without the
+        error of the operator splitting. The arguments and return values are those of :meth:`step_once`, with the
+        residuals of the two equations.
+        """
+        residual_1 = 1e6
+        residual_2 = 1e6
+        self._bdf2.begin_step(c_vector[:2], t, dt)
+        for i in range(max_sweeps):
+            residual_1 = self._bdf2_equations[0].sweep(dt=dt, var=c_vector[0], solver=self._solver)
+            self.linear_iterations += self._solver.convergence.iterations
+            residual_2 = self._bdf2_equations[1].sweep(dt=dt, var=c_vector[1], solver=self._linear_solver)
+            self.linear_iterations += self._linear_solver.convergence.iterations
+            self.sweeps += 2
+            residuals = np.array([residual_1, residual_2])
+            if np.max(residuals) < max_residual:
+                max_change = np.max([parallel.global_max(abs(c - c.old)) for c in c_vector[:2]])
+                return True, residuals, max_change
+            # Further sweeps cannot recover from a solution that has blown up
+            if not np.all(np.isfinite(residuals)):
+                self.failed_equation = BDF2_STAGES[int(np.argmin(np.isfinite(residuals)))]
+                return False, residuals, np.inf
+        residuals = np.array([residual_1, residual_2])
+        self.failed_equation = BDF2_STAGES[int(np.argmax(residuals >= max_residual))]
+        max_change = np.max([parallel.global_max(abs(c - c.old)) for c in c_vector[:2]])
+        return False, residuals, max_change
+
+    def estimate_time_error(self, c_vector, dt, t):
+        """Estimate the local truncation error of the last time step, as described in
+        :meth:`BDF2Integrator.estimate_error`
+
+        Returns:
+            error (float): Largest estimated error of any concentration, or None if it cannot be estimated, for
+            example for the first-order time integrator
+        """
+        if self._bdf2 is None:
+            return None
+        return self._bdf2.estimate_error(c_vector[:2], t, dt)
+
     def update_old(self, c_vector):
         for i in range(len(c_vector)):
             c_vector[i].updateOld()
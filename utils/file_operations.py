@@ -3,10 +3,195 @@
 """
 
 import ast
+import copy
+import hashlib
+import json
+from collections.abc import Mapping
 import numpy as np
 import h5py
 from fipy.variables.cellVariable import CellVariable
 from numpy import ndarray
+from . import parallel
+
+
+# Types of the input parameters of a simulation. Parameters that are not listed here are parsed as they are written
+# in the file.
+INPUT_PARAMETER_TYPES = {
+    # Free energy
+    'free_energy_type': int, 'alpha': float, 'beta': float, 'gamma': float, 'lamda': float, 'kappa': float,
+    'c_bar': float, 'c_bar_1': float, 'beta_tilde': float, 'gamma_tilde': float, 'lamda_tilde': float,
+    'kappa_tilde': float, 'chiPR_tilde': float, 'well_depth': float, 'well_center': tuple, 'sigma': float,
+    'k_tilde': float, 'r_p': tuple, 'rest_length': tuple,
+    # Kinetics and reactions
+    'model_type': int, 'modelAB_dynamics_type': int, 'reaction_type': int, 'M1': float, 'M2': float, 'M3': float,
+    'basal_k_production': float, 'k_production': float, 'k_degradation': float, 'reaction_sigma': float,
+    'reaction_center': tuple, 'hill_c0': float, 'hill_kd': float, 'hill_vmax': float, 'hill_n': float,
+    'hill_v0': float, 'linear_m': float, 'linear_c': float, 'tau': float, 'ratio': int,
+    # Concentration variables and initial conditions
+    'n_concentrations': int, 'random_seed': int, 'initial_values': tuple, 'initial_condition_noise_variance': tuple,
+    'nucleate_seed': tuple, 'seed_value': tuple, 'nucleus_size': tuple, 'location': tuple, 'initial_state': tuple,
+    # Geometry
+    'dimension': int, 'circ_flag': int, 'radius': float, 'length': float, 'dx': float, 'axisymmetric': int,
+    'mirror_symmetry': int, 'mesh_grading': int, 'coarse_dx': float, 'mesh_grading_length': float,
+    'remesh_interval': int, 'cell_ordering': int,
+    # Numerical integration
+    'dt': float, 'dt_max': float, 'dt_min': float, 'max_change_allowed': float, 'duration': float,
+    'total_steps': int, 'max_sweeps': int, 'max_residual': float, 'data_log': int, 'time_profile': tuple,
+    'max_rejections': int, 'max_concentration': float, 'profile': int, 'cascade_dx': float, 'cascade_time': float,
+    # Detection of steady states and limit cycles
+    'convergence_action': int, 'steady_state_tolerance': float, 'convergence_window': float,
+    'limit_cycle_cycles': int, 'limit_cycle_tolerance': float, 'sparse_data_log': int,
+    # Linear solvers
+    'factorization_cache_size': int, 'dt_ladder_ratio': float, 'solver_type': int,
+    # Time discretization
+    'time_scheme': int, 'stabilization_constant': float, 'time_integrator': int, 'time_error_tolerance': float,
+    # Nonlinear iterations
+    'anderson_depth': int,
+}
+
+# Input parameters that every simulation requires
+REQUIRED_INPUT_PARAMETERS = ('free_energy_type', 'model_type', 'reaction_type', 'modelAB_dynamics_type', 'M1', 'M2',
+                             'M3', 'k_degradation', 'ratio', 'well_center', 'n_concentrations', 'random_seed',
+                             'initial_values', 'initial_condition_noise_variance', 'nucleate_seed', 'seed_value',
+                             'nucleus_size', 'location', 'dimension', 'dx', 'dt', 'dt_max', 'dt_min',
+                             'max_change_allowed', 'duration', 'total_steps', 'max_sweeps', 'max_residual', 'data_log',
+                             'time_profile')
+
+# Additional input parameters required by each free energy type
+REQUIRED_FREE_ENERGY_PARAMETERS = {
+    1: ('alpha', 'beta', 'gamma', 'lamda', 'kappa', 'c_bar', 'well_depth', 'sigma'),
+    2: ('c_bar_1', 'beta_tilde', 'gamma_tilde', 'lamda_tilde', 'kappa_tilde', 'well_depth', 'sigma'),
+    3: ('c_bar_1', 'beta_tilde', 'gamma_tilde', 'lamda_tilde', 'kappa_tilde', 'chiPR_tilde', 'well_depth', 'sigma',
+        'k_tilde', 'r_p', 'rest_length'),
+}
+
+# Additional input parameters required by each model type
+REQUIRED_MODEL_PARAMETERS = {
+    1: (),
+    2: ('tau',),
+}
+
+# Additional input parameters required by each reaction type
+REQUIRED_REACTION_PARAMETERS = {
+    1: ('basal_k_production',),
+    2: ('basal_k_production', 'k_production', 'reaction_sigma', 'reaction_center'),
+    3: ('basal_k_production', 'k_production', 'reaction_sigma', 'reaction_center', 'hill_c0', 'hill_kd', 'hill_vmax',
+        'hill_n', 'hill_v0'),
+    4: ('basal_k_production', 'k_production', 'reaction_sigma', 'reaction_center', 'linear_m', 'linear_c'),
+}
+
+# Input parameters that have one value per concentration variable
+PER_CONCENTRATION_PARAMETERS = ('initial_values', 'initial_condition_noise_variance', 'nucleate_seed', 'seed_value',
+                                'nucleus_size', 'location')
+
+# Cache of parsed parameter files, keyed by the hash of the file contents
+_PARSED_FILE_CACHE = {}
+_INPUT_PARAMETERS_CACHE = {}
+
+
+class InputParameters(Mapping):
+    """Read-only mapping of validated simulation input parameters.
+
+    The values of the parameters listed in INPUT_PARAMETER_TYPES are converted to their types. Use :meth:`to_dict` to
+    get a mutable copy, for example to change parameter values in a sweep.
+    """
+
+    def __init__(self, parameters, filename=None, file_hash=None):
+        """Initialize an object of :class:`InputParameters`.
+
+        Args:
+            parameters (dict): A dictionary that contains (key,value) pairs of (parameter name, parameter value)
+
+            filename (string): Name of the file that the parameters were read from
+
+            file_hash (string): Hash of the contents of the file that the parameters were read from
+        """
+        self._parameters = dict(parameters)
+        self.filename = filename
+        self.file_hash = file_hash
+
+    def __getitem__(self, key):
+        return self._parameters[key]
+
+    def __iter__(self):
+        return iter(self._parameters)
+
+    def __len__(self):
+        return len(self._parameters)
+
+    def __repr__(self):
+        return "InputParameters({})".format(self._parameters)
+
+    def to_dict(self):
+        """Return a mutable copy of the input parameters as a dictionary"""
+        return copy.deepcopy(self._parameters)
+
+
+def _read_input_file(filename):
+    """Read a parameter file and hash its contents
+
+    Args:
+        filename (string): Name of file that contains the parameters
+
+    Returns:
+        contents (string): Contents of the file
+
+        file_hash (string): SHA-1 hash of the contents of the file
+    """
+    try:
+        with open(filename, 'rb') as f:
+            contents = f.read()
+    except IOError:
+        print("Could not open input parameter file: " + filename)
+        exit()
+    return contents.decode(), hashlib.sha1(contents).hexdigest()
+
+
+def _parse_input_file(filename):
+    """Parse a parameter file once and cache the result by the hash of the file contents
+
+    Text after a '#' is a comment. If a parameter is defined more than once, the last value is used and a warning is
+    printed.
+
+    Args:
+        filename (string): Name of file that contains the parameters
+
+    Returns:
+        input_parameters (dict): A dictionary that contains (key,value) pairs of (parameter name, parameter value).
+        This dictionary is shared by all callers and must not be modified.
+
+        file_hash (string): SHA-1 hash of the contents of the file
+    """
+    contents, file_hash = _read_input_file(filename)
+    if file_hash in _PARSED_FILE_CACHE:
+        return _PARSED_FILE_CACHE[file_hash], file_hash
+
+    input_parameters = {}
+    for line_number, line in enumerate(contents.splitlines(), start=1):
+        # Remove comments and white space
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+        # Split the line at the first comma, since values can contain commas
+        var_name, _, var_value = line.partition(',')
+        var_name = var_name.strip()
+        var_value = var_value.strip()
+        if var_name in input_parameters:
+            print("Warning: parameter " + var_name + " is defined more than once in " + filename +
+                  ". Using the value on line " + str(line_number) + ".")
+        try:
+            input_parameters[var_name] = float(var_value)
+        except ValueError:
+            # This occurs when python cannot convert a string into a float.
+            # Evaluate the python expression as a list
+            try:
+                input_parameters[var_name] = ast.literal_eval(var_value)
+            except (ValueError, SyntaxError):
+                raise ValueError("Could not parse the value of " + var_name + " on line " + str(line_number) +
+                                 " of " + filename + ": " + var_value)
+
+    _PARSED_FILE_CACHE[file_hash] = input_parameters
+    return input_parameters, file_hash
 
 
 def input_parse(filename):
@@ -18,38 +203,138 @@ def input_parse(filename):
     Returns:
         input_parameters (dict): A dictionary that contains (key,value) pairs of (parameter name, parameter value)
     """
+    input_parameters, file_hash = _parse_input_file(filename)
+    return copy.deepcopy(input_parameters)
 
-    # Initialize dictionary
-    input_parameters = {}
 
-    # Check if input parameter file exists
-    try:
-        open(filename, 'r')
-    except IOError:
-        print("Could not open input parameter file: " + filename)
-        exit()
+def validate_input_parameters(input_parameters):
+    """Check that a simulation has all the input parameters it needs and convert them to their types
+
+    Args:
+        input_parameters (dict): A dictionary that contains (key,value) pairs of (parameter name, parameter value)
+
+    Returns:
+        typed_parameters (dict): A copy of input_parameters with the values converted to the types in
+        INPUT_PARAMETER_TYPES
+    """
+    typed_parameters = dict(input_parameters)
+    for key, value in input_parameters.items():
+        parameter_type = INPUT_PARAMETER_TYPES.get(key)
+        if parameter_type is int:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                raise ValueError("Input parameter " + key + " should be an integer, got " + repr(value))
+            typed_parameters[key] = int(value)
+        elif parameter_type is float:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError("Input parameter " + key + " should be a number, got " + repr(value))
+            typed_parameters[key] = float(value)
+        elif parameter_type is tuple:
+            if not isinstance(value, (tuple, list)):
+                raise ValueError("Input parameter " + key + " should be a tuple, got " + repr(value))
+
+    missing = [key for key in REQUIRED_INPUT_PARAMETERS if key not in typed_parameters]
+    if missing:
+        raise ValueError("Missing input parameters: " + ", ".join(missing))
+
+    for type_key, required_parameters in [('free_energy_type', REQUIRED_FREE_ENERGY_PARAMETERS),
+                                          ('model_type', REQUIRED_MODEL_PARAMETERS),
+                                          ('reaction_type', REQUIRED_REACTION_PARAMETERS)]:
+        if typed_parameters[type_key] not in required_parameters:
+            raise ValueError("Unsupported " + type_key + ": " + str(typed_parameters[type_key]))
+        missing = [key for key in required_parameters[typed_parameters[type_key]] if key not in typed_parameters]
+        if missing:
+            raise ValueError("Missing input parameters for " + type_key + " " + str(typed_parameters[type_key]) +
+                             ": " + ", ".join(missing))
+
+    if typed_parameters['dimension'] == 2 and int(typed_parameters.get('circ_flag', 0)) == 1:
+        geometry_parameters = ('radius',)
+    else:
+        geometry_parameters = ('length',)
+    missing = [key for key in geometry_parameters if key not in typed_parameters]
+    if missing:
+        raise ValueError("Missing input parameters for the mesh geometry: " + ", ".join(missing))
+
+    # Axisymmetric simulations are solved along the radius of a circular domain, so everything that breaks the radial
+    # symmetry must be at the center of the circle. Simulations with mirror symmetry are solved on the upper half of a
+    # circular domain, so everything that breaks the symmetry about the x axis must lie on the x axis.
+    for symmetry_key, axes, where in (('axisymmetric', slice(None), "at the center of the domain"),
+                                      ('mirror_symmetry', slice(1, 2), "on the x axis")):
+        if typed_parameters.get(symmetry_key, 0) != 1:
+            continue
+        if not (typed_parameters['dimension'] == 2 and int(typed_parameters.get('circ_flag', 0)) == 1):
+            raise ValueError(symmetry_key + " = 1 requires a circular domain with dimension = 2 and circ_flag = 1")
+        centers = [('well_center', typed_parameters['well_center'])]
+        if 'reaction_center' in typed_parameters:
+            centers.append(('reaction_center', typed_parameters['reaction_center']))
+        for i in range(len(typed_parameters['nucleate_seed'])):
+            if typed_parameters['nucleate_seed'][i] == 1:
+                centers.append(('location of seed ' + str(i), typed_parameters['location'][i]))
+        for transition in typed_parameters['time_profile']:
+            centers.extend((key + ' in time_profile', transition[key]) for key in ('well_center', 'reaction_center')
+                           if key in transition)
+        off_center = [name for name, point in centers if np.any(np.asarray(point, dtype=float)[axes] != 0.0)]
+        if off_center:
+            raise ValueError(symmetry_key + " = 1 requires these points to be " + where + ": " + ", ".join(off_center))
+    if typed_parameters.get('axisymmetric', 0) == 1 and typed_parameters.get('mirror_symmetry', 0) == 1:
+        raise ValueError("Only one of axisymmetric and mirror_symmetry can be 1")
+
+    # Graded meshes are generated with Gmsh, which is only used for circular domains
+    if typed_parameters.get('mesh_grading', 0) == 1:
+        if not (typed_parameters['dimension'] == 2 and int(typed_parameters.get('circ_flag', 0)) == 1) or \
+                typed_parameters.get('axisymmetric', 0) == 1:
+            raise ValueError("mesh_grading = 1 requires a 2D circular domain with dimension = 2, circ_flag = 1 and "
+                             "axisymmetric = 0")
+        if typed_parameters.get('coarse_dx', typed_parameters['dx']) < typed_parameters['dx']:
+            raise ValueError("coarse_dx must not be smaller than dx")
+    # The coarse stage of a cascade and stored frames are transferred between meshes of at least 2 dimensions
+    if typed_parameters.get('cascade_dx', 0.0) > 0.0:
+        if typed_parameters['cascade_dx'] <= typed_parameters['dx']:
+            raise ValueError("cascade_dx must be larger than dx")
+        if typed_parameters.get('axisymmetric', 0) == 1:
+            raise ValueError("cascade_dx > 0 requires axisymmetric = 0")
+        if 'cascade_time' not in typed_parameters and typed_parameters.get('convergence_action', 0) == 0:
+            raise ValueError("cascade_dx > 0 requires cascade_time or convergence_action > 0 to end the coarse stage")
+    if 'initial_state' in typed_parameters:
+        state = typed_parameters['initial_state']
+        if len(state) != 2 or not isinstance(state[0], str) or isinstance(state[1], bool) or \
+                not isinstance(state[1], (int, float)) or state[1] != int(state[1]):
+            raise ValueError("Input parameter initial_state should be a tuple (directory, frame), got " + repr(state))
+        if typed_parameters.get('axisymmetric', 0) == 1:
+            raise ValueError("initial_state requires axisymmetric = 0")
+    # Only the cells of Gmsh meshes are reordered
+    if typed_parameters.get('cell_ordering', 0) == 1 and \
+            (not (typed_parameters['dimension'] == 2 and int(typed_parameters.get('circ_flag', 0)) == 1) or
+             typed_parameters.get('axisymmetric', 0) == 1):
+        raise ValueError("cell_ordering = 1 requires a 2D circular domain with dimension = 2, circ_flag = 1 and "
+                         "axisymmetric = 0")
+    # Remeshing regenerates the graded mesh around the condensates
+    if typed_parameters.get('remesh_interval', 0) > 0 and typed_parameters.get('mesh_grading', 0) != 1:
+        raise ValueError("remesh_interval > 0 requires mesh_grading = 1")
+
+    for key in PER_CONCENTRATION_PARAMETERS:
+        if len(typed_parameters[key]) != typed_parameters['n_concentrations']:
+            raise ValueError("Input parameter " + key + " should have one value for each of the " +
+                             str(typed_parameters['n_concentrations']) + " concentrations")
+
+    return typed_parameters
+
+
+def load_input_parameters(filename):
+    """Parse and validate the input parameters of a simulation
+
+    The parsed parameters are cached by the hash of the file contents, so reading the same file again is cheap.
+
+    Args:
+        filename (string): Name of file that contains the input parameters for simulations
 
-    # Open and read input parameter file
-    with open(filename, 'r') as f:
-        for line in f:
-            # Remove the \n character from the string
-            line = line.strip()
-            # If the line is not an empty string, process the line
-            if line:
-                # If the line is not a comment i.e. does not start with '#', then process the line
-                if line.find('#') == -1:
-                    # handle lines with more than 1 comma
-                    var_name, var_value = line.split(',')[0], ",".join(line.split(',')[1:])
-                    # Remove any white spaces in the variable value
-                    var_value = var_value.strip()
-                    try:
-                        input_parameters[var_name] = float(var_value)
-                    except ValueError:
-                        # This occurs when python cannot convert a string into a float.
-                        # Evaluate the python expression as a list
-                        input_parameters[var_name] = ast.literal_eval(var_value)
-
-    return input_parameters
+    Returns:
+        input_parameters (InputParameters): Read-only mapping of the validated input parameters
+    """
+    parsed_parameters, file_hash = _parse_input_file(filename)
+    if file_hash not in _INPUT_PARAMETERS_CACHE:
+        _INPUT_PARAMETERS_CACHE[file_hash] = InputParameters(validate_input_parameters(parsed_parameters),
+                                                             filename=filename, file_hash=file_hash)
+    return _INPUT_PARAMETERS_CACHE[file_hash]
 
 
 def write_input_params_from_dict(input_parameters, target_filename):
@@ -110,36 +395,24 @@ def write_stats(t, dt, steps, c_vector, well_center, geometry, free_energy, dyna
 
         max_change (float): Maximum rate of change of concentration fields at any position
 
+        dynamical_equations (utils.dynamical_equations): An instance of one of the classes in
+        :mod:`utils.dynamical_equations`, which also reports the number of iterations of the linear solvers in the
+        last time step
+
         target_file (string): Target file to write out the statistics
     """
 
-    # Write out header of the stats file
-    if steps == 0:
-        # Header of the stats file
-        stats_list = ['step', 't', 'dt']
-        for i in range(len(c_vector)):
-            stats_list.append('c_{index}_avg'.format(index=i))
-            stats_list.append('c_{index}_min'.format(index=i))
-            stats_list.append('c_{index}_max'.format(index=i))
-        stats_list += ['residuals','max_rate_of_change','free_energy',
-                       'well_center_x','well_center_y',
-                       'eqn3_potential','eqn3_spring',
-                       'delay_head']
-        # Add space
-        stats_list = [f"{stat:<20}" for stat in stats_list]
-        # Write out the header to the file
-        with open(target_file, 'w+') as stats:
-            stats.write("".join(stats_list) + "\n")
-
-    # Write out simulation statistics to the stats file
+    # Reduce the statistics over all processes, since only the root process writes them out
     stats_simulation = ["{:<20}".format(int(steps)),
                         "{:<20.8f}".format(t),
                         "{:<20.3e}".format(dt)]
     for i in range(len(c_vector)):
         if type(c_vector[i]) == CellVariable:
-            stats_simulation.append("{:<20.8f}".format(c_vector[i].cellVolumeAverage.value))
-            stats_simulation.append("{:<20.8f}".format(min(c_vector[i].value)))
-            stats_simulation.append("{:<20.8f}".format(max(c_vector[i].value)))
+            volumes = CellVariable(mesh=c_vector[i].mesh, value=c_vector[i].mesh.cellVolumes)
+            stats_simulation.append("{:<20.8f}".format(parallel.global_sum(c_vector[i] * volumes)
+                                                       / parallel.global_sum(volumes)))
+            stats_simulation.append("{:<20.8f}".format(parallel.global_min(c_vector[i])))
+            stats_simulation.append("{:<20.8f}".format(parallel.global_max(c_vector[i])))
         elif type(c_vector[i]) == ndarray:
             stats_simulation.append("{:<20.8f}".format(c_vector[i].mean()))
             stats_simulation.append("{:<20.8f}".format(min(c_vector[i])))
@@ -147,7 +420,8 @@ def write_stats(t, dt, steps, c_vector, well_center, geometry, free_energy, dyna
        
     stats_simulation.append("{:<20.8f}".format(float(residuals)))
     stats_simulation.append("{:<20.8f}".format(float(max_change)))
-    stats_simulation.append("{:<20.8f}".format(np.sum((free_energy.calculate_fe(c_vector, well_center) * geometry.mesh.cellVolumes).value)))
+    stats_simulation.append("{:<20}".format(int(dynamical_equations.linear_iterations)))
+    stats_simulation.append("{:<20.8f}".format(parallel.global_sum(free_energy.calculate_fe(c_vector, well_center) * geometry.mesh.cellVolumes) * geometry.volume_scale))
     stats_simulation.append("{:<20.8f}".format(well_center[0]()))
     stats_simulation.append("{:<20.8f}".format(well_center[1]()))
     stats_simulation.append("{:<20.8f}".format(dynamical_equations._eqn_locus_x[0]()))
@@ -155,11 +429,81 @@ def write_stats(t, dt, steps, c_vector, well_center, geometry, free_energy, dyna
     if input_params["model_type"] == 2:
         stats_simulation.append("{:<20.8f}".format(dynamical_equations.delay_tracker.index))
 
+    if not parallel.is_root():
+        return
+
+    # Write out header of the stats file
+    if steps == 0:
+        # Header of the stats file
+        stats_list = ['step', 't', 'dt']
+        for i in range(len(c_vector)):
+            stats_list.append('c_{index}_avg'.format(index=i))
+            stats_list.append('c_{index}_min'.format(index=i))
+            stats_list.append('c_{index}_max'.format(index=i))
+        stats_list += ['residuals','max_rate_of_change','linear_iterations','free_energy',
+                       'well_center_x','well_center_y',
+                       'eqn3_potential','eqn3_spring',
+                       'delay_head']
+        # Add space
+        stats_list = [f"{stat:<20}" for stat in stats_list]
+        # Write out the header to the file
+        with open(target_file, 'w+') as stats:
+            stats.write("".join(stats_list) + "\n")
+
+    # Write out simulation statistics to the stats file
     with open(target_file, 'a') as stats:
         stats.write("".join(stats_simulation) + "\n")
 
 
-def write_spatial_variables_to_hdf5_file(step, total_steps, c_vector, well_center, geometry, free_energy, target_file, t):
+def write_failure_record(step, t, dt_history, failed_equation, reason, residuals, target_file):
+    """Write out a record of why a simulation stopped because it could not take a time step
+
+    Args:
+        step (int): The time step that failed
+
+        t (float): Simulation time at the start of the failed time step
+
+        dt_history (list): Sizes of the recent accepted time steps followed by the sizes of the time steps attempted in
+        the failed step
+
+        failed_equation (string): Stage of the operator splitting that did not converge, or the concentration that went
+        out of bounds
+
+        reason (string): Description of why the time step failed
+
+        residuals (numpy.ndarray): Residuals of the last attempt of the failed time step
+
+        target_file (string): Target JSON file to write out the record
+    """
+    record = {'step': int(step),
+              't': float(t),
+              'dt_history': [float(dt) for dt in dt_history],
+              'failed_equation': failed_equation,
+              'reason': reason,
+              'residuals': [float(residual) for residual in np.ravel(residuals)]}
+    if not parallel.is_root():
+        return
+    with open(target_file, 'w') as f:
+        json.dump(record, f, indent=2)
+
+
+def write_metadata(metadata, target_file):
+    """Write out a description of how a simulation ended
+
+    Args:
+        metadata (dict): Values that describe the end of the simulation, such as the reason it stopped and the
+        detected steady state or limit cycle. The values must be serializable as JSON.
+
+        target_file (string): Target JSON file to write out the metadata
+    """
+    if not parallel.is_root():
+        return
+    with open(target_file, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+def write_spatial_variables_to_hdf5_file(step, total_steps, c_vector, well_center, geometry, free_energy, target_file, t,
+                                         mu_vector=None):
     """Function to write out the concentration fields and chemical potentials to a hdf5 file
 
     Args:
@@ -176,6 +520,9 @@ def write_spatial_variables_to_hdf5_file(step, total_steps, c_vector, well_cente
         :mod:`utils.free_energy`
 
         target_file (string): Target file to write out the statistics
+
+        mu_vector (list): Values of the chemical potentials in all cells of the mesh as numpy arrays, if they have
+        already been calculated. Otherwise they are calculated from the free energy.
     """
 
     # Create the list of variable names to store. We are going to store the concentration fields and the chemical
@@ -185,22 +532,131 @@ def write_spatial_variables_to_hdf5_file(step, total_steps, c_vector, well_cente
         list_of_spatial_variables.append("c_{index}".format(index=i))
         list_of_spatial_variables.append("mu_{index}".format(index=i))
 
+    # Gather the values in all cells of the mesh on every process. Only the root process writes them out.
+    if mu_vector is None:
+        mu_vector = [mu.globalValue for mu in free_energy.calculate_mu(c_vector, well_center)]
+    concentrations = [c.globalValue for c in c_vector]
+    if not parallel.is_root():
+        return
+
     # Write out simulation data to the HDF5 file
     with h5py.File(target_file, 'a') as f:
-        mu_vector = free_energy.calculate_mu(c_vector, well_center)
         for i in range(len(c_vector)):
             # if type(c_vector[i]) == CellVariable:
                 # If fipy CellVariable, use its value method
-            f["c_{index}".format(index=i)][step, :] = c_vector[i].value
+            concentration = concentrations[i]
+            write_frame(f["c_{index}".format(index=i)], step, concentration)
+            # Store the range of the concentration field so that plotting does not need to scan the data
+            f["c_{index}_min".format(index=i)][step] = np.min(concentration)
+            f["c_{index}_max".format(index=i)][step] = np.max(concentration)
             if i < 2:
-                f["mu_{index}".format(index=i)][step, :] = mu_vector[i].value
+                write_frame(f["mu_{index}".format(index=i)], step, mu_vector[i])
             # elif type(c_vector[i]) == ndarray:
             #     # If numpy array, save directly
             #     f["c_{index}".format(index=i)][step, :] = c_vector[i]
             f["t"][step, :] = t
             f["locus_position"][step, :] = well_center[:]
+        # Number of frames that have been written out so far
+        f.attrs["valid_frames"] = step + 1
             
-def initialize_hdf5_file(step, total_steps, c_vector, well_center, geometry, free_energy, target_file, t):
+def write_frame(dataset, step, values):
+    """Write the values in all cells of the mesh to a frame of a dataset of concentration fields or chemical potentials
+
+    The datasets of simulations with remeshing grow when a mesh has more cells than the datasets. Frames on meshes with
+    fewer cells only fill the first columns.
+
+    Args:
+        dataset (h5py.Dataset): Dataset of shape (frames, cells)
+
+        step (int): Index of the frame
+
+        values (numpy.ndarray): Values in all cells of the mesh
+    """
+    number_of_cells = np.shape(values)[-1]
+    if dataset.shape[1] == number_of_cells:
+        dataset[step, :] = values
+    else:
+        if dataset.shape[1] < number_of_cells:
+            dataset.resize(number_of_cells, axis=1)
+        dataset[step, :number_of_cells] = values
+
+
+def read_frame_extrema(concentration_dynamics, num_components, chunk_frames=512):
+    """Function that reads the minimum and maximum of each concentration field at every frame of a hdf5 file
+
+    Files written by :func:`write_spatial_variables_to_hdf5_file` store these values together
+    with the number of frames written, so they are read directly. For older files, the concentration datasets are read
+    once in chunks of frames, stopping at the first frame where all the concentration fields are 0.0, which marks the
+    end of the simulation data.
+
+    Args:
+        concentration_dynamics (h5py.File): Open hdf5 file that contains the datasets c_0, c_1, ...
+        num_components (int): Number of concentration fields to read
+        chunk_frames (int): Number of frames read at a time from each dataset when scanning the data
+
+    Returns:
+        frame_min (numpy.ndarray): A (num_components x valid_frames) array of the minimum of each field at each frame
+        frame_max (numpy.ndarray): A (num_components x valid_frames) array of the maximum of each field at each frame
+        valid_frames (int): Number of frames that contain simulation data
+    """
+    if 'valid_frames' in concentration_dynamics.attrs.keys():
+        valid_frames = int(concentration_dynamics.attrs['valid_frames'])
+        frame_min = np.array([concentration_dynamics['c_{index}_min'.format(index=i)][:valid_frames]
+                              for i in range(num_components)])
+        frame_max = np.array([concentration_dynamics['c_{index}_max'.format(index=i)][:valid_frames]
+                              for i in range(num_components)])
+        return frame_min, frame_max, valid_frames
+
+    datasets = [concentration_dynamics['c_{index}'.format(index=i)] for i in range(num_components)]
+    number_of_frames = datasets[0].shape[0]
+    frame_min = np.zeros((num_components, number_of_frames))
+    frame_max = np.zeros((num_components, number_of_frames))
+    has_data = np.zeros(number_of_frames, dtype=bool)
+    for start in range(0, number_of_frames, chunk_frames):
+        stop = min(start + chunk_frames, number_of_frames)
+        for i in range(num_components):
+            chunk = datasets[i][start:stop]
+            frame_min[i, start:stop] = chunk.min(axis=1)
+            frame_max[i, start:stop] = chunk.max(axis=1)
+            has_data[start:stop] |= np.any(chunk != 0, axis=1)
+        # The rest of the file has not been overwritten by simulation data
+        if not np.all(has_data[start:stop]):
+            break
+
+    empty_frames = np.flatnonzero(~has_data)
+    valid_frames = empty_frames[0] if len(empty_frames) else number_of_frames
+    return frame_min[:, :valid_frames], frame_max[:, :valid_frames], valid_frames
+
+
+def write_mesh_segment(first_frame, geometry, target_file):
+    """Record the mesh on which the frames from first_frame onwards are written in the hdf5 file
+
+    Simulations with remeshing write the cell centers and cell volumes of every mesh to the group meshes of the file,
+    in subgroups numbered in the order of the segments. See :func:`utils.mesh_transfer.read_frames`.
+
+    Args:
+        first_frame (int): Index of the first frame written on this mesh
+
+        geometry (Geometry): An instance of class :class:`utils.geometry.Geometry` that contains mesh description
+
+        target_file (string): The hdf5 file of the simulation
+    """
+    if not parallel.is_root():
+        return
+    with h5py.File(target_file, 'a') as f:
+        meshes = f.require_group("meshes")
+        segment = meshes.create_group(str(len(meshes)))
+        segment.attrs["first_frame"] = first_frame
+        segment.create_dataset("cell_centers", data=geometry.mesh.cellCenters.value)
+        segment.create_dataset("cell_volumes", data=np.asarray(geometry.mesh.cellVolumes))
+        if geometry.refinement_regions is not None:
+            segment.create_dataset("refinement_regions", data=np.reshape(geometry.refinement_regions, (-1, 3)))
+        if geometry.cell_order is not None:
+            segment.create_dataset("cell_order", data=geometry.cell_order)
+
+
+def initialize_hdf5_file(step, total_steps, c_vector, well_center, geometry, free_energy, target_file, t,
+                         resizable=False):
     # Create the list of variable names to store. We are going to store the concentration fields and the chemical
     # potentials
     list_of_spatial_variables = []
@@ -208,11 +664,22 @@ def initialize_hdf5_file(step, total_steps, c_vector, well_center, geometry, fre
         list_of_spatial_variables.append("c_{index}".format(index=i))
         list_of_spatial_variables.append("mu_{index}".format(index=i))
 
-    # Create the HDF5 file if it doesn't exist
-    if step == 0:
-        number_of_mesh_points = np.shape(c_vector)[1]
+    # Create the HDF5 file if it doesn't exist. The datasets hold all cells of the mesh, also when it is partitioned
+    # over processes.
+    if step == 0 and parallel.is_root():
+        number_of_mesh_points = c_vector[0].mesh.globalNumberOfCells
         with h5py.File(target_file, 'w') as f:
             for sv in list_of_spatial_variables:
-                f.create_dataset(sv, (total_steps, number_of_mesh_points))
+                # The number of cells changes in simulations with remeshing
+                f.create_dataset(sv, (total_steps, number_of_mesh_points),
+                                 maxshape=(total_steps, None) if resizable else None)
+            # Minimum and maximum of each concentration field at every frame
+            for i in range(len(c_vector)):
+                f.create_dataset("c_{index}_min".format(index=i), (total_steps,))
+                f.create_dataset("c_{index}_max".format(index=i), (total_steps,))
             f.create_dataset("t", (total_steps, 1))
-            f.create_dataset("locus_position", (total_steps, 2))
\ No newline at end of file
+            f.create_dataset("locus_position", (total_steps, 2))
+            # Cell i of the stored fields is cell cell_order[i] of the mesh generated by Gmsh
+            if geometry.cell_order is not None:
+                f.create_dataset("cell_order", data=geometry.cell_order)
+            f.attrs["valid_frames"] = 0
\ No newline at end of file
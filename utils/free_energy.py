@@ -27,6 +27,11 @@ class TwoCompDoubleWellFHCrossQuadratic(object):
     interaction strength captured by a Flory parameter :math:`\\gamma`
     """
 
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them
+    variable_parameters = {'alpha': '_alpha', 'beta': '_beta', 'gamma': '_gamma', 'lamda': '_lambda', 'kappa': '_kappa',
+                           'c_bar_1': '_c_bar_1', 'well_depth': '_well_depth'}
+
     def __init__(self, alpha, beta, gamma, lamda, kappa, c_bar_1, well_center, well_depth, sigma):
         """Initialize an object of :class:`TwoCompDoubleWellFHCrossQuadratic`.
 
@@ -57,15 +62,16 @@ class TwoCompDoubleWellFHCrossQuadratic(object):
         # Otherwise, we will get nonsense results in the simulations
         assert lamda > 0, "The parameter lambda is negative. Please supply a positive value"
 
-        # Assign all free energy parameters to private variables
-        self._alpha = alpha
-        self._beta = beta
-        self._gamma = gamma
-        self._lambda = lamda
-        self._kappa = kappa
-        self._c_bar_1 = c_bar_1
+        # Assign all free energy parameters to private variables. Parameters that can change during a simulation are
+        # fipy Variables, so that the model equations follow changes in their values
+        self._alpha = fp.Variable(value=alpha)
+        self._beta = fp.Variable(value=beta)
+        self._gamma = fp.Variable(value=gamma)
+        self._lambda = fp.Variable(value=lamda)
+        self._kappa = fp.Variable(value=kappa)
+        self._c_bar_1 = fp.Variable(value=c_bar_1)
         self._well_center = well_center
-        self._well_depth = well_depth
+        self._well_depth = fp.Variable(value=well_depth)
         self._sigma = sigma
 
     @property
@@ -74,6 +80,18 @@ class TwoCompDoubleWellFHCrossQuadratic(object):
         This is used to set up the surface tension term in the dynamical equations"""
         return self._kappa
 
+    def update_parameters(self, **kwargs):
+        """Change the values of free energy parameters in place. Model equations that have already been assembled
+        use the new values without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            if name == 'lamda':
+                assert value > 0, "The parameter lambda is negative. Please supply a positive value"
+            getattr(self, self.variable_parameters[name]).setValue(value)
+
     def get_gaussian_function(self, mesh):
         """Function that calculates :math:`e^{-|\\vec{r}-\\vec{r}_0|^2/2\\sigma^2}`
 
@@ -242,6 +260,11 @@ class TwoCompDoubleWellFHCrossQuadraticDimensionless(object):
     interaction strength captured by a Flory parameter :math:`\\tilde{\\gamma}`
     """
 
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them
+    variable_parameters = {'c_bar_1': '_c_bar_1', 'beta_tilde': '_beta_tilde', 'gamma_tilde': '_gamma_tilde',
+                           'lamda_tilde': '_lambda_tilde', 'kappa_tilde': '_kappa_tilde', 'well_depth': '_well_depth'}
+
     def __init__(self, c_bar_1, beta_tilde, gamma_tilde, lamda_tilde, kappa_tilde, well_center, well_depth, sigma):
         """Initialize an object of :class:`TwoCompDoubleWellFHCrossQuadratic`.
 
@@ -273,15 +296,16 @@ class TwoCompDoubleWellFHCrossQuadraticDimensionless(object):
         # Otherwise, we will get nonsense results in the simulations
         assert lamda_tilde > 0, "The parameter lambda is negative. Please supply a positive value"
 
-        # Assign all free energy parameters to private variables
-        self._beta_tilde = beta_tilde
-        self._gamma_tilde = gamma_tilde
-        self._lambda_tilde = lamda_tilde
-        self._kappa_tilde = kappa_tilde
+        # Assign all free energy parameters to private variables. Parameters that can change during a simulation are
+        # fipy Variables, so that the model equations follow changes in their values
+        self._beta_tilde = fp.Variable(value=beta_tilde)
+        self._gamma_tilde = fp.Variable(value=gamma_tilde)
+        self._lambda_tilde = fp.Variable(value=lamda_tilde)
+        self._kappa_tilde = fp.Variable(value=kappa_tilde)
         self._well_center = well_center
-        self._well_depth = well_depth
+        self._well_depth = fp.Variable(value=well_depth)
         self._sigma = sigma
-        self._c_bar_1 = c_bar_1
+        self._c_bar_1 = fp.Variable(value=c_bar_1)
 
     @property
     def kappa(self):
@@ -289,6 +313,18 @@ class TwoCompDoubleWellFHCrossQuadraticDimensionless(object):
         This is used to set up the surface tension term in the dynamical equations"""
         return self._kappa_tilde
 
+    def update_parameters(self, **kwargs):
+        """Change the values of free energy parameters in place. Model equations that have already been assembled
+        use the new values without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            if name == 'lamda_tilde':
+                assert value > 0, "The parameter lambda is negative. Please supply a positive value"
+            getattr(self, self.variable_parameters[name]).setValue(value)
+
     def get_gaussian_function(self, mesh):
         """Function that calculates :math:`e^{-|\\vec{r}-\\vec{r}_0|^2/2\\sigma^2}`
 
@@ -471,6 +507,12 @@ class TwoCompDoubleWellFHCrossQuadraticDimensionless(object):
 
 class TwoCompDoubleWellFHCrossQuadraticDimensionlessCoupled(object):
 
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them
+    variable_parameters = {'c_bar_1': '_c_bar_1', 'beta_tilde': '_beta_tilde', 'gamma_tilde': '_gamma_tilde',
+                           'lamda_tilde': '_lambda_tilde', 'kappa_tilde': '_kappa_tilde', 'chiPR_tilde': '_chiPR_tilde',
+                           'well_depth': '_well_depth', 'k_tilde': '_k_tilde'}
+
     def __init__(self, c_bar_1, beta_tilde, gamma_tilde, lamda_tilde, chiPR_tilde, kappa_tilde, well_center, well_depth, sigma, k_tilde, r_p, rest_length):
         """Initialize an object of :class:`TwoCompDoubleWellFHCrossQuadratic`.
 
@@ -502,17 +544,18 @@ class TwoCompDoubleWellFHCrossQuadraticDimensionlessCoupled(object):
         # Otherwise, we will get nonsense results in the simulations
         assert lamda_tilde > 0, "The parameter lambda is negative. Please supply a positive value"
 
-        # Assign all free energy parameters to private variables
-        self._beta_tilde = beta_tilde
-        self._gamma_tilde = gamma_tilde
-        self._lambda_tilde = lamda_tilde
-        self._kappa_tilde = kappa_tilde
-        self._chiPR_tilde = chiPR_tilde
+        # Assign all free energy parameters to private variables. Parameters that can change during a simulation are
+        # fipy Variables, so that the model equations follow changes in their values
+        self._beta_tilde = fp.Variable(value=beta_tilde)
+        self._gamma_tilde = fp.Variable(value=gamma_tilde)
+        self._lambda_tilde = fp.Variable(value=lamda_tilde)
+        self._kappa_tilde = fp.Variable(value=kappa_tilde)
+        self._chiPR_tilde = fp.Variable(value=chiPR_tilde)
         self._well_center = well_center
-        self._well_depth = well_depth
+        self._well_depth = fp.Variable(value=well_depth)
         self._sigma = sigma
-        self._c_bar_1 = c_bar_1
-        self._k_tilde = k_tilde
+        self._c_bar_1 = fp.Variable(value=c_bar_1)
+        self._k_tilde = fp.Variable(value=k_tilde)
         self._r_p = r_p
         self._rest_length = rest_length
 
@@ -522,6 +565,18 @@ class TwoCompDoubleWellFHCrossQuadraticDimensionlessCoupled(object):
         This is used to set up the surface tension term in the dynamical equations"""
         return self._kappa_tilde
 
+    def update_parameters(self, **kwargs):
+        """Change the values of free energy parameters in place. Model equations that have already been assembled
+        use the new values without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            if name == 'lamda_tilde':
+                assert value > 0, "The parameter lambda is negative. Please supply a positive value"
+            getattr(self, self.variable_parameters[name]).setValue(value)
+
     def get_gaussian_function(self, mesh, well_center):
         """Function that calculates :math:`e^{-|\\vec{r}-\\vec{r}_0|^2/2\\sigma^2}`
 
@@ -632,6 +687,36 @@ class TwoCompDoubleWellFHCrossQuadraticDimensionlessCoupled(object):
 
         return mu
 
+    def calculate_mu_1_bulk(self, c_vector, well_center):
+        """Calculate the chemical potential of species 1 without the surface tension contribution.
+
+        Bulk chemical potential of species 1:
+
+        .. math::
+
+            \\tilde{\\mu}_1[\\tilde{c}_1, \\tilde{c}_2] = (\\tilde{c}_1-\\bar{c}_1)^3
+            + \\tilde{\\beta} (\\tilde{c}_1-\\bar{c}_1) + \\tilde{\\gamma} \\tilde{c}_2
+            + \\tilde{\\chi} \\tilde{c}_1 \\tilde{c}^2_2 - \\tilde{c} \\exp^{-|\\vec{r}-\\vec{r}|^2/2\\sigma^2}
+
+        Args:
+            c_vector (numpy.ndarray): A 2x1 vector of species concentrations that looks like :math:`[c_1, c_2]`. The
+            concentration variables :math:`c_1` and :math:`c_2` must be instances of the class
+            :class:`fipy.CellVariable` or equivalent
+
+            well_center (numpy.ndarray): Coordinates of the center of the Gaussian well
+
+        Returns:
+            mu_1 (fipy.CellVariable): The bulk chemical potential of species 1
+        """
+
+        mu_1 = ((c_vector[0] - self._c_bar_1) ** 3
+                + self._beta_tilde * (c_vector[0] - self._c_bar_1)
+                - self.get_gaussian_function(c_vector[0].mesh, well_center)
+                + self._gamma_tilde * c_vector[1]
+                + self._chiPR_tilde * c_vector[0] * c_vector[1] ** 2)
+
+        return mu_1
+
     def calculate_jacobian(self, c_vector):
         """Calculate the Jacobian matrix of coefficients to feed to the transport equations.
 
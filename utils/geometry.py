@@ -3,7 +3,100 @@
 
 import fipy as fp
 from fipy import Gmsh2D
+from fipy.meshes.mesh2D import Mesh2D
 import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from utils import parallel
+
+
+def graded_size_field(refinement_regions, cell_size, coarse_cell_size, grading_length):
+    """Return the Gmsh commands of a background field that grades the size of the mesh elements.
+
+    The elements have the size cell_size inside each refinement region, and grow linearly with the distance from the
+    nearest region up to coarse_cell_size at a distance grading_length outside it.
+
+    Args:
+        refinement_regions (list): Disks to mesh finely, as tuples (x, y, radius) of their centers and radii
+
+        cell_size (float): Side length of the mesh elements inside the refinement regions
+
+        coarse_cell_size (float): Side length of the mesh elements far from the refinement regions
+
+        grading_length (float): Distance from a refinement region over which the elements grow to coarse_cell_size
+
+    Returns:
+        commands (string): Gmsh commands to append to the description of the geometry
+    """
+    commands = ''
+    fields = []
+    for x, y, radius in refinement_regions:
+        fields.append(len(fields) + 1)
+        # Distance from the region in units of grading_length. The weight (|u| - |u - 1| + 1) / 2 clamps it to [0, 1].
+        u = '((Sqrt((x - (%g))^2 + (y - (%g))^2) - %g) / %g)' % (x, y, radius, grading_length)
+        commands += 'Field[%d] = MathEval;\n' % fields[-1]
+        commands += 'Field[%d].F = "%g + %g * (Abs(%s) - Abs(%s - 1) + 1) / 2";\n' % (fields[-1], cell_size,
+                                                                                    coarse_cell_size - cell_size, u, u)
+    if not fields:
+        fields.append(1)
+        commands += 'Field[1] = MathEval;\nField[1].F = "%g";\n' % coarse_cell_size
+    commands += 'Field[%d] = Min;\n' % (len(fields) + 1)
+    commands += 'Field[%d].FieldsList = {%s};\n' % (len(fields) + 1, ', '.join(str(field) for field in fields))
+    commands += 'Background Field = %d;\n' % (len(fields) + 1)
+    # Only the background field sets the size of the mesh elements
+    commands += 'Mesh.MeshSizeFromPoints = 0;\nMesh.MeshSizeFromCurvature = 0;\nMesh.MeshSizeExtendFromBoundary = 0;\n'
+    return commands
+
+
+def _order_of_first_appearance(ids):
+    """Return the distinct values of a masked array of indices in the order of their first appearance by column"""
+    ids = ids.T
+    flat = np.asarray(ids).ravel()[~np.ma.getmaskarray(ids).ravel()]
+    return flat[np.sort(np.unique(flat, return_index=True)[1])]
+
+
+def reorder_cells(mesh):
+    """Number the cells of a 2D mesh with the reverse Cuthill-McKee ordering of their adjacency graph.
+
+    Gmsh numbers the elements in the order in which it generates them, so that neighboring cells can have indices that
+    are far apart. The reverse Cuthill-McKee ordering reduces the bandwidth of the matrices of the equations, which
+    makes the factorizations and the gathers of cell values at the faces more cache friendly. The faces and vertices
+    are then numbered in the order in which the reordered cells refer to them.
+
+    Args:
+        mesh (fipy.meshes.mesh2D.Mesh2D): A 2D fipy mesh that is not partitioned over processes
+
+    Returns:
+        reordered_mesh (fipy.meshes.mesh2D.Mesh2D): The same mesh with its cells, faces and vertices renumbered
+
+        cell_order (numpy.ndarray): Cell i of reordered_mesh is cell cell_order[i] of mesh
+    """
+    if parallel.number_of_processes() > 1:
+        raise ValueError("The cells of meshes that are partitioned over processes cannot be reordered")
+    face_cells = mesh.faceCellIDs
+    interior = ~np.ma.getmaskarray(face_cells[1])
+    first = np.asarray(face_cells[0])[interior]
+    second = np.asarray(face_cells[1].filled(0))[interior]
+    adjacency = sparse.coo_matrix((np.ones(2 * len(first)), (np.concatenate((first, second)),
+                                                             np.concatenate((second, first)))),
+                                  shape=(mesh.numberOfCells, mesh.numberOfCells)).tocsr()
+    cell_order = csgraph.reverse_cuthill_mckee(adjacency, symmetric_mode=True).astype(int)
+
+    cell_faces = mesh.cellFaceIDs[:, cell_order]
+    face_order = _order_of_first_appearance(cell_faces)
+    new_face_ids = np.empty(mesh.numberOfFaces, dtype=int)
+    new_face_ids[face_order] = np.arange(len(face_order))
+    face_vertices = mesh.faceVertexIDs[:, face_order]
+    vertex_order = _order_of_first_appearance(face_vertices)
+    new_vertex_ids = np.empty(mesh.vertexCoords.shape[1], dtype=int)
+    new_vertex_ids[vertex_order] = np.arange(len(vertex_order))
+
+    reordered_mesh = Mesh2D(vertexCoords=mesh.vertexCoords[:, vertex_order],
+                            faceVertexIDs=np.ma.array(new_vertex_ids[face_vertices.filled(0)],
+                                                      mask=np.ma.getmaskarray(face_vertices)),
+                            cellFaceIDs=np.ma.array(new_face_ids[cell_faces.filled(0)],
+                                                    mask=np.ma.getmaskarray(cell_faces)))
+    return reordered_mesh, cell_order
 
 
 class Geometry(object):
@@ -12,6 +105,13 @@ class Geometry(object):
     This is a base class for the different kinds of mesh geometries used in the simulations.
     """
 
+    # Factor that converts the sum of the volumes of the mesh cells into the area or volume of the simulated domain
+    volume_scale = 1.0
+    # Regions in which a graded mesh is fine, as tuples (x, y, radius), or None if the mesh is not graded
+    refinement_regions = None
+    # Indices of the cells of self.mesh in the mesh they were generated as, or None if the cells were not reordered
+    cell_order = None
+
     def __init__(self, mesh=None):
         """Initialize the Geometry object, which initializes an attribute called mesh if available.
 
@@ -41,23 +141,57 @@ class Geometry(object):
         except AttributeError:
             print('self.mesh is expected to be a fipy.meshes.mesh variable. It does not have an attribute cellCenters')
 
+    def get_full_mesh(self):
+        """Return the mesh of the full domain. Geometries that only mesh a symmetric part of the domain override this.
+
+        Returns:
+            mesh (fipy.meshes.mesh): Mesh of the full domain
+        """
+        return self.mesh
+
+    def expand_to_full_mesh(self, values):
+        """Return values in the cells of self.mesh in the cells of the mesh returned by get_full_mesh()
+
+        Args:
+            values (numpy.ndarray): Values in the cells of self.mesh, with the cells along the last axis
+
+        Returns:
+            expanded_values (numpy.ndarray): Values in the cells of the full mesh, with the cells along the last axis
+        """
+        return np.asarray(values)
+
 
 class CircularMesh2d(Geometry):
     """Class to create a 2D circular mesh derived from the base class Geometry.
 
-    This class is defined by two parameters - radius of the circle and cell size.
+    This class is defined by two parameters - radius of the circle and cell size. The size of the mesh elements can be
+    graded from cell_size in refinement regions to a larger size far from them.
     """
 
-    def __init__(self, radius, cell_size):
+    def __init__(self, radius, cell_size, refinement_regions=None, coarse_cell_size=None, grading_length=None,
+                 reorder=False):
         """Initialize a circular 2D mesh object depending on the radius and cell size. This uses the function Gmsh2D()
 
         Args:
             radius (float): Radius of the total domain
 
             cell_size (float): Side length of a discrete mesh element
+
+            refinement_regions (list): If given, disks as tuples (x, y, radius) in which the elements have the size
+            cell_size, while the elements far from them have the size coarse_cell_size. See graded_size_field().
+
+            coarse_cell_size (float): Side length of the mesh elements far from the refinement regions
+
+            grading_length (float): Distance from a refinement region over which the elements grow to coarse_cell_size
+
+            reorder (bool): Whether to renumber the cells of the Gmsh mesh with reorder_cells()
         """
         # Initialize base class Geometry
         Geometry.__init__(self)
+        size_field = ''
+        if refinement_regions is not None:
+            size_field = graded_size_field(refinement_regions, cell_size, coarse_cell_size, grading_length)
+        self.refinement_regions = refinement_regions
         # Construct a circular mesh
         self.mesh = Gmsh2D('''   cell_size = %g;
                                  radius = %g;
@@ -72,7 +206,148 @@ class CircularMesh2d(Geometry):
                                  Circle(9) = {5, 1, 2};
                                  Line Loop(10) = {6, 7, 8, 9};
                                  Plane Surface(11) = {10};
-                              ''' % (cell_size, radius))
+                              ''' % (cell_size, radius) + size_field)
+        if reorder:
+            # Number neighboring cells close to each other
+            self.mesh, self.cell_order = reorder_cells(self.mesh)
+
+
+class AxisymmetricMesh1d(Geometry):
+    """Class to create a 1D radial mesh of a circular domain derived from the base class Geometry.
+
+    When the seeds, the reaction center and the well center are all at the center of a circular domain, the solution
+    stays radially symmetric. The equations are then solved along the radius with the fipy mesh CylindricalGrid1D,
+    whose face areas and cell volumes include the factor r of polar coordinates. The coordinate of the mesh is the
+    distance r from the center of the circle.
+    """
+
+    volume_scale = 2.0 * np.pi
+
+    def __init__(self, radius, cell_size):
+        """Initialize a radial mesh of a circle depending on the radius and cell size
+
+        Args:
+            radius (float): Radius of the total domain
+
+            cell_size (float): Width of the rings of cells along the radius
+        """
+        # Initialize base class Geometry
+        Geometry.__init__(self)
+        number_of_cells = int(round(radius / cell_size))
+        self.mesh = fp.CylindricalGrid1D(nr=number_of_cells, dr=radius / number_of_cells)
+        self.radius = radius
+        self.cell_size = cell_size
+        self._full_mesh = None
+
+    def get_mesh_distances_squared_from_point(self, reference_point):
+        """Function that calculates the squared distance of each ring of cells from a point in the plane of the circle.
+
+        Args:
+            reference_point (numpy.ndarray): A 2x1 vector containing the coordinates of the reference point. It must be
+            the center of the circle, since any other point breaks the radial symmetry.
+
+        Returns:
+             squared_distances (fipy.variable): A fipy variable that stores the distances of each mesh point from the
+             reference point.
+        """
+        assert np.allclose(reference_point, 0.0), \
+            "Points away from the center of the circle are not radially symmetric"
+        return fp.CellVariable(mesh=self.mesh, value=self.mesh.cellCenters.value[0] ** 2)
+
+    def expand_to_mesh(self, values, mesh):
+        """Interpolate radial profiles onto the cells of a 2D mesh of the full circle.
+
+        Args:
+            values (numpy.ndarray): Values in the cells of the radial mesh, with the cells along the last axis
+
+            mesh (fipy.meshes.mesh): A 2D mesh of the circle, centered at the origin
+
+        Returns:
+            expanded_values (numpy.ndarray): Values in the cells of the 2D mesh, with the cells along the last axis
+        """
+        radii = self.mesh.cellCenters.value[0]
+        distances = np.sqrt(np.sum(mesh.cellCenters.value ** 2, axis=0))
+        return np.apply_along_axis(lambda profile: np.interp(distances, radii, profile), -1, np.asarray(values))
+
+    def get_full_mesh(self):
+        """Return the 2D mesh of the full circle, which is built with Gmsh on the first call"""
+        if self._full_mesh is None:
+            self._full_mesh = CircularMesh2d(radius=self.radius, cell_size=self.cell_size).mesh
+        return self._full_mesh
+
+    def expand_to_full_mesh(self, values):
+        """Interpolate radial profiles onto the cells of the 2D mesh of the full circle"""
+        return self.expand_to_mesh(values, self.get_full_mesh())
+
+
+class SemicircularMesh2d(Geometry):
+    """Class to create a 2D mesh of the upper half of a circle derived from the base class Geometry.
+
+    When the seeds, the reaction center and the well center all lie on the x axis, the solution is symmetric under the
+    reflection y -> -y, and only the half of the circle with y >= 0 has to be solved. The default no-flux boundary
+    conditions of fipy on the straight edge at y = 0 are the conditions of this mirror symmetry. The coordinates of the
+    mesh are those of the full circle, whose center is at the origin.
+    """
+
+    volume_scale = 2.0
+
+    def __init__(self, radius, cell_size, refinement_regions=None, coarse_cell_size=None, grading_length=None,
+                 reorder=False):
+        """Initialize a semicircular 2D mesh object depending on the radius and cell size. This uses the function
+        Gmsh2D()
+
+        Args:
+            radius (float): Radius of the total domain
+
+            cell_size (float): Side length of a discrete mesh element
+
+            refinement_regions (list): If given, disks as tuples (x, y, radius) in which the elements have the size
+            cell_size, while the elements far from them have the size coarse_cell_size. See graded_size_field().
+
+            coarse_cell_size (float): Side length of the mesh elements far from the refinement regions
+
+            grading_length (float): Distance from a refinement region over which the elements grow to coarse_cell_size
+
+            reorder (bool): Whether to renumber the cells of the Gmsh mesh with reorder_cells()
+        """
+        # Initialize base class Geometry
+        Geometry.__init__(self)
+        size_field = ''
+        if refinement_regions is not None:
+            size_field = graded_size_field(refinement_regions, cell_size, coarse_cell_size, grading_length)
+        self.refinement_regions = refinement_regions
+        # Construct a semicircular mesh
+        self.mesh = Gmsh2D('''   cell_size = %g;
+                                 radius = %g;
+                                 Point(1) = {0, 0, 0, cell_size};
+                                 Point(2) = {radius, 0, 0, cell_size};
+                                 Point(3) = {0, radius, 0, cell_size};
+                                 Point(4) = {-radius, 0, 0, cell_size};
+                                 Circle(5) = {2, 1, 3};
+                                 Circle(6) = {3, 1, 4};
+                                 Line(7) = {4, 1};
+                                 Line(8) = {1, 2};
+                                 Line Loop(9) = {5, 6, 7, 8};
+                                 Plane Surface(10) = {9};
+                              ''' % (cell_size, radius) + size_field)
+        if reorder:
+            # Number neighboring cells close to each other
+            self.mesh, self.cell_order = reorder_cells(self.mesh)
+        self._full_mesh = None
+
+    def get_full_mesh(self):
+        """Return the mesh of the full circle, made of self.mesh and its mirror image in the x axis.
+
+        The cells of self.mesh come first, followed by their mirror images in the same order.
+        """
+        if self._full_mesh is None:
+            self._full_mesh = self.mesh + self.mesh * ((1,), (-1,))
+        return self._full_mesh
+
+    def expand_to_full_mesh(self, values):
+        """Reflect values in the cells of self.mesh to the cells of the mesh of the full circle"""
+        values = np.asarray(values)
+        return np.concatenate((values, values), axis=-1)
 
 
 class SquareMesh2d(Geometry):
@@ -4,6 +4,8 @@
 
 import fipy as fp
 import numpy as np
+from . import parallel
+from .geometry import AxisymmetricMesh1d, SemicircularMesh2d
 
 
 def initialize_uniform_profile(c_vector, values):
@@ -39,8 +41,11 @@ def add_noise_to_initial_conditions(c_vector, sigmas, random_seed):
 
     for i in range(len(c_vector)):
         if type(c_vector[i]) == fp.variables.cellVariable.CellVariable:
-            number_of_mesh_elements = np.size(c_vector[i].value)
-            c_vector[i].value += sigmas[i] * np.random.randn(number_of_mesh_elements)
+            # Draw the noise for all cells of the mesh, so that it does not depend on how the mesh is partitioned over
+            # processes
+            mesh = c_vector[i].mesh
+            noise = np.random.randn(mesh.globalNumberOfCells)
+            c_vector[i].value += sigmas[i] * parallel.global_to_local(mesh, noise)
 
 
 def nucleate_spherical_seed(concentration, value, dimension, geometry, nucleus_size, location):
@@ -63,7 +68,15 @@ def nucleate_spherical_seed(concentration, value, dimension, geometry, nucleus_s
     assert np.size(location) == dimension, "The location coordinates does not match with the dimensions of the mesh"
     coordinates_of_cells = geometry.mesh.cellCenters.value
 
-    if dimension == 1:
+    if isinstance(geometry, AxisymmetricMesh1d):
+        # The nucleus is at the center of the circle, so it covers the rings of cells within its radius
+        distance = np.sqrt(geometry.get_mesh_distances_squared_from_point(location).value)
+        concentration[distance < nucleus_size] = value
+    elif isinstance(geometry, SemicircularMesh2d):
+        # The coordinates of the half circle are those of the full circle, so the location is relative to the cells
+        distance = np.sqrt((coordinates_of_cells[0] - location[0]) ** 2 + (coordinates_of_cells[1] - location[1]) ** 2)
+        concentration[distance < nucleus_size] = value
+    elif dimension == 1:
         x_centroid = 0.5 * (min(geometry.mesh.x) + max(geometry.mesh.x))
         x_centroid += location[0]
         distance = np.abs(coordinates_of_cells[0] - x_centroid)
@@ -0,0 +1,211 @@
+"""Module with helper functions to move concentration fields between meshes when the mesh is regenerated.
+
+A simulation with remeshing regenerates its graded mesh around the condensates as they move. The fields are then
+transferred to the new mesh so that the total amount of every species is conserved, and the data file records the mesh
+of each segment of frames. The functions here detect the condensates, transfer values between the cells of two meshes
+and read frames of the data file back on any mesh. The same transfer moves a simulation from a coarse to a fine mesh,
+or restarts a stored frame on a mesh of a different resolution.
+"""
+
+import collections
+import numpy as np
+from scipy import sparse
+from scipy import spatial
+from scipy.sparse import csgraph
+
+
+# Transfers from the meshes of the segments of data files to the meshes that their frames are read on, by the name of
+# the file, the index of the segment and the target mesh. The target mesh is kept with the transfer so that its id is
+# not reused while the entry exists.
+_TRANSFER_CACHE = collections.OrderedDict()
+_TRANSFER_CACHE_SIZE = 8
+
+
+def condensate_regions(concentration, threshold, mesh, margin):
+    """Return disks that cover the condensates, which are the connected groups of cells above a threshold
+
+    Args:
+        concentration (numpy.ndarray): Values of the concentration in the cells of the mesh
+
+        threshold (float): Cells with a concentration above this value are part of a condensate
+
+        mesh (fipy.meshes.mesh): A 2D fipy mesh
+
+        margin (float): Distance by which the disks extend beyond the outermost cell centers of each condensate
+
+    Returns:
+        regions (list): Disks as tuples (x, y, radius) of their centers and radii, one for each condensate
+    """
+    above = np.asarray(concentration) > threshold
+    if not np.any(above):
+        return []
+    # Connect neighboring cells that are both above the threshold
+    face_cells = mesh.faceCellIDs
+    interior = ~np.ma.getmaskarray(face_cells[1])
+    first = np.asarray(face_cells[0])[interior]
+    second = np.asarray(face_cells[1].filled(0))[interior]
+    connected = above[first] & above[second]
+    graph = sparse.coo_matrix((np.ones(np.count_nonzero(connected)), (first[connected], second[connected])),
+                              shape=(mesh.numberOfCells, mesh.numberOfCells))
+    labels = csgraph.connected_components(graph, directed=False)[1]
+
+    cell_centers = mesh.cellCenters.value
+    cell_volumes = np.asarray(mesh.cellVolumes)
+    regions = []
+    for label in np.unique(labels[above]):
+        cells = above & (labels == label)
+        center = cell_centers[:, cells] @ cell_volumes[cells] / np.sum(cell_volumes[cells])
+        radius = np.max(np.sqrt(np.sum((cell_centers[:, cells] - center[:, np.newaxis]) ** 2, axis=0))) + margin
+        regions.append((float(center[0]), float(center[1]), float(radius)))
+    return regions
+
+
+class CellTransfer(object):
+    """Transfer of values in the cells of one mesh to the cells of another mesh of the same domain
+
+    The values are interpolated linearly between the cell centers of the source mesh, with the barycentric coordinates
+    of the target cell centers in a Delaunay triangulation of the source cell centers. The cells of the target mesh
+    outside the convex hull of these centers take the value of the nearest one, which is found with a KD-tree. The
+    weights are computed once and stored in a sparse matrix, so that any number of fields and frames are transferred
+    between the same pair of meshes with a matrix product. The interpolated values are then corrected so that the
+    integral of each field over the domain is the same on both meshes: fields without negative values are rescaled,
+    which keeps them non-negative, and other fields are shifted by a constant.
+    """
+
+    def __init__(self, source_centers, source_volumes, target_centers, target_volumes):
+        """Initialize the transfer from the cell centers and volumes of the two meshes, which have at least 2 dimensions
+
+        Args:
+            source_centers (numpy.ndarray): Coordinates of the cell centers of the source mesh, of shape
+            (dimension, cells)
+
+            source_volumes (numpy.ndarray): Volumes of the cells of the source mesh
+
+            target_centers (numpy.ndarray): Coordinates of the cell centers of the target mesh, of shape
+            (dimension, cells)
+
+            target_volumes (numpy.ndarray): Volumes of the cells of the target mesh
+        """
+        source_points = np.asarray(source_centers).T
+        target_points = np.asarray(target_centers).T
+        dimension = source_points.shape[1]
+        triangulation = spatial.Delaunay(source_points)
+        simplices = triangulation.find_simplex(target_points)
+        inside = np.flatnonzero(simplices >= 0)
+        outside = np.flatnonzero(simplices < 0)
+
+        # Barycentric coordinates of the target cell centers in the simplices that contain them
+        transforms = triangulation.transform[simplices[inside]]
+        coordinates = np.einsum('ijk,ik->ij', transforms[:, :dimension],
+                                target_points[inside] - transforms[:, dimension])
+        weights = np.column_stack((coordinates, 1.0 - np.sum(coordinates, axis=1)))
+        nearest = spatial.cKDTree(source_points).query(target_points[outside])[1]
+        rows = np.concatenate((np.repeat(inside, dimension + 1), outside))
+        columns = np.concatenate((triangulation.simplices[simplices[inside]].ravel(), nearest))
+        self.matrix = sparse.csr_matrix((np.concatenate((weights.ravel(), np.ones(len(outside)))), (rows, columns)),
+                                        shape=(len(target_points), len(source_points)))
+        self.source_volumes = np.asarray(source_volumes)
+        self.target_volumes = np.asarray(target_volumes)
+
+    @classmethod
+    def between_meshes(cls, source_mesh, target_mesh):
+        """Return the transfer from the cells of source_mesh to the cells of target_mesh"""
+        return cls(source_mesh.cellCenters.value, np.asarray(source_mesh.cellVolumes),
+                   target_mesh.cellCenters.value, np.asarray(target_mesh.cellVolumes))
+
+    def __call__(self, values):
+        """Transfer values in the cells of the source mesh to the cells of the target mesh
+
+        Args:
+            values (numpy.ndarray): Values in the cells of the source mesh, with the cells along the last axis
+
+        Returns:
+            transferred_values (numpy.ndarray): Values in the cells of the target mesh, with the cells along the last
+            axis
+        """
+        values = np.asarray(values, dtype=float)
+        columns = values.reshape(-1, values.shape[-1]).T
+        transferred = self.matrix @ columns
+
+        # Conserve the integral of each field
+        source_totals = self.source_volumes @ columns
+        target_totals = self.target_volumes @ transferred
+        for j in range(columns.shape[1]):
+            if np.all(columns[:, j] >= 0.0) and target_totals[j] > 0.0:
+                transferred[:, j] *= source_totals[j] / target_totals[j]
+            else:
+                transferred[:, j] += (source_totals[j] - target_totals[j]) / np.sum(self.target_volumes)
+        return transferred.T.reshape(values.shape[:-1] + (self.matrix.shape[0],))
+
+
+def transfer_cell_values(values, source_centers, source_volumes, target_centers, target_volumes):
+    """Transfer values in the cells of one mesh to the cells of another mesh of the same domain. See
+    :class:`CellTransfer`, which should be used directly to transfer values between the same meshes more than once."""
+    return CellTransfer(source_centers, source_volumes, target_centers, target_volumes)(values)
+
+
+def transfer_between_meshes(values, source_mesh, target_mesh):
+    """Transfer values in the cells of source_mesh to the cells of target_mesh. See :class:`CellTransfer`."""
+    return CellTransfer.between_meshes(source_mesh, target_mesh)(values)
+
+
+def segment_of_frames(data_file, frames):
+    """Return the index of the mesh segment that each frame of a data file was written on
+
+    Args:
+        data_file (h5py.File): Open hdf5 file written by a simulation with remeshing
+
+        frames (numpy.ndarray): Indices of frames in the file
+
+    Returns:
+        segments (numpy.ndarray): Index of the segment in the group meshes of the file for each frame
+    """
+    meshes = data_file['meshes']
+    first_frames = np.array([meshes[str(k)].attrs['first_frame'] for k in range(len(meshes))])
+    return np.searchsorted(first_frames, np.asarray(frames), side='right') - 1
+
+
+def read_frames(data_file, name, frames, mesh):
+    """Read frames of a field from a data file in the cells of a mesh
+
+    Files of simulations without remeshing hold every frame on the same mesh, and the frames are returned as they are.
+    Otherwise, each frame is transferred from the mesh of its segment to the given mesh. The transfers of the most
+    recently read segments are kept, so that reading one frame at a time does not recompute them.
+
+    Args:
+        data_file (h5py.File): Open hdf5 file written by a simulation
+
+        name (string): Name of the dataset, for example c_0
+
+        frames (int or slice): Index of a frame or slice of frames to read
+
+        mesh (fipy.meshes.mesh): Mesh on which to return the values. It must cover the domain of the simulation.
+
+    Returns:
+        values (numpy.ndarray): Values of the frames in the cells of the mesh, with the cells along the last axis
+    """
+    dataset = data_file[name]
+    if 'meshes' not in data_file:
+        return dataset[frames]
+    indices = np.arange(dataset.shape[0])[frames]
+    segments = np.atleast_1d(segment_of_frames(data_file, indices))
+    values = np.empty(np.shape(indices) + (mesh.numberOfCells,))
+    for segment in np.unique(segments):
+        key = (data_file.filename, int(segment), id(mesh))
+        if key in _TRANSFER_CACHE:
+            _TRANSFER_CACHE.move_to_end(key)
+        else:
+            group = data_file['meshes'][str(segment)]
+            _TRANSFER_CACHE[key] = (mesh, CellTransfer(group['cell_centers'][:], group['cell_volumes'][:],
+                                                       mesh.cellCenters.value, np.asarray(mesh.cellVolumes)))
+            if len(_TRANSFER_CACHE) > _TRANSFER_CACHE_SIZE:
+                _TRANSFER_CACHE.popitem(last=False)
+        transfer = _TRANSFER_CACHE[key][1]
+        in_segment = np.atleast_1d(segments == segment)
+        rows = np.atleast_1d(indices)[in_segment]
+        source_values = np.stack([dataset[row, :transfer.matrix.shape[1]] for row in rows])
+        transferred = transfer(source_values)
+        if np.ndim(indices) == 0:
+            return transferred[0]
+        values[in_segment] = transferred
+    return values
@@ -0,0 +1,120 @@
+"""Module with helper functions to run simulations on meshes that are partitioned over MPI processes.
+
+FiPy partitions the mesh when a simulation is run with mpirun and a parallel solver suite (PETSc or Trilinos, chosen
+with the environment variable FIPY_SOLVERS). Each process then holds the values of the cells in its partition and a
+layer of overlapping cells from the neighboring partitions. The functions here reduce the values of cell variables over
+all processes, counting every cell once, and decide which process writes the output files. In a serial run they reduce
+to the corresponding numpy functions.
+"""
+
+import fipy as fp
+import numpy as np
+
+
+def number_of_processes():
+    """Return the number of MPI processes that the simulation runs on"""
+    return fp.parallelComm.Nproc
+
+
+def is_root():
+    """Return whether this process writes the output files"""
+    return fp.parallelComm.procID == 0
+
+
+def barrier():
+    """Wait until all processes reach this point"""
+    fp.parallelComm.Barrier()
+
+
+def broadcast(obj):
+    """Send a python object from the root process to all processes
+
+    Args:
+        obj: Object to send. Its value on the other processes is ignored
+
+    Returns:
+        obj: The object of the root process
+    """
+    return fp.parallelComm.bcast(obj, root=0)
+
+
+def local_values(variable):
+    """Return the values of a cell variable in the cells owned by this process, without the overlapping cells
+
+    Args:
+        variable (fipy.CellVariable): A cell variable, or an expression of cell variables
+
+    Returns:
+        values (numpy.ndarray): Values of the variable in the cells owned by this process
+    """
+    if variable.mesh.communicator.Nproc > 1:
+        return variable.value[..., variable.mesh._localNonOverlappingCellIDs]
+    return variable.value
+
+
+def owned_cells(mesh):
+    """Return the indices of the cells owned by this process among the cells it holds, for indexing arrays of values"""
+    if mesh.communicator.Nproc > 1:
+        return mesh._localNonOverlappingCellIDs
+    return slice(None)
+
+
+def global_array_sum(mesh, values):
+    """Return the element-wise sum over all processes of an array calculated on each process
+
+    Args:
+        mesh (fipy.Mesh): The partitioned mesh
+
+        values (numpy.ndarray): Array with the same shape on all processes
+
+    Returns:
+        values (numpy.ndarray): Sum of the arrays of all processes
+    """
+    if mesh.communicator.Nproc > 1:
+        return np.sum(mesh.communicator.allgather(values), axis=0)
+    return values
+
+
+def global_max(variable):
+    """Return the maximum of a cell variable over all cells of the mesh"""
+    values = local_values(variable)
+    if variable.mesh.communicator.Nproc > 1:
+        return variable.mesh.communicator.MaxAll(np.max(values) if np.size(values) else -np.inf)
+    return np.max(values)
+
+
+def global_min(variable):
+    """Return the minimum of a cell variable over all cells of the mesh"""
+    values = local_values(variable)
+    if variable.mesh.communicator.Nproc > 1:
+        return variable.mesh.communicator.MinAll(np.min(values) if np.size(values) else np.inf)
+    return np.min(values)
+
+
+def global_sum(variable):
+    """Return the sum of a cell variable over all cells of the mesh"""
+    values = local_values(variable)
+    if variable.mesh.communicator.Nproc > 1:
+        return variable.mesh.communicator.sum(values)
+    return np.sum(values)
+
+
+def global_cell_volumes(mesh):
+    """Return the volumes of all cells of the mesh, ordered by their global cell IDs"""
+    return fp.CellVariable(mesh=mesh, value=mesh.cellVolumes).globalValue
+
+
+def global_to_local(mesh, values):
+    """Return the values of a field over all cells of the mesh in the cells held by this process
+
+    Args:
+        mesh (fipy.Mesh): The partitioned mesh
+
+        values (numpy.ndarray): Values in all cells of the mesh, ordered by their global cell IDs
+
+    Returns:
+        values (numpy.ndarray): Values in the cells held by this process, including the overlapping cells
+    """
+    if mesh.communicator.Nproc > 1:
+        return values[..., mesh._globalOverlappingCellIDs]
+    return values
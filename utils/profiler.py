@@ -0,0 +1,129 @@
+"""Module that accumulates the wall time spent in each phase of a simulation and logs per step solver metrics.
+"""
+
+import contextlib
+import csv
+import json
+import os
+import time
+
+
+class Profiler(object):
+    """Accumulate wall time and call counts per phase of the time stepping and log metrics of every time step.
+
+    The metrics of every time step are written as rows of a CSV file, and the accumulated phase timings and counters
+    are written to a JSON file. Phases may be nested, in which case the time of the inner phase is also included in
+    the time of the outer phase.
+    """
+
+    def __init__(self, out_directory, metrics_file='metrics.csv', profile_file='profile.json'):
+        """Initialize an object of :class:`Profiler`.
+
+        Args:
+            out_directory (string): The directory to write the metrics and profile files to
+
+            metrics_file (string): Name of the CSV file that contains the metrics of every time step
+
+            profile_file (string): Name of the JSON file that contains the accumulated phase timings and counters
+        """
+        self.enabled = True
+        self.phase_times = {}
+        self.phase_calls = {}
+        self.counters = {}
+        self._start_time = time.perf_counter()
+        self._metrics_path = os.path.join(out_directory, metrics_file)
+        self._profile_path = os.path.join(out_directory, profile_file)
+        self._metrics_file = None
+        self._metrics_writer = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager that adds the wall time spent inside the block to the phase called name
+
+        Args:
+            name (string): Name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, elapsed):
+        """Add a measured wall time to a phase
+
+        Args:
+            name (string): Name of the phase
+
+            elapsed (float): Wall time in seconds
+        """
+        self.phase_times[name] = self.phase_times.get(name, 0.0) + elapsed
+        self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+
+    def increment(self, name, count=1):
+        """Increment a counter such as the number of rejected time steps
+
+        Args:
+            name (string): Name of the counter
+
+            count (int): Amount to increment the counter by
+        """
+        self.counters[name] = self.counters.get(name, 0) + count
+
+    def end_step(self, **metrics):
+        """Write out the metrics of a time step as a row of the metrics file
+
+        Args:
+            **metrics: Values of the metrics for this time step. The keys of the first call set the columns of the
+            file
+        """
+        if self._metrics_writer is None:
+            self._metrics_file = open(self._metrics_path, 'w', newline='')
+            self._metrics_writer = csv.DictWriter(self._metrics_file, fieldnames=list(metrics.keys()))
+            self._metrics_writer.writeheader()
+        self._metrics_writer.writerow(metrics)
+
+    def write(self):
+        """Write out the accumulated phase timings and counters, and flush the metrics file"""
+        if self._metrics_file is not None:
+            self._metrics_file.flush()
+        profile = {'wall_time': time.perf_counter() - self._start_time,
+                   'phases': {name: {'time': self.phase_times[name], 'calls': self.phase_calls[name]}
+                              for name in self.phase_times},
+                   'counters': self.counters}
+        with open(self._profile_path, 'w') as f:
+            json.dump(profile, f, indent=2)
+
+    def close(self):
+        """Write out the profile and close the metrics file"""
+        self.write()
+        if self._metrics_file is not None:
+            self._metrics_file.close()
+            self._metrics_file = None
+            self._metrics_writer = None
+
+
+class NullProfiler(object):
+    """Profiler that does nothing, used when profiling is disabled so that the instrumented code has no overhead"""
+
+    _null_context = contextlib.nullcontext()
+
+    enabled = False
+
+    def phase(self, name):
+        return self._null_context
+
+    def record(self, name, elapsed):
+        pass
+
+    def increment(self, name, count=1):
+        pass
+
+    def end_step(self, **metrics):
+        pass
+
+    def write(self):
+        pass
+
+    def close(self):
+        pass
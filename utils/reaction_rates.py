@@ -12,13 +12,27 @@ class FirstOrderReaction(object):
         rate(c) = k c
     """
 
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them
+    variable_parameters = {'k': '_k'}
+
     def __init__(self, k):
         """Initialize an object of :class:`first_order_reaction`.
 
         Args:
              k (float): Rate constant for the first order reaction
         """
-        self._k = k
+        self._k = fp.Variable(value=k)
+
+    def update_parameters(self, **kwargs):
+        """Change the values of rate parameters in place. Model equations that have already been assembled use the
+        new values without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            getattr(self, self.variable_parameters[name]).setValue(value)
 
     def rate(self, concentration):
         """Calculate and return the reaction rate given a concentration value.
@@ -42,6 +56,10 @@ class LocalizedFirstOrderReaction(object):
         rate(c) = k0 + k e^{-|\\vec{x}-\\vec{x}_0|^2/2\\sigma^2} c
     """
 
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them
+    variable_parameters = {'k0': '_k0', 'k': '_k'}
+
     def __init__(self, k0, k, sigma, x0, simulation_geometry):
         """Initialize an object of :class:`first_order_reaction`.
 
@@ -52,8 +70,8 @@ class LocalizedFirstOrderReaction(object):
              x0 (float): Center of the spatially varying Gaussian function
              simulation_geometry (Geometry): Instance of one of the classes in :mod:`utils.geometry`
         """
-        self._k0 = k0
-        self._k = k
+        self._k0 = fp.Variable(value=k0)
+        self._k = fp.Variable(value=k)
         self._sigma = sigma
         self._x0 = x0
         self._geometry = simulation_geometry
@@ -64,6 +82,16 @@ class LocalizedFirstOrderReaction(object):
         #                        * (self._geometry.get_mesh_distances_squared_from_point(reference_point=self._x0) <
         #                           (2.0 * self._sigma)))
 
+    def update_parameters(self, **kwargs):
+        """Change the values of rate parameters in place. Model equations that have already been assembled use the
+        new values without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            getattr(self, self.variable_parameters[name]).setValue(value)
+
     def rate(self, concentration):
         """Calculate and return the reaction rate given a concentration value.
 
@@ -78,19 +106,35 @@ class LocalizedFirstOrderReaction(object):
 
 class LocalizedFirstOrderHillReaction(object):
 
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them
+    variable_parameters = {'k0': '_k0', 'k': '_k', 'hill_vmax': '_hill_vmax', 'hill_c0': '_hill_c0',
+                           'hill_kd': '_hill_kd', 'hill_n': '_hill_n', 'hill_v0': '_hill_v0'}
+
     def __init__(self, k0, k, sigma, x0, hill_vmax, hill_c0, hill_kd, hill_n, hill_v0, simulation_geometry):
-        self._k0 = k0
-        self._k = k
+        self._k0 = fp.Variable(value=k0)
+        self._k = fp.Variable(value=k)
         self._sigma = sigma
         self._x0 = x0
         self._geometry = simulation_geometry
         self._rate_constant = self._k0 + self._k * np.exp(
             -self._geometry.get_mesh_distances_squared_from_point(reference_point=self._x0) / (2.0 * self._sigma ** 2))
-        self._hill_vmax  = hill_vmax
-        self._hill_kd = hill_kd
-        self._hill_c0 = hill_c0
-        self._hill_n = hill_n
-        self._hill_v0 = hill_v0
+        self._hill_vmax = fp.Variable(value=hill_vmax)
+        self._hill_kd = fp.Variable(value=hill_kd)
+        self._hill_c0 = fp.Variable(value=hill_c0)
+        self._hill_n = fp.Variable(value=hill_n)
+        self._hill_v0 = fp.Variable(value=hill_v0)
+
+    def update_parameters(self, **kwargs):
+        """Change the values of rate parameters in place. Model equations that have already been assembled use the
+        new values without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            getattr(self, self.variable_parameters[name]).setValue(value)
+
     def rate(self, concentration):
         """Calculate and return the reaction rate given a concentration value.
 
@@ -105,16 +149,32 @@ class LocalizedFirstOrderHillReaction(object):
         return fp.ImplicitSourceTerm(coeff=self._rate_constant, var=hill_effect)
 
 class LocalizedFirstOrderLinear(object):
+
+    # Names of the arguments of __init__ for parameters that can be changed during a simulation with
+    # update_parameters, and the private variables that hold them
+    variable_parameters = {'k0': '_k0', 'k': '_k', 'linear_m': '_linear_m', 'linear_c': '_linear_c'}
+
     def __init__(self, k0, k, sigma, x0, linear_m, linear_c, simulation_geometry):
-        self._k0 = k0
-        self._k = k
+        self._k0 = fp.Variable(value=k0)
+        self._k = fp.Variable(value=k)
         self._sigma = sigma
         self._x0 = x0
         self._geometry = simulation_geometry
         self._rate_constant = self._k0 + self._k * np.exp(
             -self._geometry.get_mesh_distances_squared_from_point(reference_point=self._x0) / (2.0 * self._sigma ** 2))
-        self._linear_m  = linear_m
-        self._linear_c = linear_c
+        self._linear_m = fp.Variable(value=linear_m)
+        self._linear_c = fp.Variable(value=linear_c)
+
+    def update_parameters(self, **kwargs):
+        """Change the values of rate parameters in place. Model equations that have already been assembled use the
+        new values without being rebuilt.
+
+        Args:
+            **kwargs: New values of the parameters in :attr:`variable_parameters`, named as in :meth:`__init__`
+        """
+        for name, value in kwargs.items():
+            getattr(self, self.variable_parameters[name]).setValue(value)
+
     def rate(self, concentration):
         linear_effect = self._linear_m * concentration + self._linear_c
         return fp.ImplicitSourceTerm(coeff=self._rate_constant, var=linear_effect)
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""Module that estimates the wall time of simulations and packs them into jobs of a batch scheduler.
+
+The wall time of a simulation is modelled from the number of cells of its mesh, the number of time steps it takes at
+least and whether it has a time delay. The coefficients of the model are fitted to the simulations that have finished
+in the output directory of a sweep, which are listed in the manifest runtime_manifest.csv. The estimates give each job
+a time limit, and simulations that are short compared to an allocation are run one after another in the same job.
+"""
+
+import csv
+import json
+import os
+import numpy as np
+from .file_operations import input_parse
+
+
+def estimate_number_of_cells(input_params):
+    """Estimate the number of cells of the mesh of a simulation from its input parameters
+
+    Graded meshes are counted as if all their cells had the size dx, which overestimates their number.
+
+    Args:
+        input_params (dict): Dictionary that contains input parameters
+
+    Returns:
+        cells (float): Estimated number of cells
+    """
+    dx = float(input_params['dx'])
+    if input_params['dimension'] == 2 and input_params.get('circ_flag', 0) == 1:
+        if input_params.get('axisymmetric', 0) == 1:
+            return float(input_params['radius']) / dx
+        cells = np.pi * (float(input_params['radius']) / dx) ** 2
+        if input_params.get('mirror_symmetry', 0) == 1:
+            cells *= 0.5
+        return cells
+    return (float(input_params['length']) / dx) ** int(input_params['dimension'])
+
+
+def runtime_features(input_params):
+    """Return the features of the model of the wall time of a simulation
+
+    The features are 1, the logarithm of the number of cells, the logarithm of the smallest number of time steps the
+    simulation takes, which is the duration divided by dt_max unless total_steps is smaller, and 1 if the simulation
+    has a time delay.
+
+    Args:
+        input_params (dict): Dictionary that contains input parameters
+
+    Returns:
+        features (numpy.ndarray): Features of the simulation
+    """
+    steps = min(float(input_params['total_steps']), float(input_params['duration']) / float(input_params['dt_max']))
+    return np.array([1.0, np.log(estimate_number_of_cells(input_params)), np.log(max(steps, 1.0)),
+                     float(float(input_params.get('tau', 0.0)) > 0.0)])
+
+
+class RuntimeModel(object):
+    """Model of the wall time of a simulation, in which the logarithm of the wall time is linear in the features of
+    :func:`runtime_features`.
+
+    Before any simulations have finished, the model assumes a wall time of about 1e-4 seconds per cell and time step,
+    twice as long with a time delay. The coefficients are fitted by least squares to the logarithms of the wall times
+    of finished simulations, with a penalty on their distance from these prior coefficients, so that the model stays
+    reasonable when only a few simulations have finished. The spread of the residuals sets the margin of the time
+    limits.
+    """
+
+    prior_coefficients = np.array([np.log(1e-4), 1.0, 1.0, np.log(2.0)])
+
+    def __init__(self, regularization=1.0, spread=1.0):
+        """Initialize a model with the prior coefficients
+
+        Args:
+            regularization (float): Weight of the penalty on the distance of the coefficients from the prior ones
+
+            spread (float): Standard deviation of the logarithm of the wall time until enough simulations are fitted
+        """
+        self.regularization = regularization
+        self.coefficients = self.prior_coefficients.copy()
+        self.spread = spread
+
+    def fit(self, features, wall_times):
+        """Fit the coefficients to the wall times of finished simulations
+
+        Args:
+            features (numpy.ndarray): Features of each simulation, of shape (simulations, 4)
+
+            wall_times (numpy.ndarray): Wall time of each simulation in seconds
+        """
+        features = np.reshape(np.asarray(features, dtype=float), (-1, len(self.prior_coefficients)))
+        log_wall_times = np.log(np.asarray(wall_times, dtype=float))
+        if len(log_wall_times) == 0:
+            return
+        penalty = self.regularization * np.eye(len(self.prior_coefficients))
+        self.coefficients = np.linalg.solve(features.T @ features + penalty,
+                                            features.T @ log_wall_times + penalty @ self.prior_coefficients)
+        # The spread of the residuals is only trusted once there are clearly more simulations than coefficients
+        if len(log_wall_times) > 2 * len(self.coefficients):
+            self.spread = float(np.sqrt(np.mean((features @ self.coefficients - log_wall_times) ** 2)))
+
+    def predict(self, input_params):
+        """Return the estimated wall time of a simulation in seconds"""
+        return float(np.exp(runtime_features(input_params) @ self.coefficients))
+
+    def time_limit(self, input_params, margin=2.0, minimum=60.0):
+        """Return a time limit in seconds that the simulation exceeds with a small probability
+
+        Args:
+            input_params (dict): Dictionary that contains input parameters
+
+            margin (float): Number of standard deviations of the logarithm of the wall time to add to the estimate
+
+            minimum (float): Shortest time limit, which covers the start up of the simulation
+
+        Returns:
+            time_limit (float): Time limit in seconds
+        """
+        return max(self.predict(input_params) * np.exp(margin * self.spread), minimum)
+
+
+def update_manifest(output_directory):
+    """Collect the wall times of the simulations that have finished in a directory and write them to its manifest
+
+    Only simulations that ran until their duration or total_steps are included, since simulations that stopped at a
+    steady state, a limit cycle or a failure took less time than their input parameters imply.
+
+    Args:
+        output_directory (string): Directory that contains the output directories of simulations
+
+    Returns:
+        features (numpy.ndarray): Features of each finished simulation, of shape (simulations, 4)
+
+        wall_times (numpy.ndarray): Wall time of each finished simulation in seconds
+    """
+    rows = []
+    for name in sorted(os.listdir(output_directory)):
+        metadata_file = os.path.join(output_directory, name, 'metadata.json')
+        params_file = os.path.join(output_directory, name, 'input_params.txt')
+        if not (os.path.isfile(metadata_file) and os.path.isfile(params_file)):
+            continue
+        with open(metadata_file, 'r') as f:
+            metadata = json.load(f)
+        if metadata.get('wall_time') is None or metadata.get('termination') not in ('duration', 'total_steps'):
+            continue
+        rows.append([name] + list(runtime_features(input_parse(params_file))) + [metadata['wall_time']])
+
+    with open(os.path.join(output_directory, 'runtime_manifest.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['directory', 'constant', 'log_cells', 'log_steps', 'delay', 'wall_time'])
+        writer.writerows(rows)
+    features = np.array([row[1:5] for row in rows], dtype=float).reshape(-1, 4)
+    wall_times = np.array([row[5] for row in rows], dtype=float)
+    return features, wall_times
+
+
+def pack_jobs(time_limits, capacity):
+    """Pack simulations into jobs that run them one after another, with first fit decreasing bin packing
+
+    Args:
+        time_limits (list): Time limit of each simulation in seconds
+
+        capacity (float): Largest time limit of a job in seconds. Simulations with a longer time limit get a job each.
+
+    Returns:
+        jobs (list): Lists of the indices of the simulations in each job
+    """
+    jobs = []
+    job_times = []
+    for index in sorted(range(len(time_limits)), key=lambda i: time_limits[i], reverse=True):
+        for job in range(len(jobs)):
+            if job_times[job] + time_limits[index] <= capacity:
+                jobs[job].append(index)
+                job_times[job] += time_limits[index]
+                break
+        else:
+            jobs.append([index])
+            job_times.append(time_limits[index])
+    return jobs
+
+
+def format_time_limit(seconds):
+    """Format a time limit in seconds as days-hours:minutes:seconds for slurm, rounded up to whole minutes"""
+    minutes = int(np.ceil(seconds / 60.0))
+    return '{}-{:02d}:{:02d}:00'.format(minutes // 1440, (minutes % 1440) // 60, minutes % 60)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""
+Script to sweep parameters adaptively, resolving the boundary between oscillating and non-oscillating simulations
+
+A phase diagram only needs a fine resolution near the boundaries between the outcomes of the simulations. The sweep
+starts from the grid of values in a sweep_parameters file. Once the simulations of a round have finished, each of them
+is classified by whether its RNA oscillates, and every cell of the grid whose corners are classified differently is
+split in half along each parameter. Simulations that fail are recorded but not classified, so that a numerically
+unstable point does not make up a boundary. The next round only runs the simulations at the new corners of the split
+cells. After `levels` rounds of refinement, the boundary is resolved as finely as on a full grid with 2^levels times
+the resolution of the initial grid, with a fraction of its simulations.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import getpass
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from scipy.signal import peak_prominences
+import utils.file_operations as file_operations
+from utils.simulation_helper import get_output_dir_name
+
+
+def cell_corners(origin, size):
+    """Return the corners of a cell of the sweep lattice
+
+    Args:
+        origin (tuple): Lattice coordinates of the corner of the cell with the smallest coordinates
+
+        size (int): Side length of the cell in lattice units
+
+    Returns:
+        corners (list): Lattice coordinates of the 2^d corners of the cell
+    """
+    return list(itertools.product(*[(x, x + size) for x in origin]))
+
+
+def split_cells(cells, classes):
+    """Split the cells whose corners are classified differently into 2^d cells of half the size
+
+    Corners whose simulation failed are left out of the comparison, so that they do not make up a boundary.
+
+    Args:
+        cells (list): Cells of the sweep lattice, as tuples (origin, size)
+
+        classes (dict): Class of the simulation at each point of the lattice that has been simulated, or None if the
+        simulation failed
+
+    Returns:
+        split (list): The cells of half the size that make up the cells on the boundary
+    """
+    split = []
+    for origin, size in cells:
+        if len({classes[corner] for corner in cell_corners(origin, size)} - {None}) > 1:
+            half = size // 2
+            split.extend((corner, half) for corner in cell_corners(origin, half))
+    return split
+
+
+def lattice_to_values(point, sweep_parameter_values, scale):
+    """Return the parameter values at a point of the sweep lattice
+
+    The points of the initial grid are the values in the sweep_parameters file, which can be unevenly spaced. Points
+    between them are interpolated linearly between the neighbouring values.
+
+    Args:
+        point (tuple): Lattice coordinates of the point
+
+        sweep_parameter_values (list): Values of each swept parameter on the initial grid
+
+        scale (int): Number of lattice units between neighbouring points of the initial grid
+
+    Returns:
+        values (list): Value of each swept parameter at the point
+    """
+    # Round off the interpolation error, which would otherwise show up in the names of the output directories
+    return [float('%.12g' % np.interp(x / scale, np.arange(len(values)), values))
+            for x, values in zip(point, sweep_parameter_values)]
+
+
+def oscillation_metric(directory, tinit):
+    """Return the largest prominence of the peaks of the amount of RNA after time tinit
+
+    The amount of RNA is computed and its peaks are found with :meth:`utils.analysis.tools.simDir.periodicity`.
+
+    Args:
+        directory (string): Directory of a finished simulation
+
+        tinit (float): Time after which the peaks are taken into account, to skip the initial transient
+
+    Returns:
+        metric (float): Largest prominence of the peaks, or 0 if the amount of RNA has no peaks after tinit
+    """
+    from utils.analysis.tools import simDir
+    sim = simDir(directory)
+    sim.run(plot_limits=False, condensate=False)
+    sim.periodicity(tinit)
+    if len(sim.peaks) == 0:
+        return 0.0
+    return float(np.max(peak_prominences(sim.rna_amount, sim.peaks)[0]))
+
+
+def run_simulations(input_files, simulation_directories, output_directory, scheduler, processes, poll_interval):
+    """Run the simulations of a round of the sweep and wait for all of them to finish
+
+    Simulations whose directory already has a metadata.json file have finished in an earlier run of the sweep and are
+    not run again.
+
+    Args:
+        input_files (list): Input parameter files of the simulations
+
+        simulation_directories (list): Output directory of each simulation
+
+        output_directory (string): Directory that contains the output directories of the simulations
+
+        scheduler (string): 'local' to run the simulations in processes on this machine, or 'slurm' to submit them as
+        jobs with run_simulation.slurm
+
+        processes (int): Number of simulations to run at the same time on this machine
+
+        poll_interval (float): Seconds between checks for finished jobs with the slurm scheduler
+    """
+    pending = [(input_file, directory) for input_file, directory in zip(input_files, simulation_directories)
+               if not os.path.exists(os.path.join(directory, 'metadata.json'))]
+    if scheduler == 'local':
+        # Run the script in fresh processes that can import the package like this script
+        environment = dict(os.environ)
+        repository = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        environment['PYTHONPATH'] = os.pathsep.join(filter(None, [repository, environment.get('PYTHONPATH')]))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_simulation.py')
+
+        def run(input_file):
+            # The output of each simulation is written next to its input parameter file
+            with open(os.path.splitext(input_file)[0] + '.log', 'w') as log:
+                subprocess.run([sys.executable, script, '--i', input_file, '--o', output_directory], env=environment,
+                               stdout=log, stderr=subprocess.STDOUT)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(run, [input_file for input_file, _ in pending]))
+        return
+
+    jobs = {}
+    for input_file, directory in pending:
+        jobs[subprocess.check_output('sbatch --parsable --export=input_file={},out_folder={} run_simulation.slurm'
+                                     .format(input_file, output_directory),
+                                     shell=True).decode().strip().split(';')[0]] = directory
+    # Each simulation writes metadata.json when it ends. Jobs that are killed or fail before then leave the queue
+    # without it, and are not waited for any longer.
+    while jobs:
+        time.sleep(poll_interval)
+        squeue = subprocess.run(['squeue', '-h', '-o', '%i', '-u', getpass.getuser()], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+        # Check again later if the queue cannot be read
+        if squeue.returncode != 0:
+            continue
+        queued = squeue.stdout.decode().split()
+        for job, directory in list(jobs.items()):
+            if os.path.exists(os.path.join(directory, 'metadata.json')):
+                del jobs[job]
+            elif job not in queued:
+                print('Job {} left the queue without finishing the simulation in {}'.format(job, directory))
+                del jobs[job]
+
+
+if __name__ == "__main__":
+    """This script runs rounds of simulations that refine the grid of a sweep where the outcomes differ
+    """
+
+    parser = argparse.ArgumentParser(description='Sweep parameters adaptively around the boundary between oscillating '
+                                                 'and non-oscillating simulations')
+    parser.add_argument('--s', help="Name of sweep_parameter file with the initial grid", required=True)
+    parser.add_argument('--i', help="Name of input_parameter file", required=True)
+    parser.add_argument('--o', help="Name of output directory", required=True)
+    parser.add_argument('--levels', help="Number of times the cells on the boundary are halved", type=int, default=3)
+    parser.add_argument('--tinit', help="Time after which peaks of the amount of RNA count as oscillations",
+                        type=float, default=0.0)
+    parser.add_argument('--threshold', help="Simulations whose RNA peaks have a larger prominence than this value are "
+                                            "classified as oscillating", type=float, required=True)
+    parser.add_argument('--scheduler', help="Run the simulations on this machine or submit them to slurm",
+                        choices=['local', 'slurm'], default='local')
+    parser.add_argument('--processes', help="Number of simulations to run at the same time with the local scheduler",
+                        type=int, default=os.cpu_count())
+    parser.add_argument('--poll', help="Seconds between checks for finished slurm jobs", type=float, default=60.0)
+    args = parser.parse_args()
+
+    input_parameters = file_operations.input_parse(filename=args.i)
+    sweep_parameters = file_operations.input_parse(filename=args.s)
+    sweep_parameter_names = list(sweep_parameters.keys())
+    sweep_parameter_values = [np.asarray(values, dtype=float) for values in sweep_parameters.values()]
+
+    sweep_directory = os.path.join(args.o, 'adaptive_sweep_log')
+    os.makedirs(sweep_directory, exist_ok=True)
+
+    # Points of the initial grid are 2^levels lattice units apart, so that the cells can be halved levels times
+    scale = 2 ** args.levels
+    cells = [(tuple(scale * index for index in indices), scale)
+             for indices in itertools.product(*[range(len(values) - 1) for values in sweep_parameter_values])]
+    points = [tuple(scale * index for index in indices)
+              for indices in itertools.product(*[range(len(values)) for values in sweep_parameter_values])]
+    classes = {}
+    simulation_directories = {}
+    results_file = os.path.join(sweep_directory, 'results.csv')
+    with open(results_file, 'w', newline='') as f:
+        csv.writer(f).writerow(['level'] + sweep_parameter_names + ['termination', 'metric', 'oscillating',
+                                                                     'directory'])
+
+    for level in range(args.levels + 1):
+        # Write the input parameters of the new points of this round
+        input_files = []
+        for point in points:
+            for name, value in zip(sweep_parameter_names, lattice_to_values(point, sweep_parameter_values, scale)):
+                input_parameters[name] = value
+            directory = os.path.join(args.o, get_output_dir_name(input_parameters))
+            if directory in simulation_directories.values():
+                raise ValueError("Two points of the sweep have the output directory " + directory + ", so the swept "
+                                 "parameters must appear in the names of the output directories")
+            simulation_directories[point] = directory
+            input_files.append(os.path.join(sweep_directory, 'input_parameters_' + '_'.join(map(str, point)) + '.txt'))
+            file_operations.write_input_params_from_dict(input_parameters=input_parameters,
+                                                         target_filename=input_files[-1])
+        print('Level {}: running {} simulations ...'.format(level, len(points)))
+        run_simulations(input_files=input_files,
+                        simulation_directories=[simulation_directories[point] for point in points],
+                        output_directory=args.o, scheduler=args.scheduler, processes=args.processes,
+                        poll_interval=args.poll)
+
+        # Classify the simulations of this round
+        with open(results_file, 'a', newline='') as f:
+            writer = csv.writer(f)
+            for point in points:
+                # Simulations that failed or whose job ended before they finished are not classified
+                metadata_file = os.path.join(simulation_directories[point], 'metadata.json')
+                termination = 'failure'
+                if os.path.exists(metadata_file):
+                    with open(metadata_file, 'r') as metadata:
+                        termination = json.load(metadata)['termination']
+                if termination == 'failure':
+                    classes[point] = None
+                    writer.writerow([level] + lattice_to_values(point, sweep_parameter_values, scale) +
+                                    [termination, '', '', simulation_directories[point]])
+                    continue
+                metric = oscillation_metric(simulation_directories[point], args.tinit)
+                classes[point] = metric > args.threshold
+                writer.writerow([level] + lattice_to_values(point, sweep_parameter_values, scale) +
+                                [termination, metric, int(classes[point]), simulation_directories[point]])
+
+        if level == args.levels:
+            break
+        # Refine the cells on the boundary between the classes
+        cells = split_cells(cells, classes)
+        points = sorted({corner for origin, size in cells for corner in cell_corners(origin, size)} - set(classes))
+        if not cells:
+            break
+
+    print('Ran {} simulations. The results are in {}'.format(len(classes), results_file))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+"""Script to benchmark the throughput of the solver on representative simulation configurations
+
+Each configuration is integrated with :func:`run_simulation` for a fixed number of time steps in a separate process,
+with a :class:`utils.profiler.Profiler` attached. The script reports the number of steps per second, sweeps per step,
+rejected steps, the time spent assembling the equations, solving them and writing output, and the peak memory of the
+process. Results are appended to a JSON history file so that runs
+before and after a change can be compared.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import utils.simulation_helper as simulation_helper
+from utils.profiler import Profiler
+from utils.scripts.run_simulation import run_simulation
+
+
+# Input parameters shared by all benchmark configurations. These follow the time delay simulations in
+# workspace/05_TimeDelay.
+BASE_PARAMETERS = {'free_energy_type': 3.0, 'c_bar_1': 4.0, 'beta_tilde': -0.25, 'gamma_tilde': -0.1,
+                   'kappa_tilde': 0.05, 'lamda_tilde': 1.0, 'chiPR_tilde': 0.03, 'well_depth': 0.0,
+                   'well_center': (0.0, 0.0), 'sigma': 1.0, 'k_tilde': 0.0, 'r_p': (0, 0), 'rest_length': (0.0, 0.0),
+                   'modelAB_dynamics_type': 2.0, 'M1': 1.0, 'M2': 1.0, 'M3': 0.1, 'basal_k_production': 0.0,
+                   'k_production': 0.2, 'k_degradation': 1.0, 'reaction_sigma': 2.5, 'reaction_center': (0.0, 0.0),
+                   'hill_c0': 3.0, 'hill_kd': 1.0, 'hill_vmax': 17.5, 'hill_n': 2.0, 'hill_v0': 0.0,
+                   'linear_m': 1.0, 'linear_c': 0.0,
+                   'model_type': 2.0, 'reaction_type': 3.0, 'tau': 100.0, 'ratio': 1.0,
+                   'n_concentrations': 3.0, 'random_seed': 42.0, 'initial_values': (3.53, 0.0, 3.53),
+                   'initial_condition_noise_variance': (0.0, 0.0, 0.0), 'nucleate_seed': (1, 0, 1),
+                   'seed_value': (5.5, 0.0, 5.5), 'nucleus_size': (2.0, 0.0, 2.0),
+                   'location': ((10, 0), (0, 0), (10, 0)),
+                   'dimension': 2.0, 'circ_flag': 1.0, 'radius': 15.0, 'length': 30.0, 'dx': 0.2,
+                   'dt': 1e-4, 'dt_max': 5.0, 'dt_min': 1e-8, 'max_change_allowed': 0.05, 'duration': 15000.0,
+                   'max_sweeps': 5.0, 'max_residual': 0.1, 'data_log': 10.0, 'time_profile': ()}
+
+# Parameters that differ from BASE_PARAMETERS for each benchmark configuration
+BENCHMARK_CONFIGURATIONS = {
+    'circle_dx0.2_hill_delay': {},
+    'circle_dx0.1_hill_delay': {'dx': 0.1},
+    'circle_dx0.2_hill_delay_amg': {'solver_type': 3.0},
+    'circle_dx0.1_hill_delay_amg': {'dx': 0.1, 'solver_type': 3.0},
+    'circle_dx0.2_hill_delay_rcm': {'cell_ordering': 1.0},
+    'circle_dx0.1_hill_delay_rcm': {'dx': 0.1, 'cell_ordering': 1.0},
+    'circle_dx0.2_hill_no_delay': {'tau': 0.0},
+    'circle_dx0.2_linear_delay': {'reaction_type': 4.0},
+    'circle_dx0.2_linear_no_delay': {'reaction_type': 4.0, 'tau': 0.0},
+    'square_dx0.2_hill_delay': {'circ_flag': 0.0},
+    'circle_dx0.2_two_component': {'model_type': 1.0, 'reaction_type': 2.0, 'n_concentrations': 2.0,
+                                   'initial_values': (3.53, 0.0), 'initial_condition_noise_variance': (0.0, 0.0),
+                                   'nucleate_seed': (1, 0), 'seed_value': (5.5, 0.0), 'nucleus_size': (2.0, 0.0),
+                                   'location': ((10, 0), (0, 0))},
+}
+
+
+def run_benchmark(configuration, steps):
+    """Run one benchmark configuration for a fixed number of time steps with profiling enabled
+
+    Args:
+        configuration (string): Name of a configuration in BENCHMARK_CONFIGURATIONS
+
+        steps (int): Number of time steps to take
+
+    Returns:
+        results (dict): Benchmark metrics for this configuration
+    """
+    input_params = dict(BASE_PARAMETERS)
+    input_params.update(BENCHMARK_CONFIGURATIONS[configuration])
+    input_params['total_steps'] = float(steps)
+
+    with tempfile.TemporaryDirectory() as out_directory:
+        profiler = Profiler(out_directory=out_directory)
+
+        with profiler.phase('mesh'):
+            sim_geometry = simulation_helper.set_mesh_geometry(input_params=input_params)
+
+        with profiler.phase('assembly'):
+            c_vector = simulation_helper.initialize_concentrations(input_params=input_params,
+                                                                   simulation_geometry=sim_geometry)
+            well_center = simulation_helper.initialize_well_center(input_params=input_params)
+            fe = simulation_helper.set_free_energy(input_params)
+            equations = simulation_helper.set_model_equations(input_params=input_params,
+                                                              concentration_vector=c_vector,
+                                                              well_center=well_center,
+                                                              free_en=fe,
+                                                              simulation_geometry=sim_geometry,
+                                                              target_file=os.path.join(out_directory,
+                                                                                       'spatial_variables.hdf5'))
+
+        with profiler.phase('run'):
+            failed = run_simulation(input_params=input_params, concentration_vector=c_vector,
+                                    simulation_geometry=sim_geometry, free_en=fe, equations=equations,
+                                    out_directory=out_directory, well_center=well_center, profiler=profiler)
+
+        with open(os.path.join(out_directory, 'metrics.csv'), 'r') as f:
+            metrics = list(csv.DictReader(f))
+
+    phase_times = profiler.phase_times
+    accepted_steps = len(metrics)
+    return {'cells': int(sim_geometry.mesh.numberOfCells),
+            'steps': accepted_steps,
+            'failed': bool(failed),
+            'simulated_time': float(metrics[-1]['t']) if metrics else 0.0,
+            'steps_per_second': accepted_steps / phase_times['run'],
+            'sweeps_per_step': profiler.counters.get('sweeps', 0) / max(accepted_steps, 1),
+            'linear_iterations_per_step': profiler.counters.get('linear_iterations', 0) / max(accepted_steps, 1),
+            'rejected_steps': profiler.counters.get('rejected_steps', 0),
+            'mesh_time': phase_times['mesh'],
+            'assembly_time': phase_times['assembly'],
+            'solve_time': phase_times.get('step_once', 0.0),
+            'delay_time': phase_times.get('get_delay', 0.0),
+            'io_time': sum(phase_times.get(name, 0.0) for name in ['calculate_mu', 'write_stats', 'write_hdf5']),
+            'run_time': phase_times['run'],
+            # ru_maxrss is reported in kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+
+
+def get_git_revision():
+    """Return the git commit of the repository, or None if it cannot be determined"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous_results):
+    """Print a table of benchmark results with the speed up relative to the previous run in the history"""
+    print("{:<32}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}".format(
+        'configuration', 'cells', 'steps/s', 'vs last', 'sweeps', 'rejected', 'assembly', 'solve', 'io', 'rss_mb'))
+    for configuration, result in results.items():
+        if 'error' in result:
+            print("{:<32}{}".format(configuration, result['error']))
+            continue
+        previous = previous_results.get(configuration, {})
+        speed_up = ("{:.2f}x".format(result['steps_per_second'] / previous['steps_per_second'])
+                    if 'steps_per_second' in previous else '-')
+        print("{:<32}{:>8}{:>10.2f}{:>10}{:>10.2f}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.1f}".format(
+            configuration, result['cells'], result['steps_per_second'], speed_up, result['sweeps_per_step'],
+            result['rejected_steps'], result['assembly_time'], result['solve_time'], result['io_time'],
+            result['peak_rss_mb']))
+
+
+if __name__ == "__main__":
+    """This script runs the benchmark configurations and appends the results to a JSON history file
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the simulation time stepping on representative configurations')
+    parser.add_argument('--c', help="Names of configurations to run. Runs all configurations by default", nargs='+',
+                        choices=list(BENCHMARK_CONFIGURATIONS.keys()), default=list(BENCHMARK_CONFIGURATIONS.keys()))
+    parser.add_argument('--n', help="Number of time steps to take in each configuration", type=int, default=100)
+    parser.add_argument('--o', help="JSON file that stores the history of benchmark results",
+                        default='benchmark_history.json')
+    parser.add_argument('--l', help="Label to identify this benchmark run in the history", default='')
+    args = parser.parse_args()
+
+    history = []
+    if os.path.exists(args.o):
+        with open(args.o, 'r') as f:
+            history = json.load(f)
+
+    # Run each configuration in a fresh process so that the peak memory is measured per configuration
+    results = {}
+    for configuration in args.c:
+        print('Running benchmark ' + configuration + ' ...')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1,
+                                                    mp_context=multiprocessing.get_context('spawn')) as executor:
+            try:
+                results[configuration] = executor.submit(run_benchmark, configuration, args.n).result()
+            except Exception as error:
+                results[configuration] = {'error': repr(error)}
+
+    print_results(results, history[-1]['results'] if history else {})
+
+    history.append({'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'label': args.l,
+                    'revision': get_git_revision(),
+                    'host': platform.node(),
+                    'steps': args.n,
+                    'results': results})
+    with open(args.o, 'w') as f:
+        json.dump(history, f, indent=2)
@@ -3,19 +3,27 @@
 """
 
 import argparse
+import collections
 import utils.file_operations as file_operations
+import utils.parallel as parallel
 import utils.simulation_helper as simulation_helper
+from utils.convergence import ConvergenceMonitor
+from utils.dynamical_equations import StepTransaction
+from utils.profiler import Profiler, NullProfiler
 import os
 import os.path
 import numpy as np
 from tqdm import tqdm
 import sys
+import time
 
-def run_simulation(input_params, concentration_vector, simulation_geometry, free_en, equations, out_directory):
+def run_simulation(input_params, concentration_vector, simulation_geometry, free_en, equations, out_directory,
+                   well_center, profiler=None):
     """Integrate the dynamical equations for concentrations and write to files
 
     Args:
-        input_params (dict): Dictionary that contains input parameters. We are interested in the parameters associated
+        input_params (dict): Dictionary or :class:`utils.file_operations.InputParameters` that contains input
+        parameters. We are interested in the parameters associated
         with the numerical method for integration
 
         concentration_vector (numpy.ndarray): An nx1 vector of species concentrations that looks like
@@ -28,12 +36,21 @@ def run_simulation(input_params, concentration_vector, simulation_geometry, free
         free_en (utils.free_energy): An instance of one of the classes in mod:`utils.free_energy`
 
         equations (utils.dynamical_equations): An instance of one of the classes in mod:`utils.dynamical_equations`
+
         out_directory (string): The directory to output simulation data
 
+        well_center (numpy.ndarray): Position of the localization locus
+
+        profiler (utils.profiler.Profiler): Profiler that records the time spent in each phase of the time stepping
+        and the solver metrics of every step. Profiling is disabled if None.
+
     Returns:
         err_flag (boolean): Whether the simulation has run successfully without any errors
     """
 
+    # The wall time of the simulation is written to metadata.json, from which the run times of sweeps are estimated
+    start_time = time.perf_counter()
+
     # Simple time stepping over time interval dt
     # We increase the time step size upto a value of dt_max if the maximum change in the concentration variables is
     # small enough
@@ -48,13 +65,78 @@ def run_simulation(input_params, concentration_vector, simulation_geometry, free
     max_sweeps = int(input_params['max_sweeps'])
     max_residual = float(input_params['max_residual'])
     data_log_frequency = int(input_params['data_log'])
-    pbar = tqdm(total=total_steps)
+    # Stop the simulation after this many consecutive rejected attempts at a time step
+    max_rejections = int(input_params.get('max_rejections', 10))
+    # Reject time steps that take the concentrations beyond this magnitude
+    max_concentration = float(input_params.get('max_concentration', np.inf))
+    # Round the time steps down to a ladder of time steps dt_max * dt_ladder_ratio^(-k), so that factorizations of
+    # matrices that depend on the time step are reused. The time step controller keeps adapting dt_target.
+    dt_ladder_ratio = float(input_params.get('dt_ladder_ratio', 0.0))
+    # With the second order time integrator, reject time steps whose estimated local truncation error is larger than
+    # this value, and choose the size of the next time step from the error
+    time_error_tolerance = float(input_params.get('time_error_tolerance', 0.0))
+    # Regenerate the graded mesh around the condensates every remesh_interval steps if they have moved
+    remesh_interval = int(input_params.get('remesh_interval', 0))
+    if remesh_interval > 0 and parallel.number_of_processes() > 1:
+        raise ValueError("Remeshing is not supported on meshes that are partitioned over processes")
+    # Integrate on a mesh with cells of size cascade_dx until cascade_time, or until a steady state or limit cycle is
+    # reached, and then continue on the mesh of simulation_geometry
+    cascade_dx = float(input_params.get('cascade_dx', 0.0))
+    cascade_time = float(input_params.get('cascade_time', np.inf))
+    if cascade_dx > 0.0 and parallel.number_of_processes() > 1:
+        raise ValueError("Cascades are not supported on meshes that are partitioned over processes")
+    dt_target = dt
+    if dt_ladder_ratio > 1.0:
+        dt = simulation_helper.quantize_time_step(dt_target, dt_max, dt_ladder_ratio)
+    # Sizes of the recent accepted time steps, written out if the simulation fails
+    dt_history = collections.deque(maxlen=20)
+    pbar = tqdm(total=total_steps, disable=not parallel.is_root())
+    if profiler is None:
+        profiler = NullProfiler()
+    equations.profiler = profiler
+    # Geometry to continue on at the end of the coarse stage of a cascade, or None once the simulation is on it
+    production_geometry = None
+    end_coarse_stage = False
+    if cascade_dx > 0.0:
+        with profiler.phase('transfer'):
+            production_geometry = simulation_geometry
+            simulation_geometry = simulation_helper.set_mesh_geometry(
+                simulation_helper.get_coarse_input_params(input_params))
+            concentration_vector, free_en, equations = simulation_helper.transfer_to_geometry(
+                input_params=input_params, concentration_vector=concentration_vector, well_center=well_center,
+                simulation_geometry=production_geometry, new_geometry=simulation_geometry, equations=equations,
+                target_file=os.path.join(out_directory, 'spatial_variables.hdf5'))
+    # Snapshot of the concentrations at the start of each time step to undo rejected steps
+    transaction = StepTransaction(concentration_vector)
+    # Number of frames allocated in the HDF5 file
+    number_of_frames = int(total_steps / data_log_frequency) + 1
+
+    # Once the simulation reaches a steady state or a limit cycle, either stop it (convergence_action = 1) or write out
+    # data every sparse_data_log steps (convergence_action = 2) for the rest of the duration
+    convergence_action = int(input_params.get('convergence_action', 0))
+    sparse_data_log_frequency = int(input_params.get('sparse_data_log', 10 * data_log_frequency))
+    monitor = None
+    if convergence_action:
+        monitor = ConvergenceMonitor(mesh=simulation_geometry.mesh,
+                                     tolerance=float(input_params.get('steady_state_tolerance', 1e-6)),
+                                     window=float(input_params.get('convergence_window', 500.0)),
+                                     cycles=int(input_params.get('limit_cycle_cycles', 5)),
+                                     cycle_tolerance=float(input_params.get('limit_cycle_tolerance', 0.01)))
+        # The delayed concentration is read back from the frame of the HDF5 file at the delayed step, so every frame
+        # must be written out
+        if convergence_action == 2 and getattr(equations, 'delay_tracker', None) is not None:
+            if parallel.is_root():
+                print("Warning: sparse logging is not possible for models with a time delay. Logging every " +
+                      str(data_log_frequency) + " steps after convergence.")
+            sparse_data_log_frequency = data_log_frequency
+    termination = None
 
     # Start time stepping
     step = 0
     t = 0
     elapsed = 0
     err_flag = 0
+    frame = 0
 
     # Check if we have a time profile of parameters to implement
     time_profile_flag = 0
@@ -64,75 +146,210 @@ def run_simulation(input_params, concentration_vector, simulation_geometry, free
         transition_counter = 0
     
     # Initialize HDF5 file
-    file_operations.initialize_hdf5_file(step=int(step / data_log_frequency),
-                                         total_steps=int(total_steps / data_log_frequency) + 1,
+    file_operations.initialize_hdf5_file(step=frame,
+                                         total_steps=number_of_frames,
                                          c_vector=concentration_vector,
                                          well_center=well_center,
                                          geometry=simulation_geometry,
                                          free_energy=free_en,
                                          target_file=os.path.join(out_directory,'spatial_variables.hdf5'),
-                                         t=t)
+                                         t=t,
+                                         resizable=remesh_interval > 0 or cascade_dx > 0.0)
+    if remesh_interval > 0 or cascade_dx > 0.0:
+        file_operations.write_mesh_segment(first_frame=frame, geometry=simulation_geometry,
+                                           target_file=os.path.join(out_directory, 'spatial_variables.hdf5'))
 
     while (elapsed <= duration) and (step <= total_steps):
 
         # Check if we need to change parameters to implement the time profile of parameters
         if time_profile_flag:
             # Reset parameters when the threshold time is reached
-            if elapsed > input_params['time_profile'][transition_counter]['transition_time']:
-                # Update the input parameter values
-                for key, val in input_params['time_profile'][transition_counter].items():
-                    input_params[key] = float(val)
-                # Update model equations
-                free_en = simulation_helper.set_free_energy(input_parameters)
-                equations = simulation_helper.set_model_equations(input_params=input_params,
-                                                                  concentration_vector=concentration_vector,
-                                                                  free_en=free_en,
-                                                                  simulation_geometry=simulation_geometry,
-                                                                  target_file=os.path.join(out_directory,
-                                                                                          'spatial_variables.hdf5'))
+            transition = input_params['time_profile'][transition_counter]
+            if elapsed > transition['transition_time']:
+                changed_params = {key: (tuple(val) if isinstance(val, (tuple, list)) else float(val))
+                                  for key, val in transition.items() if key != 'transition_time'}
+                # Change the parameters of the free energy and model equations in place
+                not_updated = simulation_helper.update_model_parameters(input_params=input_params,
+                                                                        changed_params=changed_params,
+                                                                        free_en=free_en,
+                                                                        equations=equations,
+                                                                        well_center=well_center,
+                                                                        concentration_vector=concentration_vector)
+                # Update the input parameter values in a copy, since the parsed input parameters are read-only
+                input_params = dict(input_params)
+                input_params.update(changed_params)
+                # Rebuild the model equations if some parameters cannot be changed in place, keeping the history of
+                # the delayed concentration
+                if not_updated:
+                    free_en, equations = simulation_helper.rebuild_model(input_params=input_params,
+                                                                         concentration_vector=concentration_vector,
+                                                                         well_center=well_center,
+                                                                         simulation_geometry=simulation_geometry,
+                                                                         equations=equations,
+                                                                         target_file=os.path.join(
+                                                                             out_directory, 'spatial_variables.hdf5'))
+                # The dynamics may settle somewhere else with the new parameters
+                if monitor is not None:
+                    monitor.reset()
                 # Update transition counter to reflect that a transition has happened
                 transition_counter = transition_counter + 1
                 # If we have completed all parameter transitions, stop implementing the time profile
                 if transition_counter == number_of_transitions_in_profile:
                     time_profile_flag = 0
 
-        # Update the old values of concentrations
-        equations.update_old(concentration_vector)
+        # Continue on the production mesh at the end of the coarse stage of a cascade, or regenerate the mesh if the
+        # condensates have moved out of its fine regions
+        new_geometry = None
+        if production_geometry is not None and (elapsed > cascade_time or end_coarse_stage):
+            new_geometry, production_geometry = production_geometry, None
+            # The dynamics are detected again on the production mesh
+            if monitor is not None:
+                monitor.reset()
+            profiler.increment('cascades')
+        elif remesh_interval > 0 and step > 0 and step % remesh_interval == 0:
+            with profiler.phase('remesh'):
+                new_geometry = simulation_helper.remesh(
+                    input_params=input_params if production_geometry is None else
+                    simulation_helper.get_coarse_input_params(input_params),
+                    concentration_vector=concentration_vector,
+                    simulation_geometry=simulation_geometry)
+            if new_geometry is not None:
+                profiler.increment('remeshes')
+        if new_geometry is not None:
+            with profiler.phase('transfer'):
+                concentration_vector, free_en, equations = simulation_helper.transfer_to_geometry(
+                    input_params=input_params, concentration_vector=concentration_vector, well_center=well_center,
+                    simulation_geometry=simulation_geometry, new_geometry=new_geometry, equations=equations,
+                    target_file=os.path.join(out_directory, 'spatial_variables.hdf5'))
+                simulation_geometry = new_geometry
+                transaction = StepTransaction(concentration_vector)
+                if monitor is not None:
+                    monitor.set_mesh(simulation_geometry.mesh)
+                file_operations.write_mesh_segment(first_frame=frame, geometry=simulation_geometry,
+                                                   target_file=os.path.join(out_directory, 'spatial_variables.hdf5'))
+
+        # Update the old values of concentrations and take a snapshot of them in case the step is rejected
+        with profiler.phase('update_old'):
+            equations.update_old(concentration_vector)
+            transaction.begin(concentration_vector)
 
         has_converged = False
+        sweeps = 0
+        rejections = 0
+        linear_iterations = 0
+        convergence_rate = 0.0
+        time_error = None
+        attempted_dts = []
+        failed_equation = None
+        reason = 'dt fell below dt_min'
+        residuals = np.array([])
         # Step over a time step dt and solve the equations
         while dt > dt_min:
-            has_converged, residuals, max_change = equations.step_once(c_vector=concentration_vector,
-                                                                       dt=dt, t=t, step=step,
-                                                                       well_center=well_center,
-                                                                       max_residual=max_residual,
-                                                                       max_sweeps=max_sweeps)
+            attempted_dts.append(dt)
+            with profiler.phase('step_once'):
+                has_converged, residuals, max_change = equations.step_once(c_vector=concentration_vector,
+                                                                           dt=dt, t=t, step=step,
+                                                                           well_center=well_center,
+                                                                           max_residual=max_residual,
+                                                                           max_sweeps=max_sweeps)
+            sweeps += equations.sweeps
+            linear_iterations += equations.linear_iterations
+            convergence_rate = equations.convergence_rate
+            failed_equation = equations.failed_equation
+            reason = 'residuals did not fall below max_residual'
+            if not has_converged and not np.all(np.isfinite(residuals)):
+                reason = 'residuals are not finite'
+            # Check that the concentrations are finite and within bounds. The minimum and maximum are NaN if any value
+            # is NaN
+            if has_converged:
+                for i in range(2):
+                    c_min = parallel.global_min(concentration_vector[i])
+                    c_max = parallel.global_max(concentration_vector[i])
+                    if not (-max_concentration <= c_min and c_max <= max_concentration
+                            and np.isfinite(c_min) and np.isfinite(c_max)):
+                        has_converged = False
+                        failed_equation = 'c_{index}'.format(index=i)
+                        reason = 'concentrations are not finite or exceed max_concentration'
+                        break
+            if has_converged and time_error_tolerance > 0.0:
+                time_error = equations.estimate_time_error(c_vector=concentration_vector, dt=dt, t=t)
+                if time_error is not None and time_error > time_error_tolerance:
+                    has_converged = False
+                    failed_equation = 'time integration'
+                    reason = 'local truncation error exceeded time_error_tolerance'
             if not has_converged:
+                rejections += 1
+                profiler.increment('rejected_steps')
+                # Retry with a smaller time step from the concentrations at the start of the step
+                with profiler.phase('rollback'):
+                    transaction.rollback(concentration_vector)
+                if rejections >= max_rejections:
+                    reason = reason + ' after ' + str(rejections) + ' consecutive rejected attempts'
+                    break
                 dt *= 0.5
+                if dt <= dt_min:
+                    reason = reason + ' and dt fell below dt_min'
                 continue
             else:
                 break
 
-        if dt <= dt_min:
+        if not has_converged:
             err_flag = 1
+            termination = 'failure'
+            file_operations.write_failure_record(step=step, t=t, dt_history=list(dt_history) + attempted_dts,
+                                                 failed_equation=failed_equation, reason=reason,
+                                                 residuals=residuals,
+                                                 target_file=os.path.join(out_directory, 'failure.json'))
             break
 
-        # Write simulation output to files
-        if step % data_log_frequency == 0:
-            file_operations.write_stats(t=t, dt=dt, steps=step, c_vector=concentration_vector,
-                                        well_center=well_center, geometry=simulation_geometry, free_energy=free_en,
-                                        dynamical_equations=equations,
-                                        residuals=np.max(residuals),max_change=np.max(max_change),
-                                        target_file=os.path.join(out_directory, 'stats.txt'),
-                                        input_params = input_params)
-            file_operations.write_spatial_variables_to_hdf5_file(step=int(step / data_log_frequency),
-                                                                 total_steps=int(total_steps / data_log_frequency) + 1,
-                                                                 c_vector=concentration_vector,
-                                                                 well_center=well_center,
-                                                                 geometry=simulation_geometry,
-                                                                 free_energy=free_en,
-                                                                 target_file=os.path.join(out_directory,'spatial_variables.hdf5'),
-                                                                 t=t)
+        dt_history.append(dt)
+        profiler.increment('sweeps', sweeps)
+        profiler.increment('linear_iterations', linear_iterations)
+        profiler.end_step(step=step, t=t, dt=dt, sweeps=sweeps, rejections=rejections,
+                          linear_iterations=linear_iterations, convergence_rate=convergence_rate,
+                          time_error=np.nan if time_error is None else time_error, residual=np.max(residuals),
+                          max_change=np.max(max_change))
+
+        # Check whether the simulation has converged, unless parameters are still going to change
+        stop = False
+        if monitor is not None:
+            with profiler.phase('convergence'):
+                state = monitor.update(t=t + dt, dt=dt, max_change=np.max(max_change), c_vector=concentration_vector)
+            if state is not None and not time_profile_flag:
+                if production_geometry is not None:
+                    # The coarse stage of a cascade ends at a steady state or limit cycle
+                    end_coarse_stage = True
+                elif convergence_action == 1:
+                    stop = True
+                elif data_log_frequency != sparse_data_log_frequency:
+                    if parallel.is_root():
+                        print("Simulation reached a " + state.replace('_', ' ') + " at t = " + str(t + dt) +
+                              ". Writing out data every " + str(sparse_data_log_frequency) + " steps.")
+                    data_log_frequency = sparse_data_log_frequency
+
+        # Write simulation output to files. The final state is also written out if the simulation is stopped early.
+        if step % data_log_frequency == 0 or (stop and frame < number_of_frames):
+            with profiler.phase('calculate_mu'):
+                mu_vector = [mu.globalValue for mu in free_en.calculate_mu(concentration_vector, well_center)]
+            with profiler.phase('write_stats'):
+                file_operations.write_stats(t=t, dt=dt, steps=step, c_vector=concentration_vector,
+                                            well_center=well_center, geometry=simulation_geometry, free_energy=free_en,
+                                            dynamical_equations=equations,
+                                            residuals=np.max(residuals),max_change=np.max(max_change),
+                                            target_file=os.path.join(out_directory, 'stats.txt'),
+                                            input_params = input_params)
+            with profiler.phase('write_hdf5'):
+                file_operations.write_spatial_variables_to_hdf5_file(step=frame,
+                                                                     total_steps=number_of_frames,
+                                                                     c_vector=concentration_vector,
+                                                                     well_center=well_center,
+                                                                     geometry=simulation_geometry,
+                                                                     free_energy=free_en,
+                                                                     target_file=os.path.join(out_directory,'spatial_variables.hdf5'),
+                                                                     t=t,
+                                                                     mu_vector=mu_vector)
+            frame += 1
+            profiler.write()
 
         # Update all the variables that keep track of time
         step += 1
@@ -140,10 +357,34 @@ def run_simulation(input_params, concentration_vector, simulation_geometry, free
         t += dt
         pbar.update(n=1)
 
-        # Increase time step if converged
-        dt *= 1.1
-        dt = min(dt, dt_max)
+        if stop:
+            termination = monitor.state
+            break
 
+        # Increase time step if converged
+        if rejections:
+            dt_target = dt
+        if time_error is not None:
+            # Scale the time step so that the local truncation error of the next step is close to the tolerance
+            dt_target = dt * min(2.0, max(0.2, 0.9 * (time_error_tolerance / max(time_error, 1e-300)) ** (1.0 / 3.0)))
+        else:
+            dt_target *= 1.1
+        dt_target = min(dt_target, dt_max)
+        dt = dt_target
+        if dt_ladder_ratio > 1.0:
+            dt = simulation_helper.quantize_time_step(dt_target, dt_max, dt_ladder_ratio)
+
+    if termination is None:
+        termination = 'duration' if elapsed > duration else 'total_steps'
+    file_operations.write_metadata(metadata={'termination': termination,
+                                             'steps': step,
+                                             't': float(t),
+                                             'frames': frame,
+                                             'initial_state': input_params.get('initial_state'),
+                                             'wall_time': time.perf_counter() - start_time,
+                                             'convergence': monitor.summary() if monitor is not None else None},
+                                   target_file=os.path.join(out_directory, 'metadata.json'))
+    profiler.close()
     return err_flag
 
 
@@ -155,11 +396,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Input parameter file and output directory are command line arguments')
     parser.add_argument('--i', help="Name of input parameter file", required=True)
     parser.add_argument('--o', help="Name of output directory", required=True)
+    parser.add_argument('--profile', help="Write the time spent in each phase and the solver metrics of every step",
+                        action='store_true')
     args = parser.parse_args()
     input_parameter_file = args.i
 
-    # Read input parameters from file
-    input_parameters = file_operations.input_parse(filename=input_parameter_file)
+    # Read and validate input parameters from file
+    input_parameters = file_operations.load_input_parameters(filename=input_parameter_file)
     print('Successfully parsed input parameters ...')
 
     # Set mesh geometry
@@ -179,16 +422,19 @@ if __name__ == "__main__":
     fe = simulation_helper.set_free_energy(input_parameters)
     print('Successfully set up the free energy ...')
 
-    # Create the output directory
+    # Create the output directory. In a parallel run, the root process creates it and writes out the files
     output_directory = os.path.join(args.o, simulation_helper.get_output_dir_name(input_parameters))
-    if not os.path.exists(output_directory):
-        os.makedirs(output_directory)
-    elif os.path.exists(output_directory):
-        print("Simulation directory already exists.")
+    if parallel.broadcast(os.path.exists(output_directory)):
+        if parallel.is_root():
+            print("Simulation directory already exists.")
         sys.exit()
-    # Write the input parameters file to the output directory
-    file_operations.write_input_params_from_file(input_filename=input_parameter_file,
-                                                 target_filename=os.path.join(output_directory, 'input_params.txt'))
+    if parallel.is_root():
+        os.makedirs(output_directory)
+        # Write the input parameters file to the output directory
+        file_operations.write_input_params_from_file(input_filename=input_parameter_file,
+                                                     target_filename=os.path.join(output_directory,
+                                                                                  'input_params.txt'))
+    parallel.barrier()
     print('Successfully created the output directory to write simulation data ...')
 
     # Choose the model equations
@@ -201,6 +447,11 @@ if __name__ == "__main__":
                                                                                           'spatial_variables.hdf5'))
     print('Successfully set up model equations ...')
 
+    # Profile the simulation if requested on the command line or in the input parameters
+    profiler = None
+    if (args.profile or int(input_parameters.get('profile', 0))) and parallel.is_root():
+        profiler = Profiler(out_directory=output_directory)
+
     # Run simulation
     print('Running simulation ...')
     error_flag = run_simulation(input_params=input_parameters,
@@ -208,8 +459,12 @@ if __name__ == "__main__":
                                 simulation_geometry=sim_geometry,
                                 free_en=fe,
                                 equations=model_equations,
-                                out_directory=output_directory)
+                                out_directory=output_directory,
+                                well_center=well_center,
+                                profiler=profiler)
 
-    if error_flag:
+    if error_flag and parallel.is_root():
         print("There were some numerical issues in the simulations. Try reducing the minimum step size in time, or " +
-              "try for a different range of parameters")
+              "try for a different range of parameters. See failure.json in the output directory for details.")
+    if error_flag:
+        sys.exit(1)
@@ -1,17 +1,90 @@
 #!/usr/bin/env python
 """
 Script to sweep through different parameters in an input_parameters file over values defined in a sweep_parameters file
+
+In continuation mode, each point of the sweep starts from a frame of the simulation of a neighbouring point instead of
+the initial conditions, so that it does not have to go through the whole transient again.
+
+Sweeps over many parameters can sample the space of parameters with a space-filling design instead of the full grid. The
+sweep file then gives the range (low, high) of each parameter, or (low, high, 'log') to sample it uniformly in its
+logarithm, and the number of samples is chosen independently of the number of parameters.
+
+With --pack, the wall time of each simulation is estimated from the simulations that have finished in the output
+directory, and each job gets a time limit from the estimate instead of the default of a day. Simulations that are
+short compared to the allocation of a job are run one after another in the same job.
 """
 
 import os
 from datetime import datetime
 import itertools
 import argparse
+import csv
+import subprocess
+import numpy as np
+from scipy.stats import qmc
 import utils.file_operations as file_operations
 import textwrap
 from utils.simulation_helper import get_output_dir_name
+from utils.scheduling import RuntimeModel, update_manifest, pack_jobs, format_time_limit
 from pathlib import Path
 
+
+def continuation_neighbour(indices):
+    """Return the neighbouring point of the sweep that a point starts from in continuation mode
+
+    The neighbour has the same parameter values except for the last parameter whose value is not the first one, which
+    takes the previous value. The points form a tree rooted at the point with the first value of every parameter, and
+    each point is one step along one parameter axis from its neighbour.
+
+    Args:
+        indices (tuple): Indices of the values of the swept parameters at a point of the sweep
+
+    Returns:
+        neighbour (tuple): Indices of the values at the neighbouring point, or None for the first point of the sweep
+    """
+    for axis in reversed(range(len(indices))):
+        if indices[axis] > 0:
+            return indices[:axis] + (indices[axis] - 1,) + indices[axis + 1:]
+    return None
+
+
+def sample_parameter_values(parameter_ranges, method, samples, seed):
+    """Sample parameter values in their ranges with a space-filling design
+
+    Args:
+        parameter_ranges (list): Range of each parameter as a tuple (low, high), or (low, high, 'log') to sample the
+        parameter uniformly in its logarithm
+
+        method (string): 'lhs' for a Latin hypercube, 'sobol' for a scrambled Sobol sequence or 'halton' for a scrambled
+        Halton sequence
+
+        samples (int): Number of samples. Sobol sequences are balanced if it is a power of 2.
+
+        seed (int): Seed of the random numbers of the design, so that the same samples are drawn again
+
+    Returns:
+        values (numpy.ndarray): Values of the parameters, of shape (samples, number of parameters)
+    """
+    for parameter_range in parameter_ranges:
+        if len(parameter_range) not in (2, 3) or (len(parameter_range) == 3 and parameter_range[2] != 'log'):
+            raise ValueError("Sampled parameters need a range (low, high) or (low, high, 'log'), got " +
+                             repr(parameter_range))
+    log_scale = np.array([len(parameter_range) == 3 for parameter_range in parameter_ranges])
+    lows = np.array([parameter_range[0] for parameter_range in parameter_ranges], dtype=float)
+    highs = np.array([parameter_range[1] for parameter_range in parameter_ranges], dtype=float)
+    if np.any(log_scale & ((lows <= 0.0) | (highs <= 0.0))):
+        raise ValueError("Parameters sampled in their logarithm need positive ranges")
+    lows[log_scale] = np.log(lows[log_scale])
+    highs[log_scale] = np.log(highs[log_scale])
+
+    samplers = {'lhs': qmc.LatinHypercube, 'sobol': qmc.Sobol, 'halton': qmc.Halton}
+    unit_samples = samplers[method](d=len(parameter_ranges), seed=seed).random(samples)
+    values = lows + unit_samples * (highs - lows)
+    values[:, log_scale] = np.exp(values[:, log_scale])
+    # Round the values to keep the names of the output directories short
+    return np.vectorize(lambda value: float('%.6g' % value))(values)
+
+
 if __name__ == "__main__":
     """This script generates a separate input_parameter file for each parameter in sweep_parameters file
     """
@@ -22,7 +95,25 @@ if __name__ == "__main__":
     parser.add_argument('--s', help="Name of sweep_parameter file", required=True)
     parser.add_argument('--i', help="Name of input_parameter file", required=True)
     parser.add_argument('--o', help="Name of output directory", required=True)
+    parser.add_argument('--continuation', help="Start each point from a frame of the simulation of a neighbouring "
+                                               "point, once that simulation has finished", action='store_true')
+    parser.add_argument('--frame', help="Frame of the neighbouring simulation to start from in continuation mode",
+                        type=int, default=-1)
+    parser.add_argument('--sampling', help="Run every combination of the values in the sweep file (grid), or sample "
+                                           "the ranges in the sweep file with a Latin hypercube (lhs), a Sobol "
+                                           "sequence (sobol) or a Halton sequence (halton)",
+                        choices=['grid', 'lhs', 'sobol', 'halton'], default='grid')
+    parser.add_argument('--samples', help="Number of samples of the sampling designs", type=int, default=100)
+    parser.add_argument('--seed', help="Seed of the sampling designs", type=int, default=0)
+    parser.add_argument('--pack', help="Size the time limit of each job from the estimated wall time of its "
+                                       "simulations, and run simulations one after another in jobs of up to this "
+                                       "many hours", type=float)
     args = parser.parse_args()
+    if args.continuation and args.sampling != 'grid':
+        raise ValueError("Continuation mode needs the neighbouring points of a grid, so it requires --sampling grid")
+    if args.continuation and args.pack is not None:
+        raise ValueError("Continuation mode submits a job per point that waits for its neighbour, so it cannot be "
+                         "combined with --pack")
 
     input_parameter_file = args.i
     sweep_parameter_file = args.s
@@ -49,17 +140,66 @@ if __name__ == "__main__":
     target_directory = os.path.join(output_directory, 'parameter_sweep_log', date_time.strftime('%d_%m_%Y_%H_%M_%S'))
     os.mkdir(target_directory)
 
+    # Points of the sweep as tuples of the indices of their values in the grid, or of the index of the sample, and the
+    # parameter values
+    if args.sampling == 'grid':
+        points = [(indices, [values[index] for values, index in zip(sweep_parameter_values, indices)])
+                  for indices in itertools.product(*[range(len(values)) for values in sweep_parameter_values])]
+    else:
+        samples = sample_parameter_values(sweep_parameter_values, args.sampling, args.samples, args.seed)
+        points = [((k,), list(samples[k])) for k in range(args.samples)]
+        # Record the design so that the samples can be related to the simulations
+        with open(os.path.join(target_directory, 'samples.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['sample'] + sweep_parameter_names + ['output_directory'])
+            for k, values in points:
+                input_parameters.update(zip(sweep_parameter_names, values))
+                writer.writerow([k[0]] + values + [get_output_dir_name(input_parameters)])
+
     file_counter = 0
-    for parameter_combinations in list(itertools.product(*sweep_parameter_values)):
+    # Input parameter files of the simulations to pack into jobs
+    packed_input_files = []
+    # In continuation mode, the output directory and the job of the simulation at each point, by the indices of its
+    # parameter values
+    simulations = {}
+    initial_state = input_parameters.get('initial_state')
+    for indices, parameter_combinations in points:
         for parameter_counter in range(len(sweep_parameter_names)):
             input_parameters[sweep_parameter_names[parameter_counter]] = parameter_combinations[parameter_counter]
         input_parameter_file_name_during_sweep = os.path.join(target_directory,
                                                               'input_parameters_{}.txt'.format(file_counter))
+        dependency = ''
+        if args.continuation:
+            simulation_directory = os.path.abspath(os.path.join(output_directory,
+                                                                get_output_dir_name(input_parameters)))
+            neighbour = continuation_neighbour(indices)
+            input_parameters.pop('initial_state', None)
+            if neighbour is None:
+                if initial_state is not None:
+                    input_parameters['initial_state'] = initial_state
+            else:
+                neighbour_directory, neighbour_job = simulations[neighbour]
+                if neighbour_directory == simulation_directory:
+                    raise ValueError("The points " + str(neighbour) + " and " + str(indices) + " of the sweep have "
+                                     "the same output directory, so the swept parameters must appear in the names of "
+                                     "the output directories")
+                input_parameters['initial_state'] = (neighbour_directory, args.frame)
+                # Wait for the simulation of the neighbouring point to finish, and cancel the job if it fails instead
+                # of leaving it pending in the queue
+                if neighbour_job is not None:
+                    dependency = '--dependency=afterok:{} --kill-on-invalid-dep=yes '.format(neighbour_job)
+                # Record where each point starts from
+                with open(os.path.join(target_directory, 'continuation.txt'), 'a') as log:
+                    log.write('{}, {}, {}\n'.format(simulation_directory, neighbour_directory, args.frame))
+            simulations[indices] = (simulation_directory, None)
         # Write parameter files
         file_operations.write_input_params_from_dict(input_parameters=input_parameters,
                                                      target_filename=input_parameter_file_name_during_sweep)
         if Path(get_output_dir_name(input_parameters)).exists():
             print("Skip")
+        elif args.pack is not None:
+            packed_input_files.append(input_parameter_file_name_during_sweep)
+            file_counter = file_counter + 1
         else:
             # Submit job using this parameter file
             run_simulation_slurm = """\
@@ -81,6 +221,7 @@ if __name__ == "__main__":
             {
                 source activate CoupledEPCondensates
                 run-simulation --i $input_file --o $out_folder
+                status=$?
                 conda deactivate
             }
 
@@ -101,12 +242,71 @@ if __name__ == "__main__":
             run_program
             cleanup_files
             movie
+            # Exit with the status of the simulation, so that the jobs of neighbouring points in continuation mode only
+            # start from simulations that ran without errors
+            exit $status
             """
             run_simulation_slurm = textwrap.dedent(run_simulation_slurm)
             with open("run_simulation.slurm","w") as fhandle:
                 fhandle.write(run_simulation_slurm)
 
-            os.system('sbatch --export=input_file={},out_folder={} run_simulation.slurm'
-                        .format(input_parameter_file_name_during_sweep, output_directory))
+            if args.continuation:
+                # Keep the id of the job so that the jobs of the neighbouring points can wait for it
+                job = subprocess.check_output('sbatch --parsable {}--export=input_file={},out_folder={} '
+                                              'run_simulation.slurm'.format(dependency,
+                                                                            input_parameter_file_name_during_sweep,
+                                                                            output_directory),
+                                              shell=True).decode().strip().split(';')[0]
+                simulations[indices] = (simulation_directory, job)
+            else:
+                os.system('sbatch --export=input_file={},out_folder={} run_simulation.slurm'
+                          .format(input_parameter_file_name_during_sweep, output_directory))
 
             file_counter = file_counter + 1
+
+    if packed_input_files:
+        # Estimate the wall times from the simulations that have finished in the output directory
+        runtime_model = RuntimeModel()
+        runtime_model.fit(*update_manifest(output_directory))
+        time_limits = [runtime_model.time_limit(file_operations.input_parse(filename=input_file))
+                       for input_file in packed_input_files]
+        jobs = pack_jobs(time_limits, capacity=3600.0 * args.pack)
+        with open(os.path.join(target_directory, 'packed_jobs.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['job', 'input_file', 'estimated_wall_time', 'time_limit'])
+            for job, members in enumerate(jobs):
+                for index in members:
+                    writer.writerow([job, packed_input_files[index],
+                                     runtime_model.predict(file_operations.input_parse(
+                                         filename=packed_input_files[index])), time_limits[index]])
+
+        for job, members in enumerate(jobs):
+            # Each job runs its simulations one after another within the sum of their time limits, and gets at least
+            # ten minutes
+            packed_simulation_slurm = textwrap.dedent("""\
+            #!/bin/bash
+            #SBATCH -J CoupledEPCondensates
+            #SBATCH --mail-user davidgoh
+            #SBATCH -p sched_mit_arupc_long
+            #SBATCH -t {time_limit}
+            #SBATCH --mem-per-cpu 4000
+            cd "$SLURM_SUBMIT_DIR"
+            echo $PWD
+
+            source activate CoupledEPCondensates
+            for input_file in {input_files}
+            do
+                run-simulation --i $input_file --o {out_folder}
+                output_folder=$(python -c "from utils.simulation_helper import get_output_dir_name as outname; from utils.file_operations import input_parse;  print(outname(input_parse('$input_file')))")
+                make-movie --i {out_folder}/$output_folder
+            done
+            conda deactivate
+            echo "DONE"
+            """).format(time_limit=format_time_limit(max(sum(time_limits[index] for index in members), 600.0)),
+                         input_files=' '.join(packed_input_files[index] for index in members),
+                         out_folder=output_directory)
+            job_file = os.path.join(target_directory, 'packed_job_{}.slurm'.format(job))
+            with open(job_file, 'w') as fhandle:
+                fhandle.write(packed_simulation_slurm)
+            os.system('sbatch ' + job_file)
+        print('Packed {} simulations into {} jobs'.format(len(packed_input_files), len(jobs)))
@@ -5,20 +5,30 @@ from . import geometry
 from . import initial_conditions
 from . import free_energy
 from . import dynamical_equations
+from . import file_operations
+from . import mesh_transfer
 import fipy as fp
+import h5py
+import numpy as np
+import os
 
 
-def set_mesh_geometry(input_params):
+def set_mesh_geometry(input_params, refinement_regions=None):
     """Set the mesh geometry depending on the options in input_parameters
 
     Mesh geometry types currently supported include:
-    Type 1: 2D circular mesh
-    Type 2:
+    Type 1: 2D circular mesh, or its radius if the input parameter axisymmetric = 1, or its upper half if the input
+    parameter mirror_symmetry = 1
+    Type 2: 2D square mesh
+    Type 3: 3D cubical mesh
 
     Args:
         input_params (dict): Dictionary that contains input parameters. We are only interested in the key,value pairs
         that describe the mesh geometry
 
+        refinement_regions (list): Fine regions of a graded mesh, as tuples (x, y, radius), instead of those returned
+        by get_mesh_refinement_regions()
+
     Returns:
          simulation_geometry (Geometry): A class object from :module:`utils.geometry`
     """
@@ -30,7 +40,28 @@ def set_mesh_geometry(input_params):
         if input_params['circ_flag'] == 1:
             assert 'radius' in input_params.keys() and 'dx' in input_params.keys(), \
                 "input_params dictionary doesn't have values corresponding to the domain radius and mesh size"
-            simulation_geometry = geometry.CircularMesh2d(radius=input_params['radius'], cell_size=input_params['dx'])
+            gmsh_options = {}
+            if input_params.get('mesh_grading', 0) == 1:
+                # The mesh is only fine where the concentrations have sharp features
+                coarse_cell_size = input_params.get('coarse_dx', 4.0 * input_params['dx'])
+                if refinement_regions is None:
+                    refinement_regions = get_mesh_refinement_regions(input_params)
+                gmsh_options = {'refinement_regions': refinement_regions,
+                                'coarse_cell_size': coarse_cell_size,
+                                'grading_length': input_params.get('mesh_grading_length', 5.0 * coarse_cell_size)}
+            # Renumber the cells of the Gmsh mesh so that neighboring cells have nearby indices
+            gmsh_options['reorder'] = input_params.get('cell_ordering', 0) == 1
+            if input_params.get('axisymmetric', 0) == 1:
+                # Radially symmetric simulation, solved along the radius
+                simulation_geometry = geometry.AxisymmetricMesh1d(radius=input_params['radius'],
+                                                                  cell_size=input_params['dx'])
+            elif input_params.get('mirror_symmetry', 0) == 1:
+                # Simulation that is symmetric about the x axis, solved on the upper half of the circle
+                simulation_geometry = geometry.SemicircularMesh2d(radius=input_params['radius'],
+                                                                  cell_size=input_params['dx'], **gmsh_options)
+            else:
+                simulation_geometry = geometry.CircularMesh2d(radius=input_params['radius'],
+                                                              cell_size=input_params['dx'], **gmsh_options)
         # 2D Square geometry
         else:
             assert 'length' in input_params.keys() and 'dx' in input_params.keys(), \
@@ -44,6 +75,177 @@ def set_mesh_geometry(input_params):
 
     return simulation_geometry
 
+
+def get_interface_width(input_params):
+    """Return the width :math:`\\sqrt{\\kappa}` of the interfaces of the condensates"""
+    return float(np.sqrt(input_params.get('kappa_tilde', input_params.get('kappa', 0.0))))
+
+
+def get_mesh_refinement_regions(input_params, condensates=None):
+    """Return the regions of the domain in which the concentrations have sharp features and the mesh must be fine
+
+    These are the seeds of the condensates, enlarged by a few interface widths :math:`\\sqrt{\\kappa}`, and the Gaussian
+    regions of the potential well and of the production of RNA out to two standard deviations.
+
+    Args:
+        input_params (dict): Dictionary that contains input parameters
+
+        condensates (list): Disks as tuples (x, y, radius) that cover the current condensates, which replace the
+        seeds once the simulation has started
+
+    Returns:
+        refinement_regions (list): Disks as tuples (x, y, radius) of their centers and radii
+    """
+    interface_width = get_interface_width(input_params)
+    refinement_regions = []
+    if condensates is not None:
+        refinement_regions.extend(condensates)
+    for i in range(len(input_params['nucleate_seed'])):
+        if input_params['nucleate_seed'][i] == 1 and condensates is None:
+            refinement_regions.append(tuple(input_params['location'][i])
+                                      + (input_params['nucleus_size'][i] + 4.0 * interface_width,))
+    if input_params.get('well_depth', 0.0) != 0.0:
+        refinement_regions.append(tuple(input_params['well_center']) + (2.0 * input_params['sigma'],))
+    if 'reaction_center' in input_params and 'reaction_sigma' in input_params:
+        refinement_regions.append(tuple(input_params['reaction_center']) + (2.0 * input_params['reaction_sigma'],))
+    return refinement_regions
+
+
+def get_coarse_input_params(input_params):
+    """Return the input parameters of the coarse stage of a simulation with cascade_dx > 0
+
+    The mesh of the coarse stage has cells of size cascade_dx instead of dx. The cells far from the fine regions of a
+    graded mesh are at least as large.
+
+    Args:
+        input_params (dict): Dictionary that contains input parameters
+
+    Returns:
+        coarse_params (dict): A copy of input_params for the mesh of the coarse stage
+    """
+    coarse_params = dict(input_params)
+    coarse_params['dx'] = input_params['cascade_dx']
+    if 'coarse_dx' in input_params:
+        coarse_params['coarse_dx'] = max(input_params['coarse_dx'], input_params['cascade_dx'])
+    return coarse_params
+
+
+def remesh(input_params, concentration_vector, simulation_geometry):
+    """Regenerate the graded mesh around the current condensates
+
+    The condensates are the connected regions in which c_0 is above c_bar_1 (or c_bar). The mesh is only regenerated
+    when the interface of a condensate, with a margin of four interface widths, has left the fine regions of the
+    current mesh. The fine regions of the new mesh extend another four interface widths beyond this margin, so that
+    the condensates can move for a while before the next remeshing.
+
+    Args:
+        input_params (dict): Dictionary that contains input parameters
+
+        concentration_vector (list): Concentration variables on the mesh of simulation_geometry
+
+        simulation_geometry (Geometry): Instance of class from :module:`utils.geometry` with a graded mesh
+
+    Returns:
+        new_geometry (Geometry): The geometry with the new mesh, or None if the mesh is kept. The concentrations are
+        moved to it with transfer_to_geometry().
+    """
+    interface_width = get_interface_width(input_params)
+    threshold = input_params.get('c_bar_1', input_params.get('c_bar'))
+    condensates = mesh_transfer.condensate_regions(concentration=concentration_vector[0].value, threshold=threshold,
+                                                   mesh=simulation_geometry.mesh, margin=4.0 * interface_width)
+    fine_regions = simulation_geometry.refinement_regions or []
+    if all(any(np.hypot(x - x_fine, y - y_fine) + radius <= radius_fine for x_fine, y_fine, radius_fine in fine_regions)
+           for x, y, radius in condensates):
+        return None
+
+    condensates = [(x, y, radius + 4.0 * interface_width) for x, y, radius in condensates]
+    return set_mesh_geometry(input_params,
+                             refinement_regions=get_mesh_refinement_regions(input_params, condensates=condensates))
+
+
+def transfer_to_geometry(input_params, concentration_vector, well_center, simulation_geometry, new_geometry, equations,
+                         target_file):
+    """Move a simulation to the mesh of another geometry of the same domain
+
+    The concentrations and the history of the delayed concentration are transferred to the new mesh with a single
+    :class:`utils.mesh_transfer.CellTransfer`, which conserves the amount of every species, and the model is set up
+    again on the new mesh.
+
+    Args:
+        input_params (dict): Dictionary that contains input parameters
+
+        concentration_vector (list): Concentration variables on the mesh of simulation_geometry
+
+        well_center (numpy.ndarray): Position of the localization locus
+
+        simulation_geometry (Geometry): Instance of class from :module:`utils.geometry` with the current mesh
+
+        new_geometry (Geometry): Instance of class from :module:`utils.geometry` with the new mesh
+
+        equations (utils.dynamical_equations): The current model equations
+
+        target_file (string): The hdf5 file of the simulation
+
+    Returns:
+        concentration_vector (list): The concentration variables on the new mesh
+
+        free_en (utils.free_energy): The new free energy
+
+        equations (utils.dynamical_equations): The new model equations
+    """
+    transfer = mesh_transfer.CellTransfer.between_meshes(simulation_geometry.mesh, new_geometry.mesh)
+    values = transfer(np.array([c.value for c in concentration_vector]))
+    new_vector = [fp.CellVariable(mesh=new_geometry.mesh, name=concentration_vector[i].name, hasOld=True,
+                                  value=values[i])
+                  for i in range(len(concentration_vector))]
+    delay_tracker = getattr(equations, 'delay_tracker', None)
+    if delay_tracker is not None:
+        delay_tracker.concentration = transfer(delay_tracker.concentration)
+        delay_tracker.mesh = new_geometry.mesh
+    free_en, new_equations = rebuild_model(input_params=input_params,
+                                           concentration_vector=new_vector,
+                                           well_center=well_center,
+                                           simulation_geometry=new_geometry,
+                                           equations=equations,
+                                           target_file=target_file)
+    return new_vector, free_en, new_equations
+
+
+def load_concentrations(directory, frame, simulation_geometry):
+    """Read the concentrations of a stored frame of a simulation and transfer them to the mesh of a geometry
+
+    The mesh of the stored simulation is built from the input parameters in its directory. Frames of simulations on
+    the upper half of the domain are reflected to the full domain, and frames of axisymmetric simulations are
+    interpolated onto it. The transfer conserves the amount of every species, so that a simulation can be restarted
+    from any stored frame on a mesh of a different resolution.
+
+    Args:
+        directory (string): Directory of the stored simulation, with the files input_params.txt and
+        spatial_variables.hdf5
+
+        frame (int): Index of the frame. Negative indices count back from the last frame that was written out.
+
+        simulation_geometry (Geometry): Instance of class from :module:`utils.geometry` with a mesh of at least 2
+        dimensions
+
+    Returns:
+        values (numpy.ndarray): Values of each concentration in the cells of the mesh of simulation_geometry
+    """
+    source_params = file_operations.input_parse(os.path.join(directory, 'input_params.txt'))
+    source_geometry = set_mesh_geometry(source_params)
+    with h5py.File(os.path.join(directory, 'spatial_variables.hdf5'), 'r') as f:
+        # Files written before the number of frames was stored are scanned for the first empty frame
+        _, _, valid_frames = file_operations.read_frame_extrema(f, int(source_params['n_concentrations']))
+        if not -valid_frames <= frame < valid_frames:
+            raise ValueError("Frame " + str(frame) + " is not among the " + str(valid_frames) +
+                             " frames written out in " + directory)
+        frame = frame % valid_frames
+        values = np.array([source_geometry.expand_to_full_mesh(
+            mesh_transfer.read_frames(f, "c_{index}".format(index=i), frame, source_geometry.mesh))
+            for i in range(int(source_params['n_concentrations']))])
+    return mesh_transfer.transfer_between_meshes(values, source_geometry.get_full_mesh(), simulation_geometry.mesh)
+
+
 def initialize_concentrations(input_params, simulation_geometry):
     """Set initial conditions for the concentration profiles
 
@@ -63,6 +265,19 @@ def initialize_concentrations(input_params, simulation_geometry):
     # Initialize concentration_vector
     concentration_vector = []
 
+    # Restart from a frame of a stored simulation, transferred to the mesh of this simulation
+    if 'initial_state' in input_params:
+        directory, frame = input_params['initial_state']
+        values = load_concentrations(directory=directory, frame=int(frame), simulation_geometry=simulation_geometry)
+        if len(values) != int(input_params['n_concentrations']):
+            raise ValueError("The simulation in " + directory + " has " + str(len(values)) + " concentrations instead "
+                             "of " + str(int(input_params['n_concentrations'])))
+        for i in range(len(values)):
+            concentration_vector.append(fp.CellVariable(mesh=simulation_geometry.mesh,
+                                                        name='c_{index}'.format(index=i), hasOld=True,
+                                                        value=values[i]))
+        return concentration_vector
+
     for i in range(int(input_params['n_concentrations'])):
         # Initialize fipy.CellVariable
         concentration_variable = fp.CellVariable(mesh=simulation_geometry.mesh, name='c_{index}'.format(index=i),
@@ -166,7 +381,15 @@ def set_model_equations(input_params, concentration_vector, well_center, free_en
                                                         modelAB_dynamics_type=input_params['modelAB_dynamics_type'],
                                                         degradation_constant=input_params['k_degradation'],
                                                         free_energy=free_en,
-                                                        ratio=input_params["ratio"])
+                                                        ratio=input_params["ratio"],
+                                                        factorization_cache_size=input_params.get(
+                                                            'factorization_cache_size', 8),
+                                                        solver_type=input_params.get('solver_type', 1),
+                                                        time_scheme=input_params.get('time_scheme', 1),
+                                                        stabilization_constant=input_params.get(
+                                                            'stabilization_constant', None),
+                                                        anderson_depth=input_params.get('anderson_depth', 0),
+                                                        time_integrator=input_params.get('time_integrator', 1))
 
         if input_params['reaction_type'] == 1:
             equations.set_production_term(reaction_type=input_params['reaction_type'],
@@ -200,7 +423,15 @@ def set_model_equations(input_params, concentration_vector, well_center, free_en
                                                         free_energy=free_en,
                                                         tau=input_params['tau'],
                                                         target_file=target_file,
-                                                        ratio=input_params["ratio"])
+                                                        ratio=input_params["ratio"],
+                                                        factorization_cache_size=input_params.get(
+                                                            'factorization_cache_size', 8),
+                                                        solver_type=input_params.get('solver_type', 1),
+                                                        time_scheme=input_params.get('time_scheme', 1),
+                                                        stabilization_constant=input_params.get(
+                                                            'stabilization_constant', None),
+                                                        anderson_depth=input_params.get('anderson_depth', 0),
+                                                        time_integrator=input_params.get('time_integrator', 1))
 
         if input_params['reaction_type'] == 1:
             equations.set_production_term(reaction_type=input_params['reaction_type'],
@@ -242,6 +473,146 @@ def set_model_equations(input_params, concentration_vector, well_center, free_en
 
     return equations
 
+
+def rebuild_model(input_params, concentration_vector, well_center, simulation_geometry, equations, target_file):
+    """Set up the free energy and the model equations again, keeping the history of the delayed concentration
+
+    This is needed when parameters change that cannot be changed in place, or when the mesh changes.
+
+    Args:
+        input_params (dict): Dictionary that contains input parameters
+
+        concentration_vector (list): Concentration variables
+
+        well_center (numpy.ndarray): Position of the localization locus
+
+        simulation_geometry (Geometry): Instance of class from :module:`utils.geometry` that describes the mesh
+
+        equations (utils.dynamical_equations): The current model equations
+
+        target_file (string): The hdf5 file of the simulation
+
+    Returns:
+        free_en (utils.free_energy): The new free energy
+
+        equations (utils.dynamical_equations): The new model equations
+    """
+    delay_tracker = getattr(equations, 'delay_tracker', None)
+    free_en = set_free_energy(input_params)
+    new_equations = set_model_equations(input_params=input_params,
+                                        concentration_vector=concentration_vector,
+                                        well_center=well_center,
+                                        free_en=free_en,
+                                        simulation_geometry=simulation_geometry,
+                                        target_file=target_file)
+    if delay_tracker is not None:
+        delay_tracker.tau = input_params['tau']
+        new_equations.delay_tracker = delay_tracker
+    new_equations.profiler = equations.profiler
+    return free_en, new_equations
+
+# Input parameters that can be changed in place during a simulation, and the names of the corresponding arguments of
+# the free energy classes in :mod:`utils.free_energy`
+FREE_ENERGY_VARIABLE_PARAMETERS = {
+    1: {'alpha': 'alpha', 'beta': 'beta', 'gamma': 'gamma', 'lamda': 'lamda', 'kappa': 'kappa', 'c_bar': 'c_bar_1',
+        'well_depth': 'well_depth'},
+    2: {'c_bar_1': 'c_bar_1', 'beta_tilde': 'beta_tilde', 'gamma_tilde': 'gamma_tilde', 'lamda_tilde': 'lamda_tilde',
+        'kappa_tilde': 'kappa_tilde', 'well_depth': 'well_depth'},
+    3: {'c_bar_1': 'c_bar_1', 'beta_tilde': 'beta_tilde', 'gamma_tilde': 'gamma_tilde', 'lamda_tilde': 'lamda_tilde',
+        'kappa_tilde': 'kappa_tilde', 'chiPR_tilde': 'chiPR_tilde', 'well_depth': 'well_depth', 'k_tilde': 'k_tilde'},
+}
+
+# Input parameters that can be changed in place during a simulation, and the names of the corresponding arguments of
+# the model classes in :mod:`utils.dynamical_equations`
+MODEL_VARIABLE_PARAMETERS = {'M1': 'mobility_1', 'M2': 'mobility_2', 'k_degradation': 'degradation_constant',
+                             'tau': 'tau'}
+
+# Input parameters that can be changed in place during a simulation, and the names of the corresponding arguments of
+# the production terms in :mod:`utils.reaction_rates` for each reaction type
+PRODUCTION_VARIABLE_PARAMETERS = {
+    1: {'basal_k_production': 'k'},
+    2: {'basal_k_production': 'k0', 'k_production': 'k'},
+    3: {'basal_k_production': 'k0', 'k_production': 'k', 'hill_vmax': 'hill_vmax', 'hill_c0': 'hill_c0',
+        'hill_kd': 'hill_kd', 'hill_n': 'hill_n', 'hill_v0': 'hill_v0'},
+    4: {'basal_k_production': 'k0', 'k_production': 'k', 'linear_m': 'linear_m', 'linear_c': 'linear_c'},
+}
+
+
+def update_model_parameters(input_params, changed_params, free_en, equations, well_center, concentration_vector):
+    """Change parameters of the free energy and model equations in place, without reassembling the model equations
+
+    Parameters that set spatial profiles or the structure of the model equations, such as the widths and centers of
+    the Gaussian functions, cannot be changed in place. The model equations need to be set up again with
+    :func:`set_free_energy` and :func:`set_model_equations` for changes in these parameters. A new position of the
+    localization locus is set on the variables in well_center, which the chemical potentials and the statistics read,
+    but the Gaussian well in the model equations is evaluated when they are set up, so they still need to be set up
+    again.
+
+    Args:
+        input_params (dict): Dictionary that contains the input parameters before the change
+
+        changed_params (dict): Dictionary that contains the new values of the input parameters that change
+
+        free_en (utils.free_energy): An instance of one of the classes in mod:`utils.free_energy`
+
+        equations (utils.dynamical_equations): An instance of one of the classes in mod:`utils.dynamical_equations`
+
+        well_center (list): Variables with the position of the localization locus
+
+        concentration_vector (numpy.ndarray): Concentrations at the time of the change, from which the constant of the
+        stabilized scheme is estimated again if the free energy changes
+
+    Returns:
+        not_updated (list): Names of the changed parameters that could not be changed in place
+    """
+    free_energy_parameters = FREE_ENERGY_VARIABLE_PARAMETERS[int(input_params['free_energy_type'])]
+    production_parameters = PRODUCTION_VARIABLE_PARAMETERS.get(int(input_params['reaction_type']), {})
+
+    not_updated = []
+    free_energy_changed = False
+    for key, value in changed_params.items():
+        if key == 'well_center':
+            well_center[0].setValue(value[0])
+            well_center[1].setValue(value[1])
+            if tuple(input_params['well_center']) != tuple(value):
+                not_updated.append(key)
+        elif key in free_energy_parameters:
+            free_en.update_parameters(**{free_energy_parameters[key]: value})
+            free_energy_changed = True
+        elif key in MODEL_VARIABLE_PARAMETERS and MODEL_VARIABLE_PARAMETERS[key] in equations.variable_parameters:
+            equations.update_parameters(**{MODEL_VARIABLE_PARAMETERS[key]: value})
+        elif key in production_parameters:
+            equations.update_production_parameters(**{production_parameters[key]: value})
+        elif key not in input_params or input_params[key] != value:
+            not_updated.append(key)
+    # The second derivatives of the free energy change with its parameters
+    if free_energy_changed:
+        equations.update_stabilization_constant(concentration_vector)
+
+    return not_updated
+
+
+def quantize_time_step(dt, dt_max, ratio):
+    """Round a time step down to the ladder of time steps :math:`dt_{max} r^{-k}` for integers :math:`k \\geq 0`
+
+    Time steps on the ladder repeat during a simulation, so that the factorizations of the matrices that only depend
+    on the time step can be reused.
+
+    Args:
+        dt (float): Time step to round down
+
+        dt_max (float): Largest time step, which is the top of the ladder
+
+        ratio (float): Ratio between consecutive time steps on the ladder, larger than 1
+
+    Returns:
+        dt (float): Largest time step on the ladder that is not larger than dt
+    """
+    if dt >= dt_max:
+        return dt_max
+    return dt_max * ratio ** (-np.ceil(np.log(dt_max / dt) / np.log(ratio) - 1e-12))
+
+
 def get_output_dir_name(input_params):
     """Set output directory name for the given input parameters.
 